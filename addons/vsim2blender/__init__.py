@@ -9,9 +9,13 @@
 """
 
 import os
-import configparser
 from json import loads
 
+try:
+    import configparser
+except ImportError:
+    import ConfigParser as configparser
+
 bl_info = {
     "name": "ascii phonons",
     "description": "Generate phonon mode visualisations from ASCII input files",
@@ -104,8 +108,11 @@ class Opts(object):
             self.config = read_config()
 
         self.bool_keys = (
+            'cache_ascii',
+            'draft',
             'gif',
             'gui',
+            'instance_atoms',
             'montage',
             'normalise_vectors',
             'orthographic',
@@ -2,31 +2,50 @@ import bpy
 from math import pi, sin, cos, asin, acos, sqrt, atan2
 import mathutils
 import os
-import time
 
-def add_arrow(loc=[0,0,0], rot_euler=False, scale=1, mass=1):
+arrow_library = os.path.join(os.path.dirname(__file__), 'arrow_cylinder.blend')
+
+def arrow_template():
+    """Get the Arrow object from the arrow library, loading it on first use
+
+    The library file is only opened once per session; the template object
+    is not linked to any scene.
+
+    :return: Arrow object from arrow_cylinder.blend
+    :rtype: bpy object
+    """
+    template = bpy.data.objects.get('Arrow')
+    if template is not None and template.library is not None:
+        return template
+
+    with bpy.data.libraries.load(arrow_library, link=True) as (data_from, data_to):
+        data_to.objects = ['Arrow']
+    return data_to.objects[0]
+
+def add_arrow(loc=[0,0,0], rot_euler=False, scale=1, mass=1, name='Arrow.instance'):
     """Add an arrow to the scene
 
+    The new object shares its mesh with the library arrow, so no data is
+    copied and the library file is not re-opened.
+
     :param loc: Origin of the arrow in *Cartesian coordinates*
     :type loc: 3-tuple or 3-list of floats
     :param rot_euler: Set of euler rotations (about x-, y- then z-axis) in radians. If False, arrow remains pointing along x-axis.
     :type rot_euler: 3-tuple/list or Boolean False
+    :param name: Object name. Callers should derive this from the atom index and cell id to keep names unique and reproducible.
+    :type name: str
     :return: Arrow object
     :rtype: bpy object
     """
-    # Check Blender version to account for API change
-    if bpy.app.version[0] == 2 and bpy.app.version[1] < 70:
-        bpy.ops.wm.link_append(directory=os.path.dirname(__file__)+'/arrow_cylinder.blend/Object/', filepath="arrow_cylinder.blend",  filename="Arrow", link=True)
-    else:
-        bpy.ops.wm.link(directory=os.path.dirname(__file__)+'/arrow_cylinder.blend/Object/', filepath="arrow_cylinder.blend",  filename="Arrow")
-    arrow = bpy.data.objects['Arrow']
+    arrow = arrow_template().copy()
+    arrow.name = name
+    bpy.context.scene.objects.link(arrow)
     arrow.location = loc
     if rot_euler:
         arrow.rotation_mode='XYZ'
         arrow.rotation_euler=rot_euler
     scale = scale * mass**-.5  # Inverse square root of mass gives a physical relative size of motions
     arrow.scale = [scale] * 3 # Scalar to 3 elements: scale uniformly
-    arrow.name = 'Arrow.{0}'.format(time.time()) # This is a hack to give arrows unique names. There should be a better solution.
     return arrow
 
 def _norm(*args):
@@ -3,9 +3,10 @@
 Functions relating to the import of v_sim ascii files
 """
 
-import re 
 from collections import namedtuple
+from collections.abc import Sequence
 from mathutils import Vector
+from vsim2blender.ascii_reader import load_vsim
 
 class Mode(namedtuple('Mode', 'freq qpt vectors')):
     """
@@ -20,11 +21,46 @@ class Mode(namedtuple('Mode', 'freq qpt vectors')):
     """
     pass
 
-def import_vsim(filename):
+class ModeList(Sequence):
+    """
+    Sequence of "Mode" namedtuples, decoded from v_sim ascii data on demand
+
+    :param vsim_data: Data from ascii file
+    :type vsim_data: vsim2blender.ascii_reader.VsimFile or
+        vsim2blender.ascii_reader.VsimData
+    """
+    def __init__(self, vsim_data):
+        self.vsim_data = vsim_data
+        self._modes = {}
+
+    def __len__(self):
+        return len(self.vsim_data.frequencies)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index not in self._modes:
+            vectors = self.vsim_data.get_eigenvectors(index).tolist()
+            self._modes[index] = Mode(float(self.vsim_data.frequencies[index]),
+                                      self.vsim_data.qpts[index].tolist(),
+                                      vectors)
+        return self._modes[index]
+
+def import_vsim(filename, cache=False):
     """
     Import data from v_sim ascii file, including lattice vectors, atomic positions and phonon modes
 
+    This is a compatibility wrapper around
+    :func:`vsim2blender.ascii_reader.load_vsim`. Unless a binary sidecar
+    is used, the file is scanned once and the eigenvectors of each mode
+    are only decoded when that mode is accessed.
+
     :param filename: Path to .ascii file
+    :param cache: Read data from (and if necessary, write) a binary
+        sidecar file
+    :type cache: bool
 
     :returns: cell_vsim, positions, symbols, vibs
 
@@ -35,90 +71,15 @@ def import_vsim(filename):
     :return symbols:   Symbols corresponding to atomic positions
     :rtype: list of strings
     :return vibs:      Vibrations
-    :rtype: list of "Mode" namedtuples
-
-    """
-    with open(filename,'r') as f:
-        f.readline() # Skip header
-        # Read in lattice vectors (2-row format) and cast as floats
-        cell_vsim = [[float(x) for x in f.readline().split()],
-                     [float(x) for x in f.readline().split()]]
-        # Read in all remaining non-commented lines as positions/symbols, commented lines to new array
-        positions, symbols, commentlines = [], [], []
-        for line in f:
-            if line[0] != '#' and line[0] != '\!':
-                line = line.split()
-                position = [float(x) for x in line[0:3]]
-                symbol = line[3]
-                positions.append(Vector(position))
-                symbols.append(symbol)
-            else:
-                commentlines.append(line.strip())
-
-    # remove comment characters and implement linebreaks (linebreak character \)
-
-    for index, line in enumerate(commentlines):
-        while line[-1] == '\\':
-            line = line[:-1] + commentlines.pop(index+1)[1:]
-        commentlines[index] = line[1:]
-
-    # Import data from commentlines
-    vibs = []
-    for line in commentlines:
-        vector_txt = re.search('qpt=\[(.+)\]',line)
-        if vector_txt:
-            mode_data = vector_txt.group(1).split(';')
-            qpt = [float(x) for x in mode_data[0:3]]
-            freq = float(mode_data[3])
-            vector_list = [float(x) for x in mode_data[4:]]
-            vector_set = [vector_list[6*i:6*i+6] for i in range(len(positions))]
-            complex_vectors = [[complex(x[0],x[3]),
-                               complex(x[1],x[4]),
-                                       complex(x[2],x[5])] for x in vector_set]
-            vibs.append(Mode(freq, qpt, complex_vectors))
-
-    if _check_if_reduced(filename):
-        positions = _reduced_to_cartesian(positions, cell_vsim)
-            
-    return (cell_vsim, positions, symbols, vibs)
-
-def _check_if_reduced(filename):
-    """
-    Scan a .ascii file for the "reduced" keyword
-
-    :params filename: v_sim .ascii file to check
-    :type filename: float
+    :rtype: ModeList (sequence of "Mode" namedtuples)
 
-    :returns: Boolean
     """
-    with open(filename,'r') as f:
-        f.readline() # Skip header
-        for line in f:
-            if 'reduced' in line:
-                return True
-        else:
-            return False
-
-def _reduced_to_cartesian(positions, cell_vsim):
-    """
-    Convert a set of atomic positions in lattice vector units to Cartesian coordinates
+    vsim_data = load_vsim(filename, cache=cache)
 
-    :param positions: Atomic positions in reduced coordinates
-    :type positions: List of 3-tuples/lists/Vectors
-    :param cell_vsim: Lattice vectors in v_sim (6-value) format
-    :format cell_vsim: 2x3 nested lists
+    cell_vsim = vsim_data.cell_vsim.tolist()
+    positions = [Vector(position) for position in vsim_data.positions]
 
-    :returns: Atomic positions in Cartesian coordinates
-    :rtype: List of 3-Vectors
-    """
-    lattice_vectors = cell_vsim_to_vectors(cell_vsim)
-    cartesian_positions = []
-    for position in positions:
-        cartesian_position = Vector((0.,0.,0.))
-        for position_i, vector in zip(position, lattice_vectors):
-            cartesian_position += position_i * vector
-        cartesian_positions.append(cartesian_position)
-    return cartesian_positions
+    return (cell_vsim, positions, vsim_data.symbols, ModeList(vsim_data))
 
 def cell_vsim_to_vectors(cell_vsim):
     """
@@ -0,0 +1,472 @@
+"""
+NumPy-backed reader for v_sim ascii files
+
+This module does not depend on bpy or mathutils, so the parsed data can
+be used outside of Blender.
+"""
+
+import hashlib
+import io
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+
+class VsimData(namedtuple('VsimData', ('cell_vsim positions symbols '
+                                       'frequencies qpts eigenvectors '
+                                       'keywords'))):
+    """
+    Structure and vibrational data imported from a v_sim ascii file
+
+    :param cell_vsim: Lattice vectors in v_sim format
+    :type cell_vsim: 2x3 array of floats
+    :param positions: Atomic positions in Cartesian coordinates
+    :type positions: (n_atoms, 3) array of floats
+    :param symbols: Symbols corresponding to atomic positions
+    :type symbols: list of strings
+    :param frequencies: Vibrational frequencies
+    :type frequencies: (n_modes,) array of floats
+    :param qpts: **q**-points of modes in reciprocal lattice coordinates
+    :type qpts: (n_modes, 3) array of floats
+    :param eigenvectors: Complex displacement vectors of each atom
+    :type eigenvectors: (n_modes, n_atoms, 3) array of complex numbers
+    :param keywords: Keywords declared in the file, e.g. "reduced",
+        "angdeg" or units such as "bohrd0". Reduced positions and angdeg
+        cells have already been converted.
+    :type keywords: list of strings
+    """
+    def get_eigenvectors(self, mode_index):
+        """
+        Get the eigenvectors of a single mode
+
+        :param mode_index: id of mode; 0 corresponds to first mode in file
+        :type mode_index: int
+
+        :returns: Complex displacement vectors
+        :rtype: (n_atoms, 3) array of complex numbers
+        """
+        return self.eigenvectors[mode_index]
+
+
+# A backslash at the end of a comment line continues the line; the comment
+# character at the start of the following line is discarded.
+_continuation_regex = re.compile(r'\\[ \t]*\r?\n[#!]')
+_qpt_regex = re.compile(r'qpt=\[([^\]]*)\]')
+_keyword_regex = re.compile(r'^[#!]\s*keyword\s*:(.*)$')
+
+
+class _VsimScan(namedtuple('_VsimScan', ('cell_vsim positions symbols '
+                                         'keywords spans heads'))):
+    """
+    Result of a single pass over a v_sim ascii file
+
+    :param keywords: Keywords declared in file. The cell and positions
+        have already been converted accordingly.
+    :type keywords: list of str
+    :param spans: Byte offsets (start, end) of each qpt=[...] block
+    :type spans: list of 2-tuples of ints
+    :param heads: q-point and frequency from the start of each block
+    :type heads: list of 4-lists of floats
+    """
+    pass
+
+
+def _scan_vsim(f):
+    """
+    Read the structure from a v_sim ascii file and index its mode blocks
+
+    Keywords are collected in the same pass; the "angdeg" and "reduced"
+    keywords are applied to the cell and atomic positions respectively.
+    The eigenvectors are not decoded; only the position of each block in
+    the file and its leading q-point and frequency values are recorded.
+
+    :param f: File object opened in binary mode
+    :type f: file
+
+    :returns: Structure data and mode block index
+    :rtype: _VsimScan
+    """
+    offset = len(f.readline())  # Skip header
+    # Read in lattice vectors (2-row format) and cast as floats
+    cell_lines = f.readline(), f.readline()
+    offset += sum(map(len, cell_lines))
+    cell_vsim = np.array([line.split() for line in cell_lines], dtype=float)
+
+    position_lines, keywords, spans, heads = [], [], [], []
+    block_start, head = None, []
+    for line in f:
+        line_start, offset = offset, offset + len(line)
+
+        if line[:1] not in (b'#', b'!'):
+            if line.strip():
+                position_lines.append(line.decode().split())
+            continue
+
+        if block_start is None:
+            if b'qpt=[' not in line:
+                keyword_match = _keyword_regex.match(line.decode().strip())
+                if keyword_match:
+                    keywords.extend(keyword_match.group(1)
+                                    .replace(',', ' ').split())
+                continue
+            block_start, head = line_start, []
+            line = line.split(b'qpt=[', 1)[1]
+        else:
+            line = line[1:]
+
+        # Only the leading q-point and frequency values are parsed here
+        if len(head) < 4:
+            head.extend(line.split(b']')[0].rstrip().rstrip(b'\\')
+                        .replace(b';', b' ').split())
+
+        if not line.rstrip().endswith(b'\\'):
+            spans.append((block_start, offset))
+            heads.append([float(x) for x in head[0:4]])
+            block_start = None
+
+    positions = np.array([line[0:3] for line in position_lines],
+                         dtype=float).reshape(-1, 3)
+    symbols = [line[3] for line in position_lines]
+
+    if 'angdeg' in keywords:
+        cell_vsim = angdeg_to_cell_vsim(cell_vsim)
+    if 'reduced' in keywords:
+        positions = reduced_to_cartesian(positions, cell_vsim)
+
+    return _VsimScan(cell_vsim, positions, symbols, keywords, spans, heads)
+
+
+def _block_payload(block):
+    """
+    Extract the contents of a qpt=[...] block
+
+    :param block: Raw text of block, including comment characters and
+        line continuations
+    :type block: bytes
+
+    :returns: Text inside the square brackets
+    :rtype: str
+    """
+    block = _continuation_regex.sub('', block.decode())
+    return _qpt_regex.search(block).group(1)
+
+
+def read_vsim(filename):
+    """
+    Import data from v_sim ascii file, including lattice vectors, atomic
+    positions and phonon modes
+
+    The file is read once and the mode data is tokenised in bulk.
+
+    :param filename: Path to .ascii file
+    :type filename: str
+
+    :returns: Structure and vibrational data
+    :rtype: VsimData
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    scan = _scan_vsim(io.BytesIO(data))
+
+    frequencies, qpts, eigenvectors = _parse_mode_blocks(
+        [_block_payload(data[start:end]) for start, end in scan.spans],
+        len(scan.symbols))
+
+    return VsimData(scan.cell_vsim, scan.positions, scan.symbols,
+                    frequencies, qpts, eigenvectors, scan.keywords)
+
+
+class VsimFile(object):
+    def __init__(self, filename):
+        """
+        Lazy, indexed access to the modes of a v_sim ascii file
+
+        The file is scanned once to read the structure and record the
+        byte range of each mode block; the eigenvectors of a mode are only
+        decoded when requested.
+
+        :param filename: Path to .ascii file
+        :type filename: str
+
+        """
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            scan = _scan_vsim(f)
+
+        self.cell_vsim = scan.cell_vsim
+        self.positions = scan.positions
+        self.symbols = scan.symbols
+        self.keywords = scan.keywords
+        self.qpts = np.array([head[0:3] for head in scan.heads],
+                             dtype=float).reshape(-1, 3)
+        self.frequencies = np.array([head[3] for head in scan.heads],
+                                    dtype=float)
+        self._spans = scan.spans
+
+    def __len__(self):
+        return len(self._spans)
+
+    def get_eigenvectors(self, mode_index):
+        """
+        Decode the eigenvectors of a single mode
+
+        :param mode_index: id of mode; 0 corresponds to first mode in file
+        :type mode_index: int
+
+        :returns: Complex displacement vectors
+        :rtype: (n_atoms, 3) array of complex numbers
+        """
+        start, end = self._spans[mode_index]
+        with open(self.filename, 'rb') as f:
+            f.seek(start)
+            block = f.read(end - start)
+
+        _, _, eigenvectors = _parse_mode_blocks([_block_payload(block)],
+                                                len(self.symbols))
+        return eigenvectors[0]
+
+
+# Binary sidecar files
+#
+# Parsed data is stored in the per-user cache directory (see cache_dir) as
+# two files named by a hash of the absolute path of the ascii file: a .npz
+# archive holding the structure, frequencies, q-points and a key identifying
+# the source file, and a .npy array of eigenvectors which can be
+# memory-mapped. Nothing is written next to the input, so read-only inputs
+# are cached too. The sidecar is only used if the version, path,
+# modification time and size recorded in the key all match.
+
+CACHE_VERSION = 2
+
+
+def cache_dir():
+    """
+    Directory of binary sidecar files
+
+    This is ``ascii-phonons-ascii`` in the per-user cache directory
+    (``$XDG_CACHE_HOME``, by default ``~/.cache``). It is kept apart from
+    the render cache so that evicting renders never removes sidecars.
+
+    :rtype: str
+    """
+    return os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                       os.path.join(os.path.expanduser('~'),
+                                                    '.cache')),
+                        'ascii-phonons-ascii')
+
+
+def cache_paths(filename):
+    """
+    Get the paths of the binary sidecar files for an ascii file
+
+    :param filename: Path to .ascii file
+    :type filename: str
+
+    :returns: Paths to metadata (.npz) and eigenvector (.npy) files
+    :rtype: 2-tuple of str
+    """
+    name = hashlib.sha256(
+        os.path.abspath(filename).encode('utf-8')).hexdigest()
+    root = os.path.join(cache_dir(), name)
+    return root + '.npz', root + '.npy'
+
+
+def _cache_key(filename):
+    """Get (version, path, mtime, size) identifying current file contents"""
+    stat = os.stat(filename)
+    return (CACHE_VERSION, os.path.abspath(filename),
+            stat.st_mtime, stat.st_size)
+
+
+def write_cache(filename, data=None):
+    """
+    Write a binary sidecar for an ascii file
+
+    Files are written to temporary names and moved into place, so
+    concurrent readers and writers never see partial data.
+
+    :param filename: Path to .ascii file
+    :type filename: str
+    :param data: Data parsed from the file. If None, the file is read.
+    :type data: VsimData or None
+
+    :returns: Data written to sidecar
+    :rtype: VsimData
+    """
+    key = _cache_key(filename)
+    if data is None:
+        data = read_vsim(filename)
+    meta_path, eigenvector_path = cache_paths(filename)
+    if not os.path.isdir(cache_dir()):
+        os.makedirs(cache_dir())
+
+    # Eigenvectors are moved into place first; the metadata records their
+    # shape so that a mismatched pair is detected when reading.
+    tmp_path = '{0}.{1}.tmp'.format(eigenvector_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(data.eigenvectors))
+    os.replace(tmp_path, eigenvector_path)
+
+    tmp_path = '{0}.{1}.tmp'.format(meta_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.savez(f,
+                 version=key[0], path=key[1], mtime=key[2], size=key[3],
+                 cell_vsim=data.cell_vsim,
+                 positions=data.positions,
+                 symbols=np.array(data.symbols, dtype=str),
+                 frequencies=data.frequencies,
+                 qpts=data.qpts,
+                 keywords=np.array(data.keywords, dtype=str),
+                 eigenvector_shape=data.eigenvectors.shape)
+    os.replace(tmp_path, meta_path)
+
+    return data
+
+
+def read_cache(filename):
+    """
+    Read the binary sidecar for an ascii file, if it is valid
+
+    :param filename: Path to .ascii file
+    :type filename: str
+
+    :returns: Structure and vibrational data with memory-mapped
+        eigenvectors, or None if there is no up-to-date sidecar
+    :rtype: VsimData or None
+    """
+    meta_path, eigenvector_path = cache_paths(filename)
+    try:
+        with np.load(meta_path) as meta:
+            if (int(meta['version']), str(meta['path']), float(meta['mtime']),
+                    int(meta['size'])) != _cache_key(filename):
+                return None
+            eigenvectors = np.load(eigenvector_path, mmap_mode='r')
+            if eigenvectors.shape != tuple(meta['eigenvector_shape']):
+                return None
+            return VsimData(meta['cell_vsim'], meta['positions'],
+                            meta['symbols'].tolist(), meta['frequencies'],
+                            meta['qpts'], eigenvectors,
+                            meta['keywords'].tolist())
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+
+def load_vsim(filename, cache=False):
+    """
+    Get data from an ascii file, using the binary sidecar if requested
+
+    :param filename: Path to .ascii file
+    :type filename: str
+    :param cache: If True, use the binary sidecar; if it is missing or out
+        of date the whole file is parsed and a new sidecar is written.
+        If False, return a lazy :class:`VsimFile`.
+    :type cache: bool
+
+    :returns: Structure and vibrational data
+    :rtype: VsimData or VsimFile
+    """
+    if not cache:
+        return VsimFile(filename)
+
+    data = read_cache(filename)
+    if data is None:
+        data = read_vsim(filename)
+        try:
+            write_cache(filename, data=data)
+        except (IOError, OSError):
+            # Cache directory not writable; carry on without a sidecar
+            pass
+    return data
+
+
+def _parse_mode_blocks(mode_blocks, n_atoms):
+    """
+    Convert the contents of a series of qpt=[...] blocks to arrays
+
+    Each block consists of semicolon-separated values: three q-point
+    coordinates, the frequency and then six values (real x, y, z;
+    imaginary x, y, z) for each atom.
+
+    :param mode_blocks: Text inside the square brackets of each block
+    :type mode_blocks: list of str
+    :param n_atoms: Number of atoms in the unit cell
+    :type n_atoms: int
+
+    :returns: frequencies, qpts, eigenvectors
+    :rtype: (n_modes,) float array, (n_modes, 3) float array,
+        (n_modes, n_atoms, 3) complex array
+    """
+    n_modes = len(mode_blocks)
+    block_length = 4 + 6 * n_atoms
+    values = np.array(';'.join(mode_blocks).replace(';', ' ').split(),
+                      dtype=float)
+    if values.size != n_modes * block_length:
+        raise ValueError('Expected {0} values for {1} modes of {2} atoms, '
+                         'found {3}'.format(n_modes * block_length, n_modes,
+                                            n_atoms, values.size))
+    values = values.reshape(n_modes, block_length)
+
+    vectors = values[:, 4:].reshape(n_modes, n_atoms, 6)
+    eigenvectors = vectors[:, :, 0:3] + 1j * vectors[:, :, 3:6]
+
+    return values[:, 3].copy(), values[:, 0:3].copy(), eigenvectors
+
+
+def cell_vsim_to_array(cell_vsim):
+    """
+    Convert v_sim 6-value lattice vector format to a matrix with one
+    Cartesian lattice vector per row
+
+    :param cell_vsim: Lattice vectors in v_sim format
+    :type cell_vsim: 2x3 nested lists or array
+
+    :returns: Cartesian lattice vectors
+    :rtype: 3x3 array
+    """
+    dxx, dyx, dyy = cell_vsim[0]
+    dzx, dzy, dzz = cell_vsim[1]
+    return np.array([[dxx, 0., 0.],
+                     [dyx, dyy, 0.],
+                     [dzx, dzy, dzz]])
+
+
+def reduced_to_cartesian(positions, cell_vsim):
+    """
+    Convert a set of atomic positions in lattice vector units to
+    Cartesian coordinates
+
+    :param positions: Atomic positions in reduced coordinates
+    :type positions: (n_atoms, 3) array
+    :param cell_vsim: Lattice vectors in v_sim (6-value) format
+    :type cell_vsim: 2x3 nested lists or array
+
+    :returns: Atomic positions in Cartesian coordinates
+    :rtype: (n_atoms, 3) array
+    """
+    return np.dot(positions, cell_vsim_to_array(cell_vsim))
+
+
+def angdeg_to_cell_vsim(cell_angdeg):
+    """
+    Convert lattice parameters to v_sim 6-value lattice vector format
+
+    With the "angdeg" keyword, v_sim files give the cell as lengths
+    a, b, c and angles alpha, beta, gamma (in degrees).
+
+    :param cell_angdeg: Lattice parameters; (a, b, c) and
+        (alpha, beta, gamma)
+    :type cell_angdeg: 2x3 nested lists or array
+
+    :returns: Lattice vectors in v_sim format
+    :rtype: 2x3 array
+    """
+    (a, b, c), angles = cell_angdeg
+    cos_alpha, cos_beta, cos_gamma = np.cos(np.radians(angles))
+    sin_gamma = np.sin(np.radians(angles[2]))
+
+    dzx = c * cos_beta
+    dzy = c * (cos_alpha - cos_beta * cos_gamma) / sin_gamma
+    return np.array([[a, b * cos_gamma, b * sin_gamma],
+                     [dzx, dzy, np.sqrt(c**2 - dzx**2 - dzy**2)]])
@@ -0,0 +1,153 @@
+"""
+Per-element colours, radii and masses compiled from configuration
+
+The [colours], [radii] and [masses] sections of the configuration
+files are read once for the elements of a structure and stored in
+arrays indexed by species, so that drawing many atoms does not parse
+config values atom by atom. This module does not depend on bpy.
+"""
+
+import random
+
+import numpy as np
+
+import vsim2blender
+
+_default_table = None
+
+
+def element_colour(config, symbol):
+    """
+    Get the colour of an element
+
+    Elements without a colour in the configuration are given a random
+    colour, which is the same every time for the same symbol.
+
+    :param config: Settings from configuration files
+    :type config: configparser.ConfigParser
+    :param symbol: Chemical symbol
+    :type symbol: str
+
+    :returns: Linear RGB values from 0 to 1
+    :rtype: 3-list of floats
+    """
+    if symbol in config['colours']:
+        return [float(x) for x in config['colours'][symbol].split()]
+    else:
+        return _random_colour(symbol)
+
+
+def _random_colour(symbol):
+    rng = random.Random(symbol)
+    return [rng.random(), rng.random(), rng.random()]
+
+
+class ElementTable(object):
+    def __init__(self, symbols, colours, radii, masses):
+        """Colour, radius and mass of each species
+
+        Usually created with :func:`compile_table`.
+
+        :param symbols: Chemical symbols; row i of each array belongs to
+            symbols[i]
+        :type symbols: list of str
+        :param colours: Linear RGB colours
+        :type colours: (n_species, 3) array-like
+        :param radii: Covalent radii (1. if not configured)
+        :type radii: (n_species,) array-like
+        :param masses: Atomic masses (NaN if not configured)
+        :type masses: (n_species,) array-like
+
+        """
+        self.symbols = list(symbols)
+        self.colours = np.asarray(colours, dtype=float).reshape(-1, 3)
+        self.radii = np.asarray(radii, dtype=float)
+        self.masses = np.asarray(masses, dtype=float)
+        self._rows = dict((symbol, row)
+                          for row, symbol in enumerate(self.symbols))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._rows
+
+    def row(self, symbol):
+        """Row of an element in the table arrays"""
+        return self._rows[symbol]
+
+    def colour(self, symbol):
+        """Linear RGB colour of an element as a 3-tuple
+
+        Elements not in the table get a fixed random colour, as
+        :func:`element_colour`.
+        """
+        if symbol in self:
+            return tuple(float(x) for x in self.colours[self.row(symbol)])
+        else:
+            return tuple(_random_colour(symbol))
+
+    def radius(self, symbol):
+        """Radius of an element, or 1. if not in the table"""
+        if symbol in self:
+            return float(self.radii[self.row(symbol)])
+        else:
+            return 1.
+
+    def mass_factors(self, mass_weighting=0.):
+        """
+        Mass-weighting factor of each species
+
+        :param mass_weighting: Exponent applied to the masses; if 0, all
+            factors are 1 and masses are not needed
+        :type mass_weighting: float
+
+        :rtype: (n_species,) array
+        """
+        if not mass_weighting:
+            return np.ones(len(self.symbols))
+        missing = [symbol for symbol, mass in zip(self.symbols, self.masses)
+                   if np.isnan(mass)]
+        if missing:
+            raise Exception("No mass configured for {0}".format(
+                ', '.join(missing)))
+        return self.masses**mass_weighting
+
+
+def compile_table(config, symbols):
+    """
+    Look up the colour, radius and mass of elements in a configuration
+
+    Priority order is 1. User conf file 2. elements.conf
+
+    :param config: Settings from configuration files
+    :type config: configparser.ConfigParser
+    :param symbols: Chemical symbols, without repeats
+    :type symbols: list of str
+
+    :rtype: ElementTable
+    """
+    return ElementTable(
+        symbols,
+        [element_colour(config, symbol) for symbol in symbols],
+        [float(config['radii'][symbol]) if symbol in config['radii'] else 1.
+         for symbol in symbols],
+        [float(config['masses'][symbol]) if symbol in config['masses']
+         else np.nan for symbol in symbols])
+
+
+def default_table():
+    """
+    Table of all elements in the default configuration files
+
+    The files are read on first use only.
+
+    :rtype: ElementTable
+    """
+    global _default_table
+    if _default_table is None:
+        config = vsim2blender.read_config()
+        symbols = sorted(set(config['colours']) | set(config['radii']) |
+                         set(config['masses']))
+        _default_table = compile_table(config, symbols)
+    return _default_table
@@ -1,18 +1,19 @@
 import bpy
+import bmesh
 import os
 import random
+import shutil
 # import sys
 from mathutils import Vector, Matrix
-import math
-import cmath
-import itertools
+import numpy as np
 import vsim2blender
 
 # sys.path.insert(0, os.path.abspath(script_directory)+'/..')
-from vsim2blender.ascii_importer import (import_vsim,
-                                         cell_vsim_to_vectors)
 from vsim2blender.arrows import add_arrow, vector_to_euler
 import vsim2blender.camera as camera
+from vsim2blender.elements import compile_table, default_table
+import vsim2blender.scene_graph as scene_graph
+import vsim2blender.vibrations as vibrations
 
 script_directory = os.path.dirname(__file__)
 
@@ -71,6 +72,37 @@ def init_material(symbol, col=False, shadeless=True):
     return material
 
 
+def atom_mesh(symbol, material, subdivisions=3):
+    """
+    Get the unit sphere mesh shared by all atoms of an element
+
+    The mesh is created on first use; atom objects link to it and are
+    sized by their scale, so the number of meshes scales with the number
+    of elements rather than the number of atoms.
+
+    :param symbol: Chemical symbol
+    :type symbol: String
+    :param material: Material assigned to the mesh on creation
+    :type material: bpy material object
+    :param subdivisions: Icosphere subdivision level
+    :type subdivisions: int
+
+    :returns: bpy mesh
+    """
+    name = 'Atom.{0}'.format(symbol)
+    if name in bpy.data.meshes.keys():
+        return bpy.data.meshes[name]
+
+    mesh = bpy.data.meshes.new(name)
+    sphere = bmesh.new()
+    bmesh.ops.create_icosphere(sphere, subdivisions=subdivisions,
+                               diameter=1.)
+    sphere.to_mesh(mesh)
+    sphere.free()
+    mesh.materials.append(material)
+    return mesh
+
+
 def absolute_position(position, lattice_vectors=[1., 1., 1.],
                       cell_id=[0, 0, 0], reduced=False):
     """
@@ -106,7 +138,8 @@ def absolute_position(position, lattice_vectors=[1., 1., 1.],
 
 
 def add_atom(position, lattice_vectors, symbol, cell_id=(0, 0, 0),
-             scale_factor=1., reduced=False, name=False, config=False):
+             scale_factor=1., reduced=False, name=False, config=False,
+             instanced=True, subdivisions=3, elements=None):
     """
     Add atom to scene
 
@@ -129,40 +162,78 @@ def add_atom(position, lattice_vectors, symbol, cell_id=(0, 0, 0),
     :param name: Label for atom object
     :type name: String
     :param config: Settings from configuration files
-        (incl. atom colours and radii)
+        (incl. atom colours and radii). Ignored if elements is given.
     :type config: configparser.ConfigParser
+    :param instanced: If True, link the new object to a sphere mesh shared
+        by all atoms of this element. If False, add a new sphere mesh
+        with the bpy.ops operator.
+    :type instanced: Boolean
+    :param subdivisions: Icosphere subdivision level of the atom mesh
+    :type subdivisions: int
+    :param elements: Colours and radii compiled from the configuration.
+        If neither this nor config is given, the default configuration
+        files are used; they are only read once per session.
+    :type elements: vsim2blender.elements.ElementTable
 
     :returns: bpy object
     """
 
-    if not config:
-        config = vsim2blender.read_config()
+    if elements is None:
+        if config:
+            elements = compile_table(config, [symbol])
+        else:
+            elements = default_table()
 
     cartesian_loc = absolute_position(position,
                                       lattice_vectors=lattice_vectors,
                                       cell_id=cell_id, reduced=reduced)
 
-    # Get colour and atomic radius. Priority order is
-    # 1. User conf file 2. elements.conf
-    if symbol in config['colours']:
-        col = [float(x) for x in config['colours'][symbol].split()]
-    else:
-        col = False
-    if symbol in config['radii']:
-        radius = float(config['radii'][symbol])
+    material = init_material(symbol, col=list(elements.colour(symbol)))
+    return atom_object(symbol, cartesian_loc,
+                       elements.radius(symbol) * scale_factor, material,
+                       name=name, instanced=instanced,
+                       subdivisions=subdivisions)
+
+
+def atom_object(symbol, location, size, material, name=False,
+                instanced=True, subdivisions=3):
+    """
+    Add a sphere for an atom at a Cartesian position
+
+    :param symbol: Chemical symbol, naming the material and shared mesh
+    :type symbol: String
+    :param location: Cartesian coordinates
+    :type location: 3-tuple, list or Vector
+    :param size: Radius of sphere
+    :type size: float
+    :param material: Material of the atom, from :func:`init_material`
+    :type material: bpy material object
+    :param name: Label for atom object
+    :type name: String
+    :param instanced: If True, link the new object to a sphere mesh shared
+        by all atoms of this element. If False, add a new sphere mesh
+        with the bpy.ops operator.
+    :type instanced: Boolean
+    :param subdivisions: Icosphere subdivision level of the atom mesh
+    :type subdivisions: int
+
+    :returns: bpy object
+    """
+    if instanced:
+        atom = bpy.data.objects.new(name if name else symbol,
+                                    atom_mesh(symbol, material,
+                                              subdivisions=subdivisions))
+        atom.location = location
+        atom.scale = [size] * 3
+        bpy.context.scene.objects.link(atom)
     else:
-        radius = 1.0
-
-    size = radius * scale_factor
-    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                          location=cartesian_loc,
-                                          size=size)
-    atom = bpy.context.object
-    if name:
-        atom.name = name
-
-    material = init_material(symbol, col=col)
-    atom.data.materials.append(material)
+        bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdivisions,
+                                              location=location,
+                                              size=size)
+        atom = bpy.context.object
+        if name:
+            atom.name = name
+        atom.data.materials.append(material)
     # Smooth shader goes here; does nothing for flat colours however
     # bpy.ops.object.shade_smooth()
 
@@ -218,18 +289,92 @@ def animate_atom_vibs(atom, qpt, d_vector,
     :type mass: float
     """
 
-    r = atom.location.copy()
-
     if type(end_frame) != int:
         end_frame = start_frame + n_frames - 1
-    for frame in range(start_frame, end_frame+1):
-        bpy.context.scene.frame_set(frame)
-        exponent = cmath.exp(complex(0, 1) * (r.dot(qpt) -
-                             2 * math.pi*frame/n_frames))
-        norm_displ = Vector(map((lambda y: (y.real)),
-                            [x * exponent for x in d_vector]))
-        atom.location = r + mass**-.5 * magnitude * norm_displ
-        atom.keyframe_insert(data_path="location", index=-1)
+
+    locations = vibrations.trajectory([atom.location], np.identity(3),
+                                      (1, 1, 1), qpt, [d_vector],
+                                      masses=[mass], n_frames=n_frames,
+                                      start_frame=start_frame,
+                                      end_frame=end_frame,
+                                      magnitude=magnitude)[:, 0, :]
+    keyframe_locations(atom, range(start_frame, end_frame+1), locations)
+
+
+def keyframe_locations(bpy_object, frames, locations, cyclic=False):
+    """
+    Write LOC keyframes directly to the F-curves of a new action
+
+    This avoids the scene update triggered by frame_set() and the
+    per-keyframe overhead of keyframe_insert(); all points on each
+    F-curve are allocated and filled in one call.
+
+    :param bpy_object: Object to animate
+    :type bpy_object: bpy Object
+    :param frames: Frame numbers
+    :type frames: sequence of ints
+    :param locations: Object location at each frame
+    :type locations: (n_frames, 3) array-like
+    :param cyclic: Repeat the keyframes indefinitely with a Cycles
+        modifier. The last keyframe should then equal the first.
+    :type cyclic: bool
+    """
+    n_keyframes = len(frames)
+    locations = np.asarray(locations, dtype=np.float32)
+
+    for index, fcurve in enumerate(_location_fcurves(bpy_object)):
+        fcurve.keyframe_points.add(n_keyframes)
+        # Flattened (frame, value) pairs
+        coordinates = np.empty(2 * n_keyframes, dtype=np.float32)
+        coordinates[0::2] = frames
+        coordinates[1::2] = locations[:, index]
+        fcurve.keyframe_points.foreach_set('co', coordinates)
+        fcurve.update()
+        if cyclic:
+            fcurve.modifiers.new('CYCLES')
+
+
+def animate_analytic(bpy_object, rest, amplitude, phase, n_frames=30):
+    """
+    Animate LOC with F-curve generator modifiers instead of keyframes
+
+    Each location F-curve carries a cosine function generator which
+    evaluates rest + amplitude * cos(2 pi frame / n_frames - phase), so
+    the size of the scene does not depend on the number of frames.
+
+    :param bpy_object: Object to animate
+    :type bpy_object: bpy Object
+    :param rest: Rest position
+    :type rest: 3-array
+    :param amplitude: Amplitude of oscillation along each axis
+    :type amplitude: 3-array
+    :param phase: Phase of oscillation along each axis in radians
+    :type phase: 3-array
+    :param n_frames: Animation length of a single oscillation cycle in
+        frames
+    :type n_frames: int
+    """
+    bpy_object.location = rest
+
+    for index, fcurve in enumerate(_location_fcurves(bpy_object)):
+        generator = fcurve.modifiers.new('FNGENERATOR')
+        generator.function_type = 'COS'
+        generator.amplitude = amplitude[index]
+        generator.phase_multiplier = 2 * np.pi / n_frames
+        generator.phase_offset = -phase[index]
+        generator.value_offset = rest[index]
+
+
+def _location_fcurves(bpy_object):
+    """Create a new action for object with x, y, z location F-curves"""
+    if bpy_object.animation_data is None:
+        bpy_object.animation_data_create()
+    action = bpy.data.actions.new(name=bpy_object.name + 'Action')
+    bpy_object.animation_data.action = action
+
+    return [action.fcurves.new('location', index=index,
+                               action_group='Location')
+            for index in range(3)]
 
 
 def vector_with_phase(atom, qpt, d_vector):
@@ -248,11 +393,8 @@ def vector_with_phase(atom, qpt, d_vector):
     :param magnitude: Scale factor for vibrations.
     :type magnitude: float
     """
-    r = atom.location
-    exponent = cmath.exp(complex(0, 1) * r.dot(qpt))
-    arrow_end = r + Vector(map((lambda y: (y.real)),
-                               [x * exponent for x in d_vector]))
-    return arrow_end - r
+    return Vector(vibrations.arrow_vectors([atom.location], np.identity(3),
+                                           (1, 1, 1), qpt, [d_vector])[0])
 
 
 def open_mode(**options):
@@ -261,6 +403,17 @@ def open_mode(**options):
 
     :param input_file: Path to file
     :type input_file: str
+    :param instance_atoms: Share one sphere mesh between all atoms of each
+        element (default True), rather than creating a mesh per atom
+    :type instance_atoms: bool
+    :param cache_ascii: Read the parsed ascii data from a binary sidecar
+        file in the cache directory, creating it if necessary
+    :type cache_ascii: bool
+    :param animation: Animation backend. 'keyframes' (default) writes a
+        keyframe for every frame; 'analytic' stores the amplitude and
+        phase of each atom in F-curve modifiers, which is faster and
+        smaller for long animations.
+    :type animation: str
     :param camera_rot: Camera tilt adjustment in degrees
     :type camera_rot: float
     :param config: Settings from configuration files
@@ -298,6 +451,11 @@ def open_mode(**options):
     :param scale_vib: Scale factor for oscillations
         (angstroms / normalised eigenvector).
     :type scale_vib: float
+    :param scene_graph: Path to a scene graph saved with
+        :meth:`vsim2blender.scene_graph.SceneGraph.save`, which is drawn
+        instead of building one from the input file. Only the mode it
+        was saved with can be shown.
+    :type scene_graph: str
     :param show_box: If True, show bounding box
     :type show_box: bool
     :param start_frame: The starting frame number of the rendered
@@ -313,11 +471,51 @@ def open_mode(**options):
     :param zoom: Camera zoom adjustment
     :type zoom: float
 
-    """
+    :returns: Scene objects, which may be passed to :func:`set_mode` to
+        show a different mode without rebuilding the structure
+    :rtype: ModeScene
 
-    # Initialise Opts object, accessing options and user config
+    """
     opts = vsim2blender.Opts(options)
+    mode_scene = build_scene(**options)
+    set_mode(mode_scene, opts.get('mode_index', 0))
+    return mode_scene
+
 
+class ModeScene(object):
+    """
+    Objects of a visualisation which do not depend on the phonon mode
+
+    Created by :func:`build_scene`; the displacements of a mode are
+    applied with :func:`set_mode`.
+
+    :param opts: Options used to build the scene
+    :type opts: vsim2blender.Opts
+    :param graph: Description of the scene, which supplies the
+        displacements and arrows of each mode
+    :type graph: vsim2blender.scene_graph.SceneGraph
+    :param atoms: Atom objects, ordered as
+        :func:`vsim2blender.vibrations.supercell_positions`
+    :type atoms: list of bpy Objects
+
+    After :func:`set_mode`, ``period`` is the number of frames after
+    which the animation repeats exactly: n_frames, or 1 if nothing moves.
+    """
+    def __init__(self, opts, graph, atoms):
+        self.opts = opts
+        self.graph = graph
+        self.positions = graph.positions
+        self.lattice_vectors = graph.lattice_vectors
+        self.masses = graph.masses
+        self.supercell = graph.supercell
+        self.atoms = atoms
+        self.arrows = []
+        self.mode_index = None
+        self.period = None
+
+
+def _frame_range(opts):
+    """Get static, start_frame, end_frame, n_frames from options"""
     # Work out actual frame range.
     # Priority goes 1. static/preview 2. end_frame 3. n_frames
     start_frame = opts.get('start_frame', 0)
@@ -335,112 +533,140 @@ def open_mode(**options):
     else:
         end_frame = opts.get('end_frame', start_frame + n_frames - 1)
 
-    input_file = opts.get('input_file', False)
-    if input_file:
-        (vsim_cell, positions, symbols, vibs) = import_vsim(input_file)
-        lattice_vectors = cell_vsim_to_vectors(vsim_cell)
-    else:
-        raise Exception('No .ascii file provided')
+    return static, start_frame, end_frame, n_frames
+
+
+def build_scene(**options):
+    """
+    Draw the atoms, bounding box and camera for a v_sim ascii file
+
+    No mode is applied, so atoms are at rest and there are no arrows.
+    Options are as for :func:`open_mode`.
+
+    :returns: Scene objects for use with :func:`set_mode`
+    :rtype: ModeScene
+    """
+
+    # Initialise Opts object, accessing options and user config
+    opts = vsim2blender.Opts(options)
+
+    animation = opts.get('animation', 'keyframes')
+    if animation not in ('keyframes', 'analytic'):
+        raise Exception('Unknown animation type "{0}"'.format(animation))
 
-    if opts.get('mass_weighting', 0):
-        f = opts.get('mass_weighting', 1)
-        masses = [float(opts.config['masses'][symbol])**f
-                      for symbol in symbols]
+    if opts.get('scene_graph', False):
+        graph = scene_graph.load(opts.get('scene_graph', False))
     else:
-        masses = [1 for symbol in symbols]
+        graph = scene_graph.build_graph(**options)
 
     # Switch to a new empty scene
     bpy.ops.scene.new(type='EMPTY')
 
     # Draw bounding box
-    if (opts.get('show_box', True)):
-        bbox_offset = opts.get('offset_box', (0, 0, 0))
-        bbox_offset = Vector(bbox_offset)
-        draw_bounding_box(lattice_vectors, offset=bbox_offset)
-
-    # Draw atoms after checking config
-    mode_index = opts.get('mode_index', 0)
-    supercell = (opts.get('supercell', (2, 2, 2)))
-    vectors = opts.get('vectors', False)
-
-    normalise_vectors = opts.get('normalise_vectors', False)
-    # Variable for tracking largest arrow
-    max_vector = 0
-    arrow_objects = []
-
-    mass_weighting = opts.get('mass_weighting', 0.)
-    assert type(mass_weighting) == float
-
-    for cell_id_tuple in itertools.product(range(supercell[0]),
-                                           range(supercell[1]),
-                                           range(supercell[2])):
-        cell_id = Vector(cell_id_tuple)
-        for (atom_index,
-             (position, symbol, mass)) in enumerate(zip(positions,
-                                                        symbols,
-                                                        masses)):
-            atom = add_atom(position, lattice_vectors, symbol,
-                            cell_id=cell_id,
-                            scale_factor=opts.get('scale_atom', 1.),
-                            name='{0}_{1}_{2}{3}{4}'.format(
-                                atom_index, symbol, *cell_id_tuple),
-                            config=opts.config)
-            if vectors or not static:
-                displacement_vector = vibs[mode_index].vectors[atom_index]
-                qpt = vibs[mode_index].qpt
-                B = (2 * math.pi *
-                     Matrix(lattice_vectors).inverted().transposed())
-                qpt_cartesian = Vector(qpt) * B
-
-            if not static:
-                animate_atom_vibs(atom, qpt_cartesian,
-                                  displacement_vector,
-                                  start_frame=start_frame,
-                                  end_frame=end_frame,
-                                  n_frames=n_frames,
-                                  magnitude=opts.get('scale_vib', 1.),
-                                  mass=mass)
-            if vectors:
-                arrow_vector = vector_with_phase(atom, qpt_cartesian,
-                                                 displacement_vector)
-                scale = arrow_vector.length
-                loc = absolute_position(position,
-                                        lattice_vectors=lattice_vectors,
-                                        cell_id=cell_id)
-                # Arrows are scaled by eigenvector magnitude
-                arrow_objects.append(
-                    add_arrow(loc=loc,
-                              mass=mass,
-                              rot_euler=vector_to_euler(arrow_vector),
-                              scale=scale))
-
-    if vectors:
-        col = str2list(opts.config.get('colours', 'arrow',
-                       fallback='0. 0. 0.'))
-        bpy.data.materials['Arrow'].diffuse_color = col
-
-    # Rescaling; either by clamping max or accounting for cell size
-    if vectors and normalise_vectors:
-        master_scale = opts.get('scale_arrow', 1.)
-        # Compare first element of object scales; they should be isotropic!
-        max_length = max((arrow.scale[0] for arrow in arrow_objects))
-        for arrow in arrow_objects:
-            arrow.scale *= master_scale / max_length
-
-    elif vectors:
-        master_scale = opts.get('scale_arrow', 1.) * len(positions)
-        for arrow in arrow_objects:
-            arrow.scale *= master_scale
-
-    # Position camera and colour world. Note that cameras as objects and
-    # cameras as 'cameras' have different attributes, so need to look up
-    # camera in bpy.data.cameras to set field of view.
-
-    camera.setup_camera(lattice_vectors, field_of_view=0.2, opts=opts)
+    if graph.box_offset is not None:
+        draw_bounding_box([Vector(v) for v in graph.lattice_vectors],
+                          offset=graph.box_offset)
+
+    # Draw atoms. Materials are made once per element from the table of
+    # the scene graph.
+    elements = graph.elements
+    materials = [init_material(symbol, col=list(colour))
+                 for symbol, colour in zip(elements.symbols,
+                                           elements.colours)]
+    subdivisions = 1 if opts.get('draft', False) else 3
+    atoms = [atom_object(elements.symbols[species], Vector(location), radius,
+                         materials[species], name=name,
+                         instanced=opts.get('instance_atoms', True),
+                         subdivisions=subdivisions)
+             for species, location, radius, name in zip(
+                 graph.images.species_indices, graph.rest_positions,
+                 graph.atom_radii, graph.atom_names)]
+
+    # Position camera and colour world
+    camera.place_camera(graph.camera)
 
     bpy.context.scene.world = bpy.data.worlds['World']
-    bpy.data.worlds['World'].horizon_color = str2list(opts.config.get(
-        'colours', 'background', fallback='0.5 0.5 0.5'))
+    bpy.data.worlds['World'].horizon_color = list(graph.style['background'])
+
+    return ModeScene(opts, graph, atoms)
+
+
+def set_mode(mode_scene, mode_index):
+    """
+    Show a phonon mode in a scene from :func:`build_scene`
+
+    Animation from any previous mode is removed and replaced; arrows are
+    created on first use and afterwards only rotated and rescaled.
+
+    :param mode_scene: Scene objects
+    :type mode_scene: ModeScene
+    :param mode_index: id of mode; 0 corresponds to first mode in ascii file
+    :type mode_index: int
+    """
+    opts = mode_scene.opts
+    graph = mode_scene.graph
+    static, start_frame, end_frame, n_frames = _frame_range(opts)
+    animation = opts.get('animation', 'keyframes')
+
+    # Return atoms to rest, discarding animation of the previous mode
+    for atom, rest_position in zip(mode_scene.atoms, graph.rest_positions):
+        if atom.animation_data is not None:
+            action = atom.animation_data.action
+            atom.animation_data_clear()
+            if action is not None and action.users == 0:
+                bpy.data.actions.remove(action)
+        atom.location = rest_position
+
+    # Displacements for the whole supercell are computed in one go
+    graph.set_mode(mode_index)
+    mode_scene.period = graph.period
+
+    if mode_scene.period == 1:
+        pass
+    elif animation == 'analytic':
+        amplitudes, phases = vibrations.oscillation_parameters(
+            graph.displacements)
+        for row, atom in enumerate(mode_scene.atoms):
+            animate_analytic(atom, graph.rest_positions[row],
+                             amplitudes[row], phases[row], n_frames=n_frames)
+    else:
+        # Only keyframe one cycle if the animation is longer than that
+        cyclic = end_frame - start_frame + 1 > n_frames
+        if cyclic:
+            end_frame = start_frame + n_frames
+
+        frames = range(start_frame, end_frame + 1)
+        locations = graph.trajectory(frames)
+        for row, atom in enumerate(mode_scene.atoms):
+            keyframe_locations(atom, frames, locations[:, row, :],
+                               cyclic=cyclic)
+
+    if graph.arrow_vectors is not None:
+        _set_arrows(mode_scene, graph.arrow_vectors, graph.arrow_scales)
+
+    mode_scene.mode_index = mode_index
+
+
+def _set_arrows(mode_scene, arrow_vectors, scales):
+    """Create or update one arrow per atom to show the given vectors"""
+    graph = mode_scene.graph
+
+    if not mode_scene.arrows:
+        for location, atom_index, cell_id in zip(
+                graph.rest_positions, graph.atom_indices, graph.cell_ids):
+            mode_scene.arrows.append(
+                add_arrow(loc=Vector(location),
+                          name='Arrow_{0}_{1}{2}{3}'.format(
+                              atom_index, *cell_id)))
+
+        bpy.data.materials['Arrow'].diffuse_color = list(
+            graph.style['arrow'])
+
+    for arrow, vector, scale in zip(mode_scene.arrows, arrow_vectors,
+                                    scales):
+        arrow.rotation_mode = 'XYZ'
+        arrow.rotation_euler = vector_to_euler(vector)
+        arrow.scale = [scale] * 3
 
 
 def setup_render(start_frame=0, end_frame=None, n_frames=30, preview=False):
@@ -500,6 +726,9 @@ def setup_render_freestyle(**options):
         keys in [general] section and 'outline' and 'box' keys in [colours]
         section
     :type config: str
+    :param draft: Rough render for interactive previews: no Freestyle
+        outlines, edge enhancement or anti-aliasing
+    :type draft: bool
 
     """
 
@@ -530,6 +759,16 @@ def setup_render_freestyle(**options):
     bpy.context.scene.frame_start = start_frame
     bpy.context.scene.frame_end = end_frame
 
+    if opts.get('draft', False):
+        render_settings = bpy.context.scene.render
+        render_settings.use_freestyle = False
+        render_settings.use_edge_enhance = False
+        render_settings.use_antialiasing = False
+        if opts.get('show_box', True):
+            bpy.data.materials['Bounding Box'].type = 'SURFACE'
+            mesh_to_wireframe(bpy.data.objects['Bounding Box'])
+        return
+
     bpy.context.scene.render.use_freestyle = True
 
     renderlayer = bpy.context.scene.render.layers['RenderLayer']
@@ -606,7 +845,7 @@ def mark_edges(bpy_object):
     return bpy_object
 
 
-def render(scene=False, output_file=False, preview=False):
+def render(scene=False, output_file=False, preview=False, period=None):
     """
     Render the scene
 
@@ -619,13 +858,21 @@ def render(scene=False, output_file=False, preview=False):
     :param preview: Write to a temporary preview file at low resolution
         instead of the output. Set to empty string '' if not a preview.
     :type preview: str
+    :param period: Number of frames after which the animation repeats
+        (see :class:`ModeScene`). Only the first period is rendered; the
+        image files of later frames are linked to those of the same
+        phase. If None, every frame is rendered.
+    :type period: int or None
+
+    :returns: Frame numbers of images which were linked, not rendered
+    :rtype: list of ints
 
     """
     if preview:
         output_file = preview
 
     if (not output_file) or output_file == 'False' or output_file == '':
-        pass
+        return []
 
     else:
         if not scene:
@@ -636,9 +883,163 @@ def render(scene=False, output_file=False, preview=False):
 
         # Work out if animation or still is required
 
-        animate = (bpy.data.scenes[scene].frame_start !=
-                   bpy.data.scenes[scene].frame_end)
+        frame_start = bpy.data.scenes[scene].frame_start
+        frame_end = bpy.data.scenes[scene].frame_end
+        animate = (frame_start != frame_end)
+        repeats = repeated_frames(frame_start, frame_end, period)
+
+        if not repeats:
+            # Render!
+            bpy.ops.render.render(animation=animate,
+                                  write_still=(not animate), scene=scene)
+            return []
+
+        # Link each frame as soon as it is written, before anything else
+        # (e.g. the worker's host) can move or remove it
+        def link_repeats(bpy_scene):
+            frame = bpy_scene.frame_current
+            source = bpy.path.abspath(bpy_scene.render.frame_path(frame=frame))
+            for repeat in repeats.get(frame, []):
+                _link_file(source, bpy.path.abspath(
+                    bpy_scene.render.frame_path(frame=repeat)))
+
+        bpy.data.scenes[scene].frame_end = frame_start + period - 1
+        bpy.app.handlers.render_write.insert(0, link_repeats)
+        try:
+            bpy.ops.render.render(animation=True, scene=scene)
+        finally:
+            bpy.app.handlers.render_write.remove(link_repeats)
+            bpy.data.scenes[scene].frame_end = frame_end
+
+        return sorted(frame for frames in repeats.values()
+                      for frame in frames)
+
+
+def repeated_frames(frame_start, frame_end, period):
+    """
+    Find frames which repeat an earlier frame of a periodic animation
+
+    :param frame_start: First frame
+    :type frame_start: int
+    :param frame_end: Last frame
+    :type frame_end: int
+    :param period: Animation period in frames, or None if not periodic
+    :type period: int or None
+
+    :returns: Frames in the first period, each mapped to the later frames
+        with the same phase. Empty if no frames repeat.
+    :rtype: dict
+    """
+    repeats = {}
+    if period:
+        for frame in range(frame_start + period, frame_end + 1):
+            source = frame_start + (frame - frame_start) % period
+            repeats.setdefault(source, []).append(frame)
+    return repeats
+
+
+def _link_file(source, destination):
+    """Hard-link a file, or copy it if links are not supported"""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except (AttributeError, OSError):
+        shutil.copyfile(source, destination)
+
+
+def render_to_buffer(buffer_file, scene=False, callback=None, period=None,
+                     frames=None):
+    """
+    Render all frames into a raw pixel array file instead of image files
+
+    Frames are stored as a (n_frames, height, width, 4) array of uint8
+    RGBA values, top row first, which other processes can open with
+    numpy.memmap. Pixels are copied from a compositor Viewer node, as the
+    Render Result has no pixel data when Blender runs in background mode.
 
-        # Render!
-        bpy.ops.render.render(animation=animate,
-                              write_still=(not animate), scene=scene)
+    :param buffer_file: Path of array file; any existing file is replaced
+    :type buffer_file: str
+    :param scene: Name of scene. If False, render active scene.
+    :type scene: String or Boolean False
+    :param callback: Function called as callback(index, frame, shape)
+        after each frame has been stored
+    :type callback: function or None
+    :param period: Number of frames after which the animation repeats.
+        Frames with the same phase as an earlier frame are copied rather
+        than rendered. If None, every frame is rendered.
+    :type period: int or None
+    :param frames: Frame numbers to render, in order. If None, the frame
+        range of the scene.
+    :type frames: list of ints or None
+
+    :returns: Shape of the frame array
+    :rtype: 4-tuple of ints
+    """
+    if not scene:
+        scene = bpy.context.scene.name
+    scene = bpy.data.scenes[scene]
+
+    _viewer_node(scene)
+    width = (scene.render.resolution_x *
+             scene.render.resolution_percentage // 100)
+    height = (scene.render.resolution_y *
+              scene.render.resolution_percentage // 100)
+    if frames is None:
+        frames = range(scene.frame_start, scene.frame_end + 1)
+    shape = (len(frames), height, width, 4)
+
+    buffer = np.memmap(buffer_file, dtype=np.uint8, mode='w+', shape=shape)
+    pixels = np.empty(height * width * 4, dtype=np.float32)
+    rendered = {}
+    for index, frame in enumerate(frames):
+        phase = frame % period if period else frame
+        if phase in rendered:
+            buffer[index] = buffer[rendered[phase]]
+            if callback is not None:
+                callback(index, frame, shape)
+            continue
+        rendered[phase] = index
+
+        scene.frame_set(frame)
+        bpy.ops.render.render(write_still=False, scene=scene.name)
+        bpy.data.images['Viewer Node'].pixels.foreach_get(pixels)
+
+        # Viewer pixels are linear and bottom row first; saved images
+        # would have the sRGB display transform applied
+        rgba = pixels.reshape(height, width, 4)[::-1]
+        rgb = np.clip(rgba[:, :, :3], 0, 1)
+        rgb = np.where(rgb <= 0.0031308, 12.92 * rgb,
+                       1.055 * rgb**(1 / 2.4) - 0.055)
+        buffer[index, :, :, :3] = rgb * 255 + 0.5
+        buffer[index, :, :, 3] = np.clip(rgba[:, :, 3], 0, 1) * 255 + 0.5
+        buffer.flush()
+
+        if callback is not None:
+            callback(index, frame, shape)
+
+    del buffer
+    return shape
+
+
+def _viewer_node(scene):
+    """Get compositor Viewer node fed by render layers, adding it if needed"""
+    scene.use_nodes = True
+    tree = scene.node_tree
+    for node in tree.nodes:
+        if node.type == 'VIEWER':
+            return node
+
+    layers = [node for node in tree.nodes if node.type == 'R_LAYERS']
+    if layers:
+        layers = layers[0]
+    else:
+        layers = tree.nodes.new('CompositorNodeRLayers')
+    if not [node for node in tree.nodes if node.type == 'COMPOSITE']:
+        composite = tree.nodes.new('CompositorNodeComposite')
+        tree.links.new(layers.outputs['Image'], composite.inputs['Image'])
+
+    viewer = tree.nodes.new('CompositorNodeViewer')
+    viewer.use_alpha = True
+    tree.links.new(layers.outputs['Image'], viewer.inputs['Image'])
+    return viewer
@@ -0,0 +1,468 @@
+"""
+Renderer-independent description of a phonon mode visualisation
+
+A :class:`SceneGraph` holds everything needed to draw a mode: the atoms
+of the supercell with their rest positions, radii and colours, the
+displacements which give their trajectory, the arrows, the unit cell box,
+the camera and the colours and line widths of the image. It is built from
+the parsed ascii data and options without bpy or mathutils, so it can be
+computed (and saved with :meth:`SceneGraph.save`) outside Blender.
+:mod:`vsim2blender.plotter` creates Blender objects from it and
+:mod:`ascii_phonons.software` draws it directly.
+"""
+
+import json
+import math
+
+import numpy as np
+
+import vsim2blender
+from vsim2blender.ascii_reader import load_vsim, cell_vsim_to_array
+from vsim2blender.elements import ElementTable, compile_table
+from vsim2blender.structure import Structure
+import vsim2blender.vibrations as vibrations
+
+# Camera field of view (radians), focal length and sensor width (mm)
+FIELD_OF_VIEW = 0.2
+LENS = 75.
+SENSOR_WIDTH = 32.
+
+# Length of the arrow model (arrow_cylinder.blend) at unit scale
+ARROW_LENGTH = 2.
+
+# Pairs of corner indices joined by the edges of the box
+BOX_EDGES = ((0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6),
+             (6, 7), (7, 4), (0, 4), (1, 5), (2, 6), (3, 7))
+
+FORMAT_VERSION = 1
+
+
+def _config_colour(config, key, fallback):
+    return [float(x) for x in config.get('colours', key,
+                                         fallback=fallback).split()]
+
+
+def frame_range(opts):
+    """
+    Get the frames to render and whether atoms move
+
+    Following :func:`vsim2blender.plotter.setup_render_freestyle`, the
+    frame range is a single frame if 'static' is set. Following
+    :func:`vsim2blender.plotter.open_mode`, atoms are still if 'static'
+    is set or, by default, in previews.
+
+    :param opts: Options
+    :type opts: vsim2blender.Opts
+
+    :returns: frames, n_frames, static
+    :rtype: (list of ints, int, bool)
+    """
+    start_frame = opts.get('start_frame', 0)
+    n_frames = opts.get('n_frames', 30)
+    if opts.get('static', False):
+        end_frame = start_frame
+    else:
+        end_frame = opts.get('end_frame', start_frame + n_frames - 1)
+    static = opts.get('static', bool(opts.get('preview', False)))
+    return list(range(start_frame, end_frame + 1)), n_frames, static
+
+
+def _rotate(vector, axis, angle):
+    """Rotate a vector about an axis (Rodrigues' formula)"""
+    axis = axis / np.linalg.norm(axis)
+    return (vector * math.cos(angle) +
+            np.cross(axis, vector) * math.sin(angle) +
+            axis * np.dot(axis, vector) * (1 - math.cos(angle)))
+
+
+def camera_parameters(lattice_vectors, opts):
+    """
+    Place the camera for a view along the Miller indices
+
+    The camera looks at the centre of the supercell along the direction
+    given by the Miller indices, from the distance at which every corner
+    of the supercell is in view.
+
+    :param lattice_vectors: Lattice vectors, one per row
+    :type lattice_vectors: 3x3 array
+    :param opts: Options; 'camera_rot', 'miller', 'orthographic',
+        'supercell' and 'zoom' are used
+    :type opts: vsim2blender.Opts
+
+    :returns: Camera 'position' and 'target', unit vectors 'right', 'up'
+        and 'forward' (the view direction), 'distance', 'orthographic',
+        'ortho_scale', 'lens', 'sensor_width' and 'field_of_view'
+    :rtype: dict
+    """
+    camera_rot = opts.get('camera_rot', 0)
+    miller = opts.get('miller', (0, 1, 0))
+    supercell = opts.get('supercell', (2, 2, 2))
+
+    a, b, c = (np.asarray(supercell, dtype=float)[:, np.newaxis] *
+               lattice_vectors)
+    centre = 0.5 * (a + b + c)
+    vertices = np.array([[0, 0, 0], a, a + b, b, c, c + a, c + a + b,
+                         c + b]) - centre
+
+    reciprocal = 2 * math.pi * np.linalg.inv(lattice_vectors).T
+    direction = np.dot(np.asarray(miller, dtype=float), reciprocal)
+    direction /= np.linalg.norm(direction)
+
+    rejections = vertices - np.outer(np.dot(vertices, direction), direction)
+    distance = (np.linalg.norm(rejections, axis=1).max() /
+                math.sin(FIELD_OF_VIEW))
+
+    # The camera tracks the centre with its y axis towards the z axis of
+    # the target, which is turned by camera_rot about the view direction
+    # (transform.rotate turns clockwise about its axis)
+    forward = -direction
+    up = _rotate(np.array([0., 0., 1.]), direction, -math.radians(camera_rot))
+    right = np.cross(forward, up)
+    if np.linalg.norm(right) < 1e-8:
+        right = np.cross(forward, [0., 1., 0.])
+    right /= np.linalg.norm(right)
+    up = np.cross(right, forward)
+
+    return {'position': centre + distance * direction,
+            'target': centre,
+            'right': right,
+            'up': up,
+            'forward': forward,
+            'distance': distance,
+            'orthographic': bool(opts.get('orthographic', False)),
+            'ortho_scale': distance / 2.5,
+            'lens': opts.get('zoom', 1.) * LENS,
+            'sensor_width': SENSOR_WIDTH,
+            'field_of_view': FIELD_OF_VIEW}
+
+
+class SceneGraph(object):
+    def __init__(self, structure, supercell, elements, scale_atom,
+                 mass_weighting, box_offset, camera, style, resolution,
+                 frames, n_frames, static, source=None):
+        """Atoms, arrows, box, camera and style of a visualisation
+
+        Usually created with :func:`build_graph` or :func:`load`.
+        Supercell atoms are ordered as
+        :func:`vsim2blender.vibrations.supercell_positions`, i.e. all
+        atoms of one cell before the next cell.
+
+        :param structure: Unit cell
+        :type structure: vsim2blender.structure.Structure
+        :param supercell: Supercell dimensions
+        :type supercell: 3-tuple of ints
+        :param elements: Colour, radius and mass of each species of the
+            structure, in the order of ``structure.species``
+        :type elements: vsim2blender.elements.ElementTable
+        :param scale_atom: Scale of atoms, relative to covalent radius
+        :type scale_atom: float
+        :param mass_weighting: Exponent of mass-weighting applied to
+            displacements and arrows
+        :type mass_weighting: float
+        :param box_offset: Position of unit cell box in lattice vector
+            coordinates, or None to hide the box
+        :type box_offset: 3-tuple of floats or None
+        :param camera: Camera parameters from :func:`camera_parameters`
+        :type camera: dict
+        :param style: Linear RGB 'background', 'outline', 'box' and
+            'arrow' colours, and 'outline_thickness' and 'box_thickness'
+            in pixels
+        :type style: dict
+        :param resolution: 'x_pixels', 'y_pixels' and 'percentage'
+        :type resolution: dict
+        :param frames: Frame numbers to render
+        :type frames: list of ints
+        :param n_frames: Animation length of a single oscillation cycle
+        :type n_frames: int
+        :param static: If True, atoms do not move
+        :type static: bool
+        :param source: Data and options used by :meth:`set_mode`, as
+            (vsim_data, opts). None for a graph loaded from a file, which
+            only holds the mode it was saved with.
+        :type source: tuple or None
+
+        """
+        self.structure = structure
+        self.images = structure.supercell(supercell)
+        self.lattice_vectors = structure.lattice_vectors
+        self.supercell = self.images.dimensions
+        self.symbols = structure.symbols
+        self.positions = structure.cart_positions
+        self.elements = elements
+        self.scale_atom = scale_atom
+        self.mass_weighting = mass_weighting
+
+        # Per-atom values are indexed from the per-species table
+        species = structure.species_indices
+        self.radii = elements.radii[species] * scale_atom
+        self.colours = elements.colours[species]
+        self.masses = elements.mass_factors(mass_weighting)[species]
+        self.box_offset = (None if box_offset is None else
+                           tuple(float(x) for x in box_offset))
+        self.camera = camera
+        self.style = style
+        self.resolution = resolution
+        self.frames = list(frames)
+        self.n_frames = n_frames
+        self.static = static
+        self.source = source
+
+        self.cell_ids = self.images.row_cell_ids
+        self.atom_indices = self.images.atom_indices
+        self.rest_positions = self.images.positions
+
+        self.mode_index = None
+        self.period = None
+        self.displacements = None
+        self.arrow_vectors = None
+        self.arrow_scales = None
+
+    def __len__(self):
+        """Number of atoms in the supercell"""
+        return len(self.rest_positions)
+
+    @property
+    def atom_symbols(self):
+        """Chemical symbol of each atom in the supercell"""
+        return [self.symbols[index] for index in self.atom_indices]
+
+    @property
+    def atom_radii(self):
+        """Radius of each atom in the supercell"""
+        return self.radii[self.atom_indices]
+
+    @property
+    def atom_colours(self):
+        """Linear RGB colour of each atom in the supercell"""
+        return self.colours[self.atom_indices]
+
+    @property
+    def atom_names(self):
+        """Object name of each atom in the supercell"""
+        return ['{0}_{1}_{2}{3}{4}'.format(index, self.symbols[index],
+                                           *cell_id)
+                for index, cell_id in zip(self.atom_indices, self.cell_ids)]
+
+    @property
+    def box_corners(self):
+        """Cartesian corners of the unit cell box, or None if hidden"""
+        if self.box_offset is None:
+            return None
+        a, b, c = self.lattice_vectors
+        corners = np.array([[0, 0, 0], a, a + b, b, c, c + a, c + a + b,
+                            c + b])
+        return corners + np.dot(self.box_offset, self.lattice_vectors)
+
+    def set_mode(self, mode_index):
+        """
+        Compute the displacements, period and arrows of a phonon mode
+
+        Eigenvectors are only decoded if atoms move or arrows are shown.
+
+        :param mode_index: id of mode; 0 corresponds to first mode in
+            ascii file
+        :type mode_index: int
+        """
+        if mode_index == self.mode_index:
+            return
+        if self.source is None:
+            raise Exception("Scene graph was saved with mode {0}; "
+                            "mode {1} is not available".format(
+                                self.mode_index, mode_index))
+        vsim_data, opts = self.source
+        vectors = opts.get('vectors', False)
+        magnitude = opts.get('scale_vib', 1.)
+
+        self.displacements = self.arrow_vectors = self.arrow_scales = None
+        self.period = 1
+        if vectors or not self.static:
+            eigenvectors = vsim_data.get_eigenvectors(mode_index)
+            qpt_cartesian = vibrations.qpt_to_cartesian(
+                vsim_data.qpts[mode_index], self.lattice_vectors)
+
+        # Every frame is the same if the atoms do not move
+        if not self.static and magnitude and np.any(eigenvectors):
+            self.displacements = vibrations.displacements(
+                self.positions, self.lattice_vectors, self.supercell,
+                qpt_cartesian, eigenvectors, masses=self.masses,
+                magnitude=magnitude)
+            self.period = self.n_frames
+
+        if vectors:
+            self.arrow_vectors = vibrations.arrow_vectors(
+                self.positions, self.lattice_vectors, self.supercell,
+                qpt_cartesian, eigenvectors)
+
+            # Arrows are scaled by eigenvector magnitude. Inverse square
+            # root of mass gives a physical relative size of motions.
+            scales = (np.linalg.norm(self.arrow_vectors, axis=1) *
+                      self.masses[self.atom_indices]**-.5)
+            # Rescaling; either by clamping max or accounting for cell size
+            if opts.get('normalise_vectors', False):
+                scales *= opts.get('scale_arrow', 1.) / scales.max()
+            else:
+                scales *= opts.get('scale_arrow', 1.) * len(self.symbols)
+            self.arrow_scales = scales
+
+        self.mode_index = mode_index
+
+    def trajectory(self, frames=None):
+        """
+        Positions of all atoms at each frame
+
+        :param frames: Frame numbers; by default the frames to render
+        :type frames: list of ints or None
+
+        :returns: Cartesian positions
+        :rtype: (n_frames, n_atoms, 3) float32 array
+        """
+        if frames is None:
+            frames = self.frames
+        if self.displacements is None:
+            return np.tile(self.rest_positions.astype(np.float32),
+                           (len(frames), 1, 1))
+        return vibrations.positions_at(self.rest_positions,
+                                       self.displacements, frames,
+                                       self.n_frames)
+
+    def arrows(self):
+        """
+        Arrow vectors at the length of the drawn arrows
+
+        :returns: Start and vector of each arrow, or None if there are
+            no arrows
+        :rtype: 2-tuple of (n_atoms, 3) arrays, or None
+        """
+        if self.arrow_vectors is None:
+            return None
+        lengths = np.linalg.norm(self.arrow_vectors, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            directions = self.arrow_vectors / lengths[:, np.newaxis]
+        return (self.rest_positions,
+                np.nan_to_num(directions) *
+                (ARROW_LENGTH * self.arrow_scales)[:, np.newaxis])
+
+    def save(self, filename):
+        """
+        Write the graph and its current mode to a compressed .npz file
+
+        :param filename: Output path
+        :type filename: str
+        """
+        header = {'version': FORMAT_VERSION,
+                  'supercell': self.supercell,
+                  'symbols': self.symbols,
+                  'box_offset': self.box_offset,
+                  'camera': dict((key, value.tolist()
+                                  if isinstance(value, np.ndarray) else
+                                  value)
+                                 for key, value in self.camera.items()),
+                  'style': dict((key, list(value)
+                                 if isinstance(value, (list, np.ndarray))
+                                 else value)
+                                for key, value in self.style.items()),
+                  'resolution': self.resolution,
+                  'species': self.elements.symbols,
+                  'scale_atom': self.scale_atom,
+                  'mass_weighting': self.mass_weighting,
+                  'frames': self.frames,
+                  'n_frames': self.n_frames,
+                  'static': self.static,
+                  'mode_index': self.mode_index,
+                  'period': self.period}
+        arrays = {'lattice_vectors': self.lattice_vectors,
+                  'positions': self.positions,
+                  'element_colours': self.elements.colours,
+                  'element_radii': self.elements.radii,
+                  'element_masses': self.elements.masses}
+        for key in ('displacements', 'arrow_vectors', 'arrow_scales'):
+            if getattr(self, key) is not None:
+                arrays[key] = getattr(self, key)
+        np.savez_compressed(filename, header=np.array(json.dumps(header)),
+                            **arrays)
+
+
+def load(filename):
+    """
+    Read a scene graph written by :meth:`SceneGraph.save`
+
+    :param filename: Path to .npz file
+    :type filename: str
+
+    :returns: Scene graph with the mode it was saved with
+    :rtype: SceneGraph
+    """
+    with np.load(filename) as data:
+        header = json.loads(str(data['header']))
+        if header.get('version') != FORMAT_VERSION:
+            raise Exception("Unsupported scene graph file: {0}".format(
+                filename))
+        camera = dict((key, np.array(value) if isinstance(value, list)
+                       else value)
+                      for key, value in header['camera'].items())
+        structure = Structure(data['lattice_vectors'], data['positions'],
+                              header['symbols'])
+        elements = ElementTable(header['species'], data['element_colours'],
+                                data['element_radii'],
+                                data['element_masses'])
+        graph = SceneGraph(structure, header['supercell'], elements,
+                           header['scale_atom'], header['mass_weighting'],
+                           header['box_offset'], camera, header['style'],
+                           header['resolution'], header['frames'],
+                           header['n_frames'], header['static'])
+        graph.mode_index = header['mode_index']
+        graph.period = header['period']
+        for key in ('displacements', 'arrow_vectors', 'arrow_scales'):
+            if key in data:
+                setattr(graph, key, data[key])
+    return graph
+
+
+def build_graph(**options):
+    """
+    Describe the visualisation of a v_sim ascii file
+
+    No mode is applied; call :meth:`SceneGraph.set_mode`. Options are as
+    for :func:`vsim2blender.plotter.open_mode` and
+    :func:`vsim2blender.plotter.setup_render_freestyle`.
+
+    :returns: Scene graph
+    :rtype: SceneGraph
+    """
+    opts = vsim2blender.Opts(options)
+    config = opts.config
+
+    input_file = opts.get('input_file', False)
+    if not input_file:
+        raise Exception('No .ascii file provided')
+    vsim_data = load_vsim(input_file, cache=opts.get('cache_ascii', False))
+    structure = Structure(cell_vsim_to_array(vsim_data.cell_vsim),
+                          vsim_data.positions, vsim_data.symbols)
+    lattice_vectors = structure.lattice_vectors
+
+    # Config values are parsed once per species, not per atom
+    elements = compile_table(config, structure.species)
+
+    if opts.get('show_box', True):
+        box_offset = opts.get('offset_box', (0, 0, 0))
+    else:
+        box_offset = None
+
+    style = {'background': _config_colour(config, 'background',
+                                          '0.5 0.5 0.5'),
+             'outline': _config_colour(config, 'outline', '0. 0. 0.'),
+             'box': _config_colour(config, 'box', '1. 1. 1.'),
+             'arrow': _config_colour(config, 'arrow', '0. 0. 0.'),
+             'outline_thickness': opts.get('outline_thickness', 3),
+             'box_thickness': opts.get('box_thickness', 5)}
+    resolution = {'x_pixels': int(opts.get('x_pixels', 512)),
+                  'y_pixels': int(opts.get('y_pixels', 512)),
+                  'percentage': 40 if opts.get('preview', False) else 100}
+
+    frames, n_frames, static = frame_range(opts)
+    return SceneGraph(structure, opts.get('supercell', (2, 2, 2)), elements,
+                      opts.get('scale_atom', 1.),
+                      opts.get('mass_weighting', 0.), box_offset,
+                      camera_parameters(lattice_vectors, opts), style,
+                      resolution, frames, n_frames, static,
+                      source=(vsim_data, opts))
@@ -0,0 +1,144 @@
+"""
+Array-backed crystal structure and supercell
+
+Coordinates are held as contiguous (n, 3) float arrays and chemical
+symbols as integer indices into a list of species, so the atoms of a
+supercell are generated by broadcasting rather than one position at a
+time. This module does not depend on bpy or mathutils.
+
+Supercell atoms are ordered by cell, as ``itertools.product`` of the
+supercell ranges, with all atoms of one cell before the next cell; the
+row of any (atom_index, cell_id) pair is computed directly by
+:meth:`Supercell.row`.
+"""
+
+import numpy as np
+
+
+def cell_ids(supercell):
+    """
+    Indices of the cells in a supercell
+
+    :param supercell: Supercell dimensions
+    :type supercell: 3-tuple of ints
+
+    :returns: Cell indices in the order of ``itertools.product``
+    :rtype: (n_cells, 3) int array
+    """
+    return np.indices(tuple(supercell), dtype=int).reshape(3, -1).T
+
+
+class Structure(object):
+    def __init__(self, lattice_vectors, positions, symbols, reduced=False):
+        """Atoms in a unit cell
+
+        :param lattice_vectors: Lattice vectors, one per row
+        :type lattice_vectors: 3x3 array-like
+        :param positions: Atomic positions; Cartesian unless reduced=True
+        :type positions: (n_atoms, 3) array-like
+        :param symbols: Chemical symbol of each atom
+        :type symbols: list of str
+        :param reduced: If True, positions are in units of lattice vectors
+        :type reduced: bool
+
+        """
+        self.lattice_vectors = np.ascontiguousarray(lattice_vectors,
+                                                    dtype=float)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        if reduced:
+            self.frac_positions = np.ascontiguousarray(positions)
+            self.cart_positions = np.dot(positions, self.lattice_vectors)
+        else:
+            self.cart_positions = np.ascontiguousarray(positions)
+            self.frac_positions = np.dot(
+                positions, np.linalg.inv(self.lattice_vectors))
+
+        self.species = []
+        indices = {}
+        for symbol in symbols:
+            if symbol not in indices:
+                indices[symbol] = len(self.species)
+                self.species.append(symbol)
+        self.species_indices = np.array([indices[symbol]
+                                         for symbol in symbols], dtype=int)
+
+    def __len__(self):
+        return len(self.species_indices)
+
+    @property
+    def symbols(self):
+        """Chemical symbol of each atom"""
+        return [self.species[index] for index in self.species_indices]
+
+    def supercell(self, dimensions):
+        """
+        Repeat the unit cell
+
+        :param dimensions: Supercell dimensions
+        :type dimensions: 3-tuple of ints
+
+        :rtype: Supercell
+        """
+        return Supercell(self, dimensions)
+
+
+class Supercell(object):
+    def __init__(self, structure, dimensions):
+        """Images of a unit cell in a supercell
+
+        :param structure: Unit cell
+        :type structure: Structure
+        :param dimensions: Supercell dimensions
+        :type dimensions: 3-tuple of ints
+
+        """
+        self.structure = structure
+        self.dimensions = tuple(int(n) for n in dimensions)
+        self.n_atoms = len(structure)
+        self.cell_ids = cell_ids(self.dimensions)
+
+        # Every image is cell offset + unit cell position
+        offsets = np.dot(self.cell_ids, structure.lattice_vectors)
+        self.positions = (offsets[:, np.newaxis, :] +
+                          structure.cart_positions[np.newaxis, :, :]
+                          ).reshape(-1, 3)
+        self.frac_positions = (self.cell_ids[:, np.newaxis, :] +
+                               structure.frac_positions[np.newaxis, :, :]
+                               ).reshape(-1, 3)
+        self.atom_indices = np.tile(np.arange(self.n_atoms),
+                                    len(self.cell_ids))
+        self.row_cell_ids = np.repeat(self.cell_ids, self.n_atoms, axis=0)
+        self.species_indices = structure.species_indices[self.atom_indices]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def row(self, atom_index, cell_id):
+        """
+        Row of an atom image in the supercell arrays
+
+        :param atom_index: Index of atom in the unit cell
+        :type atom_index: int
+        :param cell_id: Index of cell in the supercell
+        :type cell_id: 3-tuple of ints
+
+        :rtype: int
+        """
+        i, j, k = cell_id
+        ny, nz = self.dimensions[1], self.dimensions[2]
+        return ((i * ny + j) * nz + k) * self.n_atoms + atom_index
+
+    def rows(self, atom_indices, cell_ids):
+        """
+        Rows of many atom images, as :meth:`row`
+
+        :param atom_indices: Indices of atoms in the unit cell
+        :type atom_indices: (n,) int array-like
+        :param cell_ids: Indices of cells in the supercell
+        :type cell_ids: (n, 3) int array-like
+
+        :rtype: (n,) int array
+        """
+        cell_ids = np.asarray(cell_ids, dtype=int).reshape(-1, 3)
+        cell_index = np.ravel_multi_index(cell_ids.T, self.dimensions)
+        return cell_index * self.n_atoms + np.asarray(atom_indices, dtype=int)
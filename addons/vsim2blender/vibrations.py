@@ -0,0 +1,230 @@
+"""
+Vectorised calculation of atomic displacements in a phonon mode
+
+This module does not depend on bpy or mathutils; positions for every atom
+in the supercell and every frame are computed together with NumPy. See
+:mod:`vsim2blender.plotter` for the underlying equations.
+"""
+
+import math
+
+import numpy as np
+
+from vsim2blender.structure import cell_ids
+
+
+def qpt_to_cartesian(qpt, lattice_vectors):
+    """
+    Convert a **q**-point from reciprocal lattice coordinates to a
+    Cartesian wave vector
+
+    :param qpt: **q**-point in reciprocal lattice coordinates
+    :type qpt: 3-tuple, list or array
+    :param lattice_vectors: Real-space lattice vectors, one per row
+    :type lattice_vectors: 3x3 array-like
+
+    :returns: Wave vector in Cartesian coordinates
+    :rtype: 3-array
+    """
+    reciprocal = 2 * math.pi * np.linalg.inv(
+        np.asarray(lattice_vectors, dtype=float)).T
+    return np.dot(np.asarray(qpt, dtype=float), reciprocal)
+
+
+def supercell_positions(positions, lattice_vectors, supercell):
+    """
+    Cartesian positions of all atoms in a supercell
+
+    Cells are ordered as ``itertools.product`` of the supercell ranges,
+    with all atoms of one cell before the next cell.
+
+    :param positions: Cartesian positions in the unit cell
+    :type positions: (n_atoms, 3) array-like
+    :param lattice_vectors: Lattice vectors, one per row
+    :type lattice_vectors: 3x3 array-like
+    :param supercell: Supercell dimensions
+    :type supercell: 3-tuple of ints
+
+    :returns: Cartesian positions
+    :rtype: (n_cells * n_atoms, 3) array
+    """
+    offsets = np.dot(cell_ids(supercell),
+                     np.asarray(lattice_vectors, dtype=float))
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    return (offsets[:, np.newaxis, :] +
+            positions[np.newaxis, :, :]).reshape(-1, 3)
+
+
+def _phased_vectors(positions, lattice_vectors, supercell, qpt_cartesian,
+                    eigenvectors, masses=None, magnitude=1.):
+    """Get supercell positions and scaled eigenvectors with phase applied"""
+    r = supercell_positions(positions, lattice_vectors, supercell)
+    n_cells = r.shape[0] // len(positions)
+
+    scale = magnitude * np.ones(len(positions))
+    if masses is not None:
+        scale *= np.asarray(masses, dtype=float)**-.5
+    vectors = (np.asarray(eigenvectors, dtype=complex) *
+               scale[:, np.newaxis])
+
+    vectors = np.tile(vectors, (n_cells, 1))
+    phase = np.exp(1j * np.dot(r, np.asarray(qpt_cartesian, dtype=float)))
+    return r, vectors * phase[:, np.newaxis]
+
+
+def trajectory(positions, lattice_vectors, supercell, qpt_cartesian,
+               eigenvectors, masses=None, n_frames=30, start_frame=0,
+               end_frame=None, magnitude=1.):
+    """
+    Calculate the positions of all supercell atoms at each animation frame
+
+    :param positions: Cartesian positions in the unit cell
+    :type positions: (n_atoms, 3) array-like
+    :param lattice_vectors: Lattice vectors, one per row
+    :type lattice_vectors: 3x3 array-like
+    :param supercell: Supercell dimensions
+    :type supercell: 3-tuple of ints
+    :param qpt_cartesian: wave vector of mode in *Cartesian coordinates*
+    :type qpt_cartesian: 3-array
+    :param eigenvectors: complex vectors describing relative displacement
+        of each atom in the unit cell
+    :type eigenvectors: (n_atoms, 3) complex array-like
+    :param masses: Relative atomic masses (inverse sqrt is used to scale
+        vibration magnitude.) If None, no mass scaling is applied.
+    :type masses: (n_atoms,) array-like or None
+    :param n_frames: Animation length of a single oscillation cycle in
+        frames
+    :type n_frames: int
+    :param start_frame: First frame number
+    :type start_frame: int
+    :param end_frame: Last frame number (default=start_frame+n_frames-1)
+    :type end_frame: int or None
+    :param magnitude: Scale factor for vibrations.
+    :type magnitude: float
+
+    :returns: Cartesian positions, ordered as
+        :func:`supercell_positions`
+    :rtype: (n_frames, n_cells * n_atoms, 3) float32 array
+    """
+    if type(end_frame) != int:
+        end_frame = start_frame + n_frames - 1
+
+    r, vectors = _phased_vectors(positions, lattice_vectors, supercell,
+                                 qpt_cartesian, eigenvectors,
+                                 masses=masses, magnitude=magnitude)
+    return positions_at(r, vectors, range(start_frame, end_frame + 1),
+                        n_frames)
+
+
+def displacements(positions, lattice_vectors, supercell, qpt_cartesian,
+                  eigenvectors, masses=None, magnitude=1.):
+    """
+    Calculate the complex displacement of every atom in the supercell
+
+    The position of each atom at a frame is the real part of
+    rest + displacement * exp(-2 pi i frame / n_frames); see
+    :func:`positions_at`.
+
+    :param positions: Cartesian positions in the unit cell
+    :type positions: (n_atoms, 3) array-like
+    :param lattice_vectors: Lattice vectors, one per row
+    :type lattice_vectors: 3x3 array-like
+    :param supercell: Supercell dimensions
+    :type supercell: 3-tuple of ints
+    :param qpt_cartesian: wave vector of mode in *Cartesian coordinates*
+    :type qpt_cartesian: 3-array
+    :param eigenvectors: complex vectors describing relative displacement
+        of each atom in the unit cell
+    :type eigenvectors: (n_atoms, 3) complex array-like
+    :param masses: Relative atomic masses (inverse sqrt is used to scale
+        vibration magnitude.) If None, no mass scaling is applied.
+    :type masses: (n_atoms,) array-like or None
+    :param magnitude: Scale factor for vibrations.
+    :type magnitude: float
+
+    :returns: Displacements, ordered as :func:`supercell_positions`
+    :rtype: (n_cells * n_atoms, 3) complex array
+    """
+    return _phased_vectors(positions, lattice_vectors, supercell,
+                           qpt_cartesian, eigenvectors, masses=masses,
+                           magnitude=magnitude)[1]
+
+
+def positions_at(rest, displacements, frames, n_frames=30):
+    """
+    Calculate positions at given frames from rest positions and
+    complex displacements
+
+    :param rest: Rest positions
+    :type rest: (n, 3) array-like
+    :param displacements: Complex displacements, as from
+        :func:`displacements`
+    :type displacements: (n, 3) complex array-like
+    :param frames: Frame numbers
+    :type frames: sequence of ints
+    :param n_frames: Animation length of a single oscillation cycle in
+        frames
+    :type n_frames: int
+
+    :returns: Cartesian positions
+    :rtype: (len(frames), n, 3) float32 array
+    """
+    displacements = np.asarray(displacements, dtype=complex)
+
+    # Re(U exp(-i theta)) = Re(U) cos(theta) + Im(U) sin(theta)
+    theta = (2 * math.pi / n_frames *
+             np.asarray(frames, dtype=float))[:, np.newaxis, np.newaxis]
+    positions_t = (np.asarray(rest, dtype=float) +
+                   displacements.real * np.cos(theta) +
+                   displacements.imag * np.sin(theta))
+    return positions_t.astype(np.float32)
+
+
+def oscillation_parameters(displacements):
+    """
+    Calculate the amplitude and phase of each coordinate
+
+    The motion of every Cartesian coordinate is a pure sinusoid,
+
+        x(frame) = rest + amplitude * cos(2 pi frame / n_frames - phase)
+
+    which is equivalent to :func:`positions_at` but independent of the
+    number of frames.
+
+    :param displacements: Complex displacements, as from
+        :func:`displacements`
+    :type displacements: (n, 3) complex array-like
+
+    :returns: amplitude, phase
+    :rtype: 2-tuple of (n, 3) arrays
+    """
+    displacements = np.asarray(displacements, dtype=complex)
+    return np.abs(displacements), np.angle(displacements)
+
+
+def arrow_vectors(positions, lattice_vectors, supercell, qpt_cartesian,
+                  eigenvectors):
+    """
+    Calculate the Cartesian vectors associated with atom vibrations
+
+    These are the real part of the phased eigenvectors, i.e. the
+    displacement at frame 0 before mass and magnitude scaling.
+
+    :param positions: Cartesian positions in the unit cell
+    :type positions: (n_atoms, 3) array-like
+    :param lattice_vectors: Lattice vectors, one per row
+    :type lattice_vectors: 3x3 array-like
+    :param supercell: Supercell dimensions
+    :type supercell: 3-tuple of ints
+    :param qpt_cartesian: wave vector of mode in *Cartesian coordinates*
+    :type qpt_cartesian: 3-array
+    :param eigenvectors: complex vectors describing relative displacement
+        of each atom in the unit cell
+    :type eigenvectors: (n_atoms, 3) complex array-like
+
+    :returns: Arrow vectors, ordered as :func:`supercell_positions`
+    :rtype: (n_cells * n_atoms, 3) array
+    """
+    _, vectors = _phased_vectors(positions, lattice_vectors, supercell,
+                                 qpt_cartesian, eigenvectors)
+    return vectors.real
@@ -0,0 +1,139 @@
+"""
+Long-lived render worker
+
+When Blender is launched in background mode with a script calling
+:func:`main`, jobs are read from stdin as one JSON object per line and
+status messages are written to stdout, prefixed by
+:data:`MESSAGE_PREFIX` to distinguish them from Blender's own output.
+The scene is reset between jobs, so a single Blender process can render
+any number of images without paying its start-up cost again.
+
+Each job is a dict with the keys
+
+options
+    *(dict)* Options for :func:`vsim2blender.plotter.open_mode` and
+    :func:`vsim2blender.plotter.setup_render_freestyle`
+output_file
+    *(str or False)* Blender-formatted output path
+preview
+    *(str)* Preview output path, or empty string
+renders
+    *(list of dicts, optional)* Render several modes in turn, each
+    specified by 'mode_index', 'output_file' and 'preview' keys, or a
+    'buffer' key giving a file for
+    :func:`vsim2blender.plotter.render_to_buffer` in place of image
+    output; with a buffer, 'frames' may list the frame numbers to render
+    in place of the scene frame range. The structure, camera and render
+    settings are built once and only the mode is changed between renders;
+    a 'rendered' message is sent after each one, including the array
+    shape if a buffer is used.
+    If absent, one render is made using the keys above.
+id
+    Identifier which is echoed back in status messages
+
+Jobs with ``"command": "quit"`` end the loop.
+
+Whenever a frame is written to disk a 'frame' message is sent with its
+frame number and path, so that the host can process frames while the
+rest of an animation is rendering. Frames rendered to a buffer are
+reported with their index, the buffer path and the array shape. Frames of
+a periodic animation which repeat an earlier frame are not rendered; they
+are reported in order once the first period is complete.
+"""
+
+import json
+import sys
+import traceback
+
+import bpy
+import vsim2blender.plotter
+
+MESSAGE_PREFIX = '@ascii-phonons-worker '
+
+
+def send(event, **data):
+    """
+    Write a status message to stdout
+
+    :param event: Event type, e.g. 'ready', 'done' or 'error'
+    :type event: str
+
+    """
+    data['event'] = event
+    sys.stdout.write(MESSAGE_PREFIX + json.dumps(data) + '\n')
+    sys.stdout.flush()
+
+
+@bpy.app.handlers.persistent
+def report_frame(scene):
+    """Render handler: send a 'frame' message for each written image"""
+    frame = scene.frame_current
+    send('frame', frame=frame,
+         path=bpy.path.abspath(scene.render.frame_path(frame=frame)))
+
+
+def reset_scene():
+    """Return to the start-up file, discarding all data from previous jobs"""
+    bpy.ops.wm.read_homefile()
+
+
+def run_job(job):
+    """
+    Build and render a scene
+
+    :param job: Job specification (see module documentation)
+    :type job: dict
+
+    """
+    options = job.get('options', {})
+    renders = job.get('renders',
+                      [{'mode_index': options.get('mode_index', 0),
+                        'output_file': job.get('output_file', False),
+                        'preview': job.get('preview', '')}])
+
+    reset_scene()
+    mode_scene = vsim2blender.plotter.build_scene(**options)
+    vsim2blender.plotter.setup_render_freestyle(**options)
+    for spec in renders:
+        vsim2blender.plotter.set_mode(mode_scene, spec.get('mode_index', 0))
+        report = {'id': job.get('id'),
+                  'mode_index': spec.get('mode_index', 0)}
+        if spec.get('buffer'):
+            report['buffer'] = spec['buffer']
+
+            def report_buffer_frame(index, frame, shape):
+                send('frame', index=index, frame=frame, shape=shape,
+                     **report)
+
+            report['shape'] = vsim2blender.plotter.render_to_buffer(
+                spec['buffer'], callback=report_buffer_frame,
+                period=mode_scene.period, frames=spec.get('frames'))
+        else:
+            repeated = vsim2blender.plotter.render(
+                output_file=spec.get('output_file', False),
+                preview=spec.get('preview', ''), period=mode_scene.period)
+            scene = bpy.context.scene
+            for frame in repeated:
+                send('frame', frame=frame, path=bpy.path.abspath(
+                    scene.render.frame_path(frame=frame)))
+        if 'renders' in job:
+            send('rendered', **report)
+
+
+def main():
+    """Process jobs from stdin until a quit command or end of input"""
+    bpy.app.handlers.render_write.append(report_frame)
+    send('ready')
+    for line in iter(sys.stdin.readline, ''):
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        if job.get('command') == 'quit':
+            break
+
+        try:
+            run_job(job)
+        except Exception:
+            send('error', id=job.get('id'), message=traceback.format_exc())
+        else:
+            send('done', id=job.get('id'))
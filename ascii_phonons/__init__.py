@@ -1,19 +1,63 @@
-from os import path, remove
+import atexit
+from glob import glob
+import hashlib
+import json
+from fractions import Fraction
+from os import close as os_close, path, remove
+import shutil
 from subprocess import call
+import sys
 import tempfile
-import re
+import threading
 import platform
 from json import loads
+import numpy as np
 
 try:
     import configparser
 except ImportError:
     import ConfigParser as configparser
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 ascii_phonons_path = path.abspath(path.join(
     path.dirname(path.realpath(__file__)), path.pardir))
 addons_path = path.join(ascii_phonons_path, 'addons')
 
+from ascii_phonons.worker import BlenderWorker
+from ascii_phonons import compositor
+from ascii_phonons.render_cache import RenderCache
+
+
+def use_addons():
+    """Make the vsim2blender add-on importable outside Blender
+
+    The ascii reader, scene graph and other bpy-free modules of the add-on
+    are shared with the host, so that input files are only parsed once
+    per job. The add-on directory is added to ``sys.path`` when one of
+    these is first needed rather than when ascii_phonons is imported.
+    """
+    if addons_path not in sys.path:
+        sys.path.append(addons_path)
+
+
+def load_vsim(filename, cache=False):
+    """Read an ascii file with :func:`vsim2blender.ascii_reader.load_vsim`
+
+    :param filename: Path to .ascii file
+    :type filename: str
+    :param cache: Use the binary sidecar file
+    :type cache: bool
+
+    :rtype: vsim2blender.ascii_reader.VsimFile or VsimData
+    """
+    use_addons()
+    from vsim2blender.ascii_reader import load_vsim as read_vsim
+    return read_vsim(filename, cache=cache)
+
 
 class Opts(object):
     def __init__(self, options, parser=False):
@@ -44,20 +88,27 @@ class Opts(object):
             self.config.read(options['config'])
 
         self.bool_keys = (
+            'apng',
+            'blender_worker',
+            'cache_ascii',
+            'draft',
+            'frame_buffer',
             'gif',
             'gui',
             'montage',
             'normalise_vectors',
             'orthographic',
+            'render_cache',
             'show_box',
             'static',
             'vectors')
 
         self.float_keys = (
             'box_thickness',
+            'cache_size',
             'camera_rot',
             'mass_weighting',
-            'outline_thickness'
+            'outline_thickness',
             'scale_arrow',
             'scale_atom',
             'scale_vib',
@@ -65,6 +116,7 @@ class Opts(object):
 
         self.int_keys = (
             'end_frame',
+            'jobs',
             'mode_index',
             'n_frames',
             'start_frame')
@@ -93,27 +145,171 @@ class Opts(object):
             elif key in self.int_keys:
                 return self.config.getint('general', key)
             elif key in self.tuple_keys:
-                return tuple(map(float,
-                                 self.config.get('general, key').split()
-                                 ))
+                return parse_tuple(self.config.get('general', key))
             else:
                 return self.config.get('general', key)
         else:
             return fallback
 
 
-def call_blender(**options):
-    """Generate a temporary script file and call Blender
+_workers = {}
+_worker_locks = {}
+_workers_lock = threading.Lock()
+_local = threading.local()
+_progress_callbacks = []
 
-    Typically Blender is called in batch mode to render one or a series
-    of .png image files.
 
+def set_worker_slot(slot):
+    """Select the worker used for renders from the current thread
+
+    Threads rendering in parallel should each use a different slot so
+    that they do not wait on the same Blender process. The default slot
+    is 0.
+
+    :param slot: Worker number
+    :type slot: int
+    """
+    _local.slot = slot
+
+
+def get_worker(blender_bin):
+    """Get a running Blender worker, launching one if necessary
+
+    Workers are kept for the lifetime of the Python session, so that
+    subsequent renders do not pay the Blender start-up cost. Threads
+    rendering in parallel (see :func:`render_modes`) are each assigned
+    their own worker with :func:`set_worker_slot`.
+
+    :param blender_bin: Path to Blender binary
+    :type blender_bin: str
+
+    :rtype: ascii_phonons.worker.BlenderWorker
     """
+    key = (blender_bin, getattr(_local, 'slot', 0))
+    with _workers_lock:
+        lock = _worker_locks.setdefault(key, threading.Lock())
+
+    # A worker which is still starting (e.g. from warm_up) is waited for
+    with lock:
+        worker = _workers.get(key)
+        if worker is None or not worker.is_alive():
+            worker = BlenderWorker(blender_bin, addons_path)
+            worker.monitor = _report_progress
+            _workers[key] = worker
+    return worker
+
+
+def add_progress_callback(callback):
+    """Receive status messages from all Blender workers
+
+    The callback is called with each message (a dict, see
+    :mod:`vsim2blender.worker`) as it arrives, from the thread waiting on
+    that worker; for example 'frame' messages as frames are written and
+    'rendered' messages as each mode of a montage is finished.
+
+    :param callback: Function taking one argument
+    :type callback: function
+    """
+    _progress_callbacks.append(callback)
+
+
+def remove_progress_callback(callback):
+    """Stop sending status messages to a callback"""
+    if callback in _progress_callbacks:
+        _progress_callbacks.remove(callback)
+
+
+def _report_progress(event):
+    for callback in list(_progress_callbacks):
+        callback(event)
+
+
+def cancel_renders():
+    """Stop all running renders by killing the busy Blender workers
+
+    Calls waiting on the workers raise
+    :class:`ascii_phonons.worker.BlenderWorkerError`; new workers are
+    launched for later renders. Idle workers are left running, and
+    renders made with a separate Blender process (blender_worker=False)
+    or with the software backend are not affected.
+
+    :returns: True if a worker was killed in the middle of a render
+    :rtype: bool
+    """
+    interrupted = False
+    for worker in list(_workers.values()):
+        if worker.busy and worker.is_alive():
+            worker.kill()
+            interrupted = True
+    return interrupted
+
+
+def warm_up(**options):
+    """Launch the Blender worker in a background thread
+
+    Call this ahead of time (e.g. when an interactive session starts) so
+    that the first render does not wait for Blender to start. Failures
+    are ignored here and reported by the next render instead.
+
+    :param options: Options as for :func:`call_blender`; only
+        'blender_bin' is used, which may be set in a 'config' file. The
+        config file is read before this function returns.
+
+    :returns: The thread starting the worker
+    :rtype: threading.Thread
+    """
+    blender_bin = _blender_bin(Opts(options))
+
+    def start():
+        try:
+            get_worker(blender_bin)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=start)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+@atexit.register
+def close_workers():
+    """Shut down all Blender workers"""
+    for worker in _workers.values():
+        worker.close()
+    _workers.clear()
+
+
+def _blender_bin(opts):
+    """Path to Blender binary, from options or platform default"""
     blender_osx = ("/Applications/Blender/blender.app" +
                    "/Contents/MacOS/blender")
 
+    if platform.mac_ver()[0] != '':
+        blender_default = blender_osx
+    else:
+        blender_default = 'blender'
+
+    return opts.get('blender_bin', blender_default)
+
+
+def call_blender(**options):
+    """Render with Blender, or open a Blender session
+
+    Typically Blender is called in batch mode to render one or a series
+    of .png image files. Batch jobs are sent to a persistent background
+    worker, which is reused by later calls; set the option
+    'blender_worker' to False to launch a new Blender process from a
+    temporary script file instead. GUI sessions always use a new process.
+
+    """
     opts = Opts(options)
 
+    if _software_backend(opts):
+        from ascii_phonons import software
+        software.render(**options)
+        return
+
     input_file = opts.get('input_file', False)
     output_file = opts.get('output_file', False)
 
@@ -121,14 +317,7 @@ def call_blender(**options):
         if f:
             f = path.abspath(f)
 
-    handle, python_tmp_file = tempfile.mkstemp(suffix='.py', dir='.')
-
-    if platform.mac_ver()[0] != '':
-        blender_default = blender_osx
-    else:
-        blender_default = 'blender'
-
-    call_args = [opts.get('blender_bin', blender_default)]
+    blender_bin = _blender_bin(opts)
 
     if opts.get('static', False):
         n_frames = 1
@@ -136,11 +325,129 @@ def call_blender(**options):
         n_frames = opts.get('n_frames', 30)
 
     if opts.get('gif', False) and output_file:
-        gif_name = output_file + '.gif'
+        if opts.get('apng', False) and not compositor.available():
+            raise Exception("Animated PNG output (apng) requires Pillow")
+        gif_name = output_file + ('.png' if opts.get('apng', False)
+                                  else '.gif')
         handle, image_tmp_filename = tempfile.mkstemp(dir='.')
         output_file = image_tmp_filename
         remove(image_tmp_filename)  # We only needed the name
 
+    use_worker = (opts.get('blender_worker', True) and
+                  not opts.get('gui', False))
+    animate = (opts.get('gif', False) and output_file and
+               not opts.get('static', False))
+
+    # Identical renders are copied from the cache
+    cache = _render_cache(opts)
+    outputs = output_paths(**options)
+    if cache is not None and outputs:
+        key = render_key(options, opts.get('mode_index', 0),
+                         output=path.splitext(outputs[0])[1] +
+                         str(len(outputs)))
+        if cache.get_files(key, outputs):
+            return
+    else:
+        cache = None
+
+    # Frames reported by the worker are encoded while later frames render
+    stream = (animate and use_worker and
+              (compositor.available() or
+               (compositor.ffmpeg_path() and not opts.get('apng', False))))
+
+    if not use_worker:
+        _call_blender_script(options, blender_bin, output_file,
+                             gui=opts.get('gui', False))
+    elif stream:
+        encoder = compositor.AnimationEncoder(gif_name,
+                                              apng=opts.get('apng', False))
+        renders, frames = None, None
+        if _use_frame_buffer(opts):
+            # Frames are passed in memory rather than as image files
+            handle, buffer_file = tempfile.mkstemp(dir=_buffer_dir())
+            os_close(handle)
+            renders = [{'mode_index': opts.get('mode_index', 0),
+                        'buffer': buffer_file}]
+            if cache is not None:
+                # Phases already in the cache are not rendered again
+                frames = _CachedFrames(cache, options,
+                                       opts.get('mode_index', 0))
+                renders[0]['frames'] = frames.missing
+        encoded = []
+
+        def encode_stored():
+            # Frames are encoded in order as soon as their phase is known
+            while (len(encoded) < len(frames.frames) and
+                   frames.phases[len(encoded)] in frames.stored):
+                image = frames.stored[frames.phases[len(encoded)]]
+                encoder.add_frame(compositor.Image.fromarray(
+                    np.array(image[:, :, :3])))
+                encoded.append(frames.frames[len(encoded)])
+
+        def add_frame(event):
+            if event['event'] != 'frame':
+                pass
+            elif 'buffer' in event:
+                buffer = np.memmap(event['buffer'], dtype=np.uint8,
+                                   mode='r', shape=tuple(event['shape']))
+                image = np.array(buffer[event['index']])
+                if frames is None:
+                    encoder.add_frame(compositor.Image.fromarray(
+                        image[:, :, :3]))
+                else:
+                    frames.add(event['frame'], image)
+                    encode_stored()
+            else:
+                encoder.add_file(event['path'], remove_file=True)
+
+        try:
+            if frames is not None:
+                encode_stored()
+            if frames is None or frames.missing:
+                get_worker(blender_bin).render(
+                    options, output_file=output_file,
+                    preview=opts.get('preview', ''), callback=add_frame,
+                    renders=renders)
+        except Exception:
+            encoder.abort()
+            raise
+        finally:
+            if renders is not None:
+                remove(buffer_file)
+        encoder.close()
+    else:
+        get_worker(blender_bin).render(options, output_file=output_file,
+                                       preview=opts.get('preview', ''))
+
+    if animate and not stream:
+        frames = range(opts.get('start_frame', 0),
+                       opts.get('end_frame',
+                                opts.get('n_frames', 30) - 1) + 1)
+        tmp_files = [''.join((output_file,
+                              '{0:04.0f}'.format(i),
+                              '.png'))
+                     for i in frames]
+        if compositor.available():
+            compositor.save_animation(
+                (compositor.open_image(f) for f in tmp_files), gif_name,
+                apng=opts.get('apng', False))
+        else:
+            _imagemagick_convert(tmp_files, gif_name)
+
+        for f in tmp_files:
+            remove(f)
+
+    if cache is not None:
+        if all(path.isfile(f) for f in outputs):
+            cache.put_files(key, outputs)
+        cache.evict()
+
+
+def _call_blender_script(options, blender_bin, output_file, gui=False):
+    """Generate a temporary script file and run it in a new Blender process"""
+    opts = Opts(options)
+    handle, python_tmp_file = tempfile.mkstemp(suffix='.py', dir='.')
+
     python_txt = """
 import sys
 from os.path import pathsep
@@ -153,10 +460,11 @@ import vsim2blender.plotter
 
 config = vsim2blender.read_config(user_config='{config}')
 
-vsim2blender.plotter.open_mode(**{options})
+mode_scene = vsim2blender.plotter.open_mode(**{options})
 vsim2blender.plotter.setup_render_freestyle(**{options})
 vsim2blender.plotter.render(output_file='{out_file}',
-                            preview='{preview}')
+                            preview='{preview}',
+                            period=mode_scene.period)
 """.format(options=str(options), add_path=addons_path,
            config=opts.get('config', ''),
            out_file=output_file,
@@ -165,7 +473,8 @@ vsim2blender.plotter.render(output_file='{out_file}',
     with open(python_tmp_file, 'w') as f:
         f.write(python_txt)
 
-    if not opts.get('gui', False):
+    call_args = [blender_bin]
+    if not gui:
         call_args.append("--background")
 
     call_args = call_args + ["-P", python_tmp_file]
@@ -173,64 +482,506 @@ vsim2blender.plotter.render(output_file='{out_file}',
 
     remove(python_tmp_file)
 
-    if opts.get('gif', False) and output_file and not opts.get('static',
-                                                               False):
-        frames = range(opts.get('start_frame', 0),
-                       opts.get('end_frame',
-                                opts.get('n_frames', 30) - 1) + 1)
-        tmp_files = [''.join((output_file,
-                              '{0:04.0f}'.format(i),
-                              '.png'))
-                     for i in frames]
-        convert_call_args = (['convert', '-delay', '10'] +
-                             tmp_files + ['-loop', '0', gif_name])
+
+def render_modes(options, mode_indices, jobs=1, suffix='', in_memory=False):
+    """Render a preview of each mode in its own temporary directory
+
+    Up to ``jobs`` Blender processes render concurrently. When the
+    persistent worker is used (see :func:`call_blender`), the modes are
+    divided between processes and each process builds the structure and
+    camera once, changing only the mode between renders. If a render
+    fails, no further modes are started; once running renders have
+    finished the temporary directories are removed and the first failure
+    (in mode order) is raised.
+
+    :param options: Options for :func:`call_blender`. 'preview' and
+        'mode_index' are set for each mode; the dict is not modified.
+    :type options: dict
+    :param mode_indices: Modes to render
+    :type mode_indices: list of ints
+    :param jobs: Maximum number of concurrent renders
+    :type jobs: int
+    :param suffix: Appended to the preview filename root, e.g. '.' to
+        separate frame numbers of animations
+    :type suffix: str
+    :param in_memory: Return pixel arrays (see :func:`render_frames`)
+        rather than image files. This requires the persistent worker.
+    :type in_memory: bool
+
+    :returns: Preview filename roots, in the order of mode_indices.
+        Remove these with :func:`remove_previews` when finished. If
+        in_memory is True, a (n_frames, height, width, 4) uint8 RGBA
+        array for each mode instead.
+    :rtype: list of str or list of arrays
+
+    """
+    if in_memory:
+        options = dict(options)
+        options.setdefault('preview', True)
+    opts = Opts(options)
+    if in_memory and _software_backend(opts):
+        from ascii_phonons import software
+        return [software.render_frames(**dict(options, mode_index=index))
+                for index in mode_indices]
+
+    single_scene = (opts.get('blender_worker', True) and
+                    not opts.get('gui', False) and
+                    not _software_backend(opts))
+    if in_memory and not single_scene:
+        raise Exception("In-memory rendering requires the Blender worker")
+
+    # Only phases missing from the render cache are rendered
+    cache = _render_cache(opts) if in_memory else None
+    cached = {}
+    if cache is not None:
+        source = render_source(options)
+        for position, index in enumerate(mode_indices):
+            cached[position] = _CachedFrames(cache, options, index,
+                                             source=source)
+
+    previews = [path.join(tempfile.mkdtemp(
+        prefix='ascii-phonons-{0}-'.format(index),
+        dir=(_buffer_dir() if in_memory else None)), 'mode' + suffix)
+                for index in mode_indices]
+    specs = [spec for spec in enumerate(zip(mode_indices, previews))
+             if spec[0] not in cached or cached[spec[0]].missing]
+
+    n_threads = max(1, min(jobs, len(specs)))
+
+    # Each queue item is a list of (position, (mode_index, preview))
+    job_queue = queue.Queue()
+    if single_scene and specs:
+        for slot in range(n_threads):
+            job_queue.put(specs[slot::n_threads])
+    else:
+        for spec in specs:
+            job_queue.put([spec])
+    errors = {}
+    shapes = {}
+
+    def record_shape(event):
+        if event['event'] == 'rendered' and 'buffer' in event:
+            shapes[event['buffer']] = tuple(event['shape'])
+
+    def run_jobs(slot):
+        set_worker_slot(slot)
+        while not errors:
+            try:
+                batch = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if single_scene:
+                    if in_memory:
+                        renders = [{'mode_index': index,
+                                    'buffer': preview + '.rgba'}
+                                   for position, (index, preview) in batch]
+                        for render, (position, spec) in zip(renders, batch):
+                            if position in cached:
+                                render['frames'] = cached[position].missing
+                        batch_options = options
+                    else:
+                        renders = [{'mode_index': index,
+                                    'output_file': False,
+                                    'preview': preview}
+                                   for position, (index, preview) in batch]
+                        batch_options = dict(options,
+                                             preview=renders[0]['preview'])
+                    get_worker(_blender_bin(opts)).render(
+                        batch_options, renders=renders,
+                        callback=record_shape)
+                else:
+                    for position, (index, preview) in batch:
+                        call_blender(**dict(options, preview=preview,
+                                            mode_index=index))
+            except Exception as err:
+                errors[batch[0][0]] = err
+
+    if n_threads == 1:
+        run_jobs(0)
+    else:
+        threads = [threading.Thread(target=run_jobs, args=(slot,))
+                   for slot in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        remove_previews(previews)
+        raise errors[min(errors)]
+
+    if in_memory:
+        results = {}
         try:
-            call(convert_call_args)
-        except OSError as err:
-            raise Exception("\n\nCould not run Imagemagick convert" +
-                            " to create .gif.\n Error message:" +
-                            " {0}\nAre you sure".format(err) +
-                            " you have Imagemagick installed?\n")
+            for position, (index, preview) in specs:
+                results[position] = read_frame_buffer(
+                    preview + '.rgba', shapes[preview + '.rgba'])
+                if position in cached:
+                    for frame, image in zip(cached[position].missing,
+                                            results[position]):
+                        cached[position].add(frame, image)
+        finally:
+            remove_previews(previews)
+        if cache is not None:
+            cache.evict()
+        for position in cached:
+            results[position] = cached[position].array()
+        return [results[position] for position in range(len(previews))]
+    return previews
+
+
+def render_frames(**options):
+    """Render one mode and return the frames as arrays
+
+    With the persistent worker, frames are passed from Blender through a
+    raw pixel buffer (in shared memory where available), with no image
+    encoding or decoding. Otherwise images are rendered to a temporary
+    directory and read back.
+
+    Options are as for :func:`call_blender`; 'preview' is True (and so
+    the render is a static image by default) if not given.
+
+    :returns: RGBA frames, top row first
+    :rtype: (n_frames, height, width, 4) uint8 array
+    """
+    options = dict(options)
+    options.setdefault('preview', True)
+    opts = Opts(options)
 
-        for f in tmp_files:
-            remove(f)
+    if _software_backend(opts):
+        from ascii_phonons import software
+        return software.render_frames(**options)
+    if (opts.get('frame_buffer', True) and opts.get('blender_worker', True)
+            and not opts.get('gui', False)):
+        return render_modes(options, [opts.get('mode_index', 0)],
+                            in_memory=True)[0]
+
+    tmp_dir = tempfile.mkdtemp(prefix='ascii-phonons-')
+    try:
+        call_blender(**dict(options, preview=path.join(tmp_dir, 'frame.'),
+                            gif=False, output_file=False))
+        return np.array([np.asarray(compositor.open_image(f).convert('RGBA'))
+                         for f in sorted(glob(path.join(tmp_dir, '*.png')))])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def read_frame_buffer(buffer_file, shape):
+    """Copy frames from a buffer written by the Blender worker
+
+    :param buffer_file: Path to buffer
+    :type buffer_file: str
+    :param shape: Array shape reported by the worker
+    :type shape: 4-tuple of ints
+
+    :returns: RGBA frames, top row first
+    :rtype: (n_frames, height, width, 4) uint8 array
+    """
+    return np.array(np.memmap(buffer_file, dtype=np.uint8, mode='r',
+                              shape=tuple(shape)))
+
+
+# Options which may change the rendered pixels
+_pixel_keys = ('backend', 'blender_bin', 'box_thickness', 'camera_rot', 'draft',
+               'mass_weighting', 'miller', 'normalise_vectors', 'offset_box',
+               'orthographic', 'outline_thickness', 'scale_arrow',
+               'scale_atom', 'scale_vib', 'show_box', 'static', 'supercell',
+               'vectors', 'x_pixels', 'y_pixels', 'zoom')
+RENDER_CACHE_VERSION = 3
+
+
+def render_source(options):
+    """Read the input data and configuration for :func:`render_key`
+
+    Reading these is the slow part of making a key, so when keys are made
+    for several modes or renders of the same input file, get the source
+    once and pass it to each call.
+
+    :param options: Render options, as for :func:`call_blender`; only
+        'input_file', 'cache_ascii', 'config' and 'scene_graph' are used
+    :type options: dict
+
+    :returns: Parsed input data and a digest of the structure,
+        configuration and saved scene graph (if any)
+    :rtype: (VsimData or VsimFile, str)
+    """
+    opts = Opts(options)
+    vsim_data = load_vsim(opts.get('input_file', None),
+                          cache=opts.get('cache_ascii', False))
+    from vsim2blender import read_config
+    config = read_config(user_config=opts.get('config', ''))
+
+    digest = hashlib.sha256()
+    for array in (vsim_data.cell_vsim, vsim_data.positions):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    settings = {'symbols': list(vsim_data.symbols),
+                'config': dict((section, sorted(config.items(section)))
+                               for section in config.sections())}
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+
+    # A saved scene graph is drawn instead of the input file's structure
+    if opts.get('scene_graph', False):
+        with open(opts.get('scene_graph', False), 'rb') as f:
+            digest.update(f.read())
+    return vsim_data, digest.hexdigest()
+
+
+def render_key(options, mode_index=0, output='', frame_range=True,
+               source=None):
+    """Content hash identifying the result of a render
+
+    The hash covers the structure and the selected mode as parsed from
+    the input file (not the file itself, so reformatting or changes to
+    other modes do not matter), the resolved values of options which
+    affect the image, the frames and their phases, the configuration
+    tables and the contents of a saved scene graph given as the
+    'scene_graph' option.
+
+    :param options: Render options, as for :func:`call_blender`
+    :type options: dict
+    :param mode_index: Mode to render
+    :type mode_index: int
+    :param output: Description of the output format, e.g. 'frame' or
+        'gif', distinguishing results stored in different forms
+    :type output: str
+    :param frame_range: Include the frame range. If False, the key
+        identifies the scene, and frames are told apart by their phase
+        (see :func:`frame_phases`).
+    :type frame_range: bool
+    :param source: Result of :func:`render_source` for these options. If
+        None, the input file and configuration are read.
+    :type source: tuple or None
+
+    :rtype: str
+    """
+    opts = Opts(options)
+    if source is None:
+        source = render_source(options)
+    vsim_data, source_digest = source
+
+    digest = hashlib.sha256()
+    for array in (vsim_data.qpts[mode_index],
+                  vsim_data.get_eigenvectors(mode_index)):
+        digest.update(np.ascontiguousarray(array).tobytes())
+
+    if frame_range:
+        frames = [[frame, str(phase)]
+                  for frame, phase in zip(*frame_phases(options))]
+    else:
+        frames = None
+    settings = {'version': RENDER_CACHE_VERSION,
+                'output': output,
+                'source': source_digest,
+                'preview': bool(opts.get('preview', False)),
+                'frames': frames,
+                'options': dict((key, opts.get(key, None))
+                                for key in _pixel_keys)}
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _render_cache(opts):
+    """Get the render cache selected by options, or None if disabled"""
+    if opts.get('render_cache', True) and not opts.get('gui', False):
+        return RenderCache(opts.get('cache_dir', None),
+                           max_size=opts.get('cache_size', 1024))
+    else:
+        return None
+
+
+def frame_phases(options):
+    """Frame numbers rendered and the phase of the oscillation in each
+
+    Frames with equal phases are identical images, so the render cache
+    stores each phase once and frames rendered for one frame range can be
+    reused for another. Phases are exact fractions of the cycle,
+    ``frame % n_frames / n_frames``; if the atoms do not move (static
+    images and, by default, previews) every frame has phase 0.
+
+    :param options: Render options, as for :func:`call_blender`
+    :type options: dict
+
+    :returns: Frame numbers, and the phase of each
+    :rtype: (list of ints, list of Fractions)
+    """
+    opts = Opts(options)
+    start_frame, end_frame = _frame_range(opts)
+    n_frames = opts.get('n_frames', 30)
+    moving = not opts.get('static', bool(opts.get('preview', False)))
+
+    frames = list(range(start_frame, end_frame + 1))
+    if moving:
+        phases = [Fraction(frame % n_frames, n_frames) for frame in frames]
+    else:
+        phases = [Fraction(0)] * len(frames)
+    return frames, phases
+
+
+class _CachedFrames(object):
+    def __init__(self, cache, options, mode_index, source=None):
+        """Frames of one mode found in the per-frame render cache
+
+        :param cache: Render cache
+        :type cache: ascii_phonons.render_cache.RenderCache
+        :param options: Render options, as for :func:`call_blender`
+        :type options: dict
+        :param mode_index: Mode to render
+        :type mode_index: int
+        :param source: Input data from :func:`render_source`, or None
+        :type source: tuple or None
+
+        Attributes are 'frames' and 'phases' (see :func:`frame_phases`),
+        'stored', a dict of frame arrays by phase, and 'missing', a list
+        with one frame number for each phase which must be rendered.
+
+        """
+        self.cache = cache
+        self.scene_key = render_key(options, mode_index, output='frame',
+                                    frame_range=False, source=source)
+        self.frames, self.phases = frame_phases(options)
+        self._phase = dict(zip(self.frames, self.phases))
+        self.stored = {}
+        self.missing = []
+
+        missing_phases = set()
+        for frame, phase in zip(self.frames, self.phases):
+            if phase in self.stored or phase in missing_phases:
+                continue
+            image = cache.get_frames(self._key(phase))
+            if image is None:
+                self.missing.append(frame)
+                missing_phases.add(phase)
+            else:
+                self.stored[phase] = image
+
+    def _key(self, phase):
+        return hashlib.sha256('{0} {1}'.format(self.scene_key, phase)
+                              .encode('utf-8')).hexdigest()
+
+    def add(self, frame, image):
+        """Store a newly rendered frame
+
+        :param frame: Frame number
+        :type frame: int
+        :param image: RGBA pixels
+        :type image: (height, width, 4) uint8 array
+        """
+        phase = self._phase[frame]
+        self.stored[phase] = image
+        self.cache.put_frames(self._key(phase), image)
+
+    def array(self):
+        """All frames, once every phase has been stored
+
+        :rtype: (n_frames, height, width, 4) uint8 array
+        """
+        return np.array([self.stored[phase] for phase in self.phases])
+
+
+def _frame_range(opts):
+    """First and last frame rendered, following setup_render_freestyle"""
+    start_frame = opts.get('start_frame', 0)
+    if opts.get('static', False):
+        return start_frame, start_frame
+    else:
+        return start_frame, opts.get('end_frame',
+                                     start_frame + opts.get('n_frames', 30)
+                                     - 1)
+
+
+def output_paths(**options):
+    """Files which :func:`call_blender` writes for the given options
+
+    :returns: Image paths: an animation file if 'gif' is set, otherwise
+        one .png file per frame. Empty if there is no file output.
+    :rtype: list of str
+    """
+    opts = Opts(options)
+    output_file = opts.get('output_file', False)
+    if opts.get('gif', False) and output_file:
+        if opts.get('static', False):
+            return []
+        else:
+            return [output_file + ('.png' if opts.get('apng', False)
+                                   else '.gif')]
+    else:
+        return _output_files(opts, output_file)
+
+
+def _output_files(opts, output_file):
+    """Image files written by Blender for the given output path"""
+    if opts.get('preview', ''):
+        output_file = opts.get('preview', '')
+    if not output_file:
+        return []
+
+    start_frame, end_frame = _frame_range(opts)
+    if start_frame == end_frame:
+        return [output_file + '.png']
+    else:
+        return ['{0}{1:04d}.png'.format(output_file, frame)
+                for frame in range(start_frame, end_frame + 1)]
+
+
+def _buffer_dir():
+    """Directory for frame buffers: shared memory if available"""
+    if path.isdir('/dev/shm'):
+        return '/dev/shm'
+    else:
+        return tempfile.gettempdir()
+
+
+def remove_previews(previews):
+    """Remove temporary directories created by :func:`render_modes`"""
+    for preview in previews:
+        shutil.rmtree(path.dirname(preview), ignore_errors=True)
 
 
 def montage_static(**options):
     """Render images for all phonon modes and present as array"""
     opts = Opts(options)
-    mode_data = list(_qpt_freq_iter(opts.get('input_file', None)))
 
     for param, default in (('output_file', 'phonon'),):
         if not opts.get(param, False):
             options[param] = default
 
-    call_args = ['montage', '-font', 'Helvetica', '-pointsize', '18']
-    call_args.extend(opts.get('montage_args', '').split())    
+    # Parse the ascii file once; later renders read the binary sidecar
+    options['cache_ascii'] = opts.get('cache_ascii', True)
+    mode_data = list(_qpt_freq_iter(opts.get('input_file', None),
+                                    cache=options['cache_ascii']))
 
-    # The output filename is used as the root for temporary images
-    # These are requested as "preview" images to reduce rescaling
+    # The output filename is used as the root for the montage image
+    # Modes are requested as "preview" images to reduce rescaling
     output_basename = opts.get('output_file', 'phonon')
-
-    for index, (qpt, freq) in enumerate(mode_data):
-        options.update({'preview': '.'.join((output_basename,
-                                                 str(index)))})
-        options.update({'mode_index': index})
-        call_blender(**options)
-        call_args.extend(['-label', _flabelformat(freq),
-                         options['preview'] + '.png'])
-    call_args.append(output_basename + '_montage.png')
-
-    call(call_args)
-
-    for index, (qpt, freq) in enumerate(mode_data):
-        remove('.'.join((output_basename, str(index), 'png')))
+    labels = [_flabelformat(freq) for qpt, freq in mode_data]
+    montage_file = output_basename + '_montage.png'
+
+    if _use_frame_buffer(opts):
+        frames = render_modes(options, list(range(len(mode_data))),
+                              jobs=opts.get('jobs', 1), in_memory=True)
+        compositor.tile_images([mode_frames[0] for mode_frames in frames],
+                               labels).save(montage_file)
+        return
+
+    previews = render_modes(options, list(range(len(mode_data))),
+                            jobs=opts.get('jobs', 1))
+    try:
+        if _use_compositor(opts):
+            compositor.tile_images(
+                [compositor.open_image(preview + '.png')
+                 for preview in previews], labels).save(montage_file)
+        else:
+            _imagemagick_montage([preview + '.png' for preview in previews],
+                                 labels, montage_file,
+                                 opts.get('montage_args', ''))
+    finally:
+        remove_previews(previews)
 
 
 def montage_anim(**options):
     """Render animations for all phonon modes and present as array"""
     opts = Opts(options)
-    mode_data = list(_qpt_freq_iter(opts.get('input_file', None)))
 
     for param, default in (('output_file', 'phonon'),
                            ('start_frame', 0),
@@ -242,65 +993,128 @@ def montage_anim(**options):
         options['end_frame'] = (opts.get('start_frame', 0) +
                                 opts.get('n_frames', 30) - 1)
 
+    # The ImageMagick fallback can only write .gif
+    if opts.get('apng', False) and not _use_compositor(opts):
+        raise Exception("Animated PNG montages (apng) require Pillow and "
+                        "cannot be combined with montage_args")
+
+    # Parse the ascii file once; later renders read the binary sidecar
+    options['cache_ascii'] = opts.get('cache_ascii', True)
+    mode_data = list(_qpt_freq_iter(opts.get('input_file', None),
+                                    cache=options['cache_ascii']))
+
     # Render smaller image, take over gif generation
     # 'static' is explicitly set to False to override
     # 'preview' defaults
     options.update({'gif': False, 'static': False})
     output_basename = opts.get('output_file', 'phonon')
-    labels = []
-    for index, (qpt, freq) in enumerate(mode_data):
-        options.update({'preview': '.'.join((output_basename,
-                                             str(index), ''))})
-        options.update({'mode_index': index})
-        call_blender(**options)
-        labels.append(_flabelformat(freq))
-
-    print("Compiling tiled images...")
+    labels = [_flabelformat(freq) for qpt, freq in mode_data]
+    animation_file = output_basename + ('.png' if opts.get('apng', False)
+                                        else '.gif')
+
+    if _use_frame_buffer(opts):
+        frames = render_modes(options, list(range(len(mode_data))),
+                              jobs=opts.get('jobs', 1), in_memory=True)
+        print("Compiling tiled images into animation...")
+        font = compositor.load_font()
+        compositor.save_animation(
+            (compositor.tile_images([mode_frames[frame_index]
+                                     for mode_frames in frames],
+                                    labels, font=font)
+             for frame_index in range(len(frames[0]))),
+            animation_file, apng=opts.get('apng', False))
+        print("Done!")
+        return
+
+    previews = render_modes(options, list(range(len(mode_data))),
+                            jobs=opts.get('jobs', 1), suffix='.')
 
     frames = range(opts.get('start_frame', 0),
                    opts.get('end_frame', 29) + 1)
+    frame_files = [['{0}{1:04d}.png'.format(preview, frame)
+                    for preview in previews]
+                   for frame in frames]
+
+    try:
+        if _use_compositor(opts):
+            print("Compiling tiled images into animation...")
+            font = compositor.load_font()
+            compositor.save_animation(
+                (compositor.tile_images(
+                    [compositor.open_image(f) for f in files], labels,
+                    font=font)
+                 for files in frame_files),
+                animation_file, apng=opts.get('apng', False))
+        else:
+            print("Compiling tiled images...")
+            montage_files = ['.'.join((output_basename,
+                                       '{0}'.format(frame),
+                                       'montage.png'))
+                             for frame in frames]
+            for files, montage_file in zip(frame_files, montage_files):
+                _imagemagick_montage(files, labels, montage_file,
+                                     opts.get('montage_args', ''))
+
+            print("Joining images into .gif file")
+            _imagemagick_convert(montage_files, animation_file)
+            for montage_file in montage_files:
+                remove(montage_file)
+    finally:
+        print("Cleaning up...")
+        remove_previews(previews)
 
-    for frame in frames:
-        montage_call_args = ['montage', '-font', 'Helvetica',
-                             '-pointsize', '18']
-        montage_call_args.extend(opts.get('montage_args', '').split())
-            
-        for index, label in enumerate(labels):
-            montage_call_args.extend(['-label', label,
-                                      '.'.join((output_basename,
-                                                '{0}'.format(index),
-                                                '{0:04d}'.format(frame),
-                                                'png'))])
-
-        montage_call_args.append('.'.join((output_basename,
-                                           '{0}'.format(frame),
-                                           'montage.png')))
-        try:
-            call(montage_call_args)
-        except OSError as err:
-            raise Exception("\n\nCould not run Imagemagick convert " +
-                            "to create .gif.\n Error message: " +
-                            "{0}\nAre you sure you have".format(err) +
-                            " Imagemagick installed?\n")
+    print("Done!")
 
-    print("Joining images into .gif file")
 
-    convert_call_args = (['convert', '-delay', '10'] +
-                         ['.'.join((output_basename,
-                                    '{0}'.format(frame),
-                                    'montage.png'))
-                          for frame in frames] +
-                         ['-loop', '0', output_basename + '.gif'])
-    call(convert_call_args)
-    print("Cleaning up...")
-    for frame in frames:
-        for index in range(len(labels)):
-            remove('.'.join((output_basename, '{0}'.format(index),
-                             '{0:04d}'.format(frame), 'png')))
-        remove('.'.join((output_basename, '{0}'.format(frame),
-                         'montage', 'png')))
+def _use_frame_buffer(opts):
+    """Pass frames from the Blender worker (or software renderer) to the
+    compositor in memory"""
+    return (_use_compositor(opts) and opts.get('frame_buffer', True) and
+            (opts.get('blender_worker', True) or _software_backend(opts)) and
+            not opts.get('gui', False))
 
-    print("Done!")
+
+def _software_backend(opts):
+    """Draw with the NumPy renderer (ascii_phonons.software) not Blender"""
+    backend = opts.get('backend', 'blender')
+    if backend not in ('blender', 'software'):
+        raise Exception('Unknown backend "{0}"'.format(backend))
+    return backend == 'software' and not opts.get('gui', False)
+
+
+def _use_compositor(opts):
+    """Use Pillow for montages unless unavailable or ImageMagick
+    arguments were given"""
+    return compositor.available() and not opts.get('montage_args', '')
+
+
+def _imagemagick_montage(image_files, labels, montage_file, montage_args=''):
+    """Tile labelled images with Imagemagick montage"""
+    montage_call_args = ['montage', '-font', 'Helvetica', '-pointsize', '18']
+    montage_call_args.extend(montage_args.split())
+    for image_file, label in zip(image_files, labels):
+        montage_call_args.extend(['-label', label, image_file])
+    montage_call_args.append(montage_file)
+    try:
+        call(montage_call_args)
+    except OSError as err:
+        raise Exception("\n\nCould not run Imagemagick montage " +
+                        "to create tiled image.\n Error message: " +
+                        "{0}\nAre you sure you have".format(err) +
+                        " Imagemagick installed?\n")
+
+
+def _imagemagick_convert(image_files, gif_name):
+    """Join images into a .gif with Imagemagick convert"""
+    convert_call_args = (['convert', '-delay', '10'] +
+                         image_files + ['-loop', '0', gif_name])
+    try:
+        call(convert_call_args)
+    except OSError as err:
+        raise Exception("\n\nCould not run Imagemagick convert" +
+                        " to create .gif.\n Error message:" +
+                        " {0}\nAre you sure".format(err) +
+                        " you have Imagemagick installed?\n")
 
 
 def _flabelformat(freq):
@@ -312,23 +1126,16 @@ def _flabelformat(freq):
         return label
 
 
-def _qpt_freq_iter(ascii_file):
-    """Generate tuples of qpt (as list) and frequency"""
-    for txtline in _qpt_string_iter(ascii_file):
-        listline = [float(x) for x in txtline.split(';')]
-        yield(listline[0:3], listline[3])
-
-
-def _qpt_string_iter(ascii_file):
-    for match in _qpt_regex_iter(ascii_file):
-        if match:
-            yield match.group()
+def _qpt_freq_iter(ascii_file, cache=False):
+    """Generate tuples of qpt (as list) and frequency
 
+    If cache is True, the binary sidecar is read or written so that
+    Blender does not need to parse the ascii file again.
+    """
+    vsim_data = load_vsim(ascii_file, cache=cache)
+    for qpt, freq in zip(vsim_data.qpts, vsim_data.frequencies):
+        yield (qpt.tolist(), float(freq))
 
-def _qpt_regex_iter(ascii_file):
-    with open(ascii_file, 'r') as f:
-        for line in f:
-            yield re.search('(?<=#metaData: qpt=\[).*(?= \\\\)', line)
 
 def parse_tuple(tuple_string, value_type=float):
     """Get a tuple back from string representation
@@ -0,0 +1,97 @@
+"""Run renders without blocking an interactive session
+
+:class:`BackgroundJob` calls a function such as
+:func:`ascii_phonons.montage_anim` in a separate thread, collecting the
+status messages of the Blender workers so that a GUI can poll for
+progress (e.g. with the Tk ``after`` method) and cancel the job.
+"""
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import ascii_phonons
+
+
+class BackgroundJob(object):
+    def __init__(self, function, *args, **kwargs):
+        """Call a function in a background thread
+
+        Only one job should run at a time, as worker messages from all
+        renders are collected (see
+        :func:`ascii_phonons.add_progress_callback`).
+
+        :param function: Function to call with remaining arguments
+        :type function: function
+
+        """
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        """Start the job and return immediately"""
+        ascii_phonons.add_progress_callback(self._events.put)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.function(*self.args, **self.kwargs)
+        except Exception as err:
+            self.error = err
+        finally:
+            ascii_phonons.remove_progress_callback(self._events.put)
+
+    def running(self):
+        """Check whether the function is still running"""
+        return self._thread.is_alive()
+
+    def events(self):
+        """Get worker messages received since the last call
+
+        :returns: Status messages, oldest first
+        :rtype: list of dicts
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def cancel(self):
+        """Stop the job by killing the Blender workers
+
+        The function then fails with an error; ``cancelled`` is set so
+        that this can be told apart from other failures. Only renders by
+        the Blender workers can be stopped: if no worker was rendering
+        (e.g. with the software backend or blender_worker=False) the job
+        carries on and ``cancelled`` is left unset.
+
+        :returns: True if a render was interrupted
+        :rtype: bool
+        """
+        if self.running() and ascii_phonons.cancel_renders():
+            self.cancelled = True
+        return self.cancelled
+
+    def wait(self, timeout=None):
+        """Block until the job has finished, re-raising any error
+
+        :returns: Return value of the function
+        """
+        self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
@@ -0,0 +1,321 @@
+"""Render many input files and modes from a job manifest
+
+A manifest lists jobs, each an input file with the modes to render and
+any options to override. Jobs are expanded to one task per mode and
+shared between a number of persistent Blender workers. Identical tasks
+are only rendered once, tasks which fail are retried, and the outcome of
+every task is written to a JSON results index.
+
+Manifests are JSON or CSV files. A JSON manifest is a list of jobs, or
+a dict with a 'jobs' list and 'defaults' applied to every job::
+
+    {"defaults": {"gif": true, "n_frames": 20},
+     "jobs": [{"input_file": "Si.ascii", "mode_index": "all"},
+              {"input_file": "GaAs.ascii", "mode_index": [3, 4, 5],
+               "supercell": [3, 3, 3]}]}
+
+A CSV manifest has a header row naming the same keys. Values which are
+valid JSON (numbers, true/false, lists) are decoded; a mode_index column
+may also be a space-separated list of indices.
+
+Each job has the keys
+
+input_file
+    *(str)* Path to .ascii file, relative to the manifest
+mode_index
+    *(int, list of ints or "all")* Modes to render (default 0)
+output_file
+    *(str)* Output path for each mode, formatted with ``{stem}`` (name of
+    input file without extension) and ``{mode_index}``. The default is
+    ``{stem}_{mode_index}`` in the output directory.
+
+Any other keys are options for :func:`ascii_phonons.call_blender`.
+"""
+
+from __future__ import print_function
+import csv
+import json
+import os
+from os import path
+import tempfile
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import ascii_phonons
+
+DEFAULT_OUTPUT = '{stem}_{mode_index}'
+
+
+def _decode(value):
+    """Interpret a CSV field as JSON if possible, otherwise as a string"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def read_manifest(filename):
+    """Read jobs and default options from a JSON or CSV manifest
+
+    :param filename: Path to manifest; files ending .csv are read as CSV
+    :type filename: str
+
+    :returns: Default options and list of jobs
+    :rtype: (dict, list of dicts)
+    """
+    if filename.lower().endswith('.csv'):
+        with open(filename) as f:
+            jobs = [dict((key.strip(), _decode(value.strip()))
+                         for key, value in row.items()
+                         if value is not None and value.strip())
+                    for row in csv.DictReader(f)]
+        return {}, jobs
+
+    with open(filename) as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        return {}, manifest
+    else:
+        return manifest.get('defaults', {}), manifest.get('jobs', [])
+
+
+def _mode_indices(mode_index, input_file, cache_ascii=True):
+    """Interpret the mode_index of a job as a list of ints"""
+    if mode_index == 'all':
+        vsim_data = ascii_phonons.load_vsim(input_file, cache=cache_ascii)
+        return list(range(len(vsim_data.frequencies)))
+    elif isinstance(mode_index, int):
+        return [mode_index]
+    elif isinstance(mode_index, (list, tuple)):
+        return [int(index) for index in mode_index]
+    else:
+        return [int(index) for index in mode_index.replace(';', ' ').split()]
+
+
+def expand_jobs(jobs, defaults=None, base_dir='.', output_dir='.'):
+    """Expand jobs to a list of tasks, one per mode
+
+    :param jobs: Jobs as read from a manifest
+    :type jobs: list of dicts
+    :param defaults: Options for all jobs, overridden by job keys
+    :type defaults: dict or None
+    :param base_dir: Directory for relative input paths
+    :type base_dir: str
+    :param output_dir: Directory for relative output paths
+    :type output_dir: str
+
+    :returns: Options for :func:`ascii_phonons.call_blender` for each
+        task, in manifest order
+    :rtype: list of dicts
+    """
+    tasks = []
+    for job in jobs:
+        options = dict(defaults or {})
+        options.update(job)
+        if 'input_file' not in options:
+            raise Exception("Manifest job has no input_file: "
+                            "{0}".format(json.dumps(job)))
+
+        input_file = path.abspath(path.join(base_dir,
+                                            options['input_file']))
+        if 'config' in options:
+            options['config'] = path.abspath(path.join(base_dir,
+                                                       options['config']))
+        stem = path.splitext(path.basename(input_file))[0]
+        output_template = options.get('output_file', DEFAULT_OUTPUT)
+
+        for index in _mode_indices(options.get('mode_index', 0), input_file,
+                                   options.get('cache_ascii', True)):
+            output_file = output_template.format(stem=stem, mode_index=index)
+            tasks.append(dict(options, input_file=input_file,
+                              mode_index=index, gui=False,
+                              output_file=path.abspath(
+                                  path.join(output_dir, output_file))))
+    return tasks
+
+
+def _task_id(options):
+    return json.dumps(options, sort_keys=True)
+
+
+def run_tasks(tasks, jobs=1, retries=1, index_file=None, verbose=True):
+    """Render tasks with several Blender workers
+
+    Tasks with identical options are rendered once. Tasks which would
+    produce the same images under different names are run after the
+    first of them has finished, so that they are copied from the render
+    cache rather than rendered concurrently.
+
+    :param tasks: Options for :func:`ascii_phonons.call_blender`
+    :type tasks: list of dicts
+    :param jobs: Number of Blender workers
+    :type jobs: int
+    :param retries: Number of times to repeat a task which fails
+    :type retries: int
+    :param index_file: JSON file to which results are written as tasks
+        finish. If None, no file is written.
+    :type index_file: str or None
+    :param verbose: Print a line as each task finishes
+    :type verbose: bool
+
+    :returns: Result of each task, in the order given. Each is a dict
+        with keys 'input_file', 'mode_index', 'output_file', 'outputs',
+        'status' ('done', 'failed' or 'duplicate'), 'attempts',
+        'seconds' and 'error'.
+    :rtype: list of dicts
+    """
+    results = []
+    first_task = {}
+    task_queue = queue.Queue()
+    for position, options in enumerate(tasks):
+        result = {'input_file': options['input_file'],
+                  'mode_index': options['mode_index'],
+                  'output_file': options['output_file'],
+                  'outputs': ascii_phonons.output_paths(**options),
+                  'status': 'pending',
+                  'attempts': 0,
+                  'seconds': 0.,
+                  'error': None}
+        results.append(result)
+
+        task_id = _task_id(options)
+        if task_id in first_task:
+            result['status'] = 'duplicate'
+            result['duplicate_of'] = first_task[task_id]
+        else:
+            first_task[task_id] = position
+            task_queue.put(position)
+
+    # Tasks with the same render key wait for the first to finish
+    first_render = {}
+    waits, signals = {}, {}
+    sources = {}
+    for position in range(len(tasks)):
+        if results[position]['status'] != 'pending':
+            continue
+        options = tasks[position]
+        try:
+            # Each input file is read once, not once per mode
+            source_id = (options['input_file'], options.get('config', ''),
+                         options.get('cache_ascii', False))
+            if source_id not in sources:
+                sources[source_id] = ascii_phonons.render_source(options)
+            key = ascii_phonons.render_key(options, options['mode_index'],
+                                           output=json.dumps(
+                                               [path.splitext(f)[1] for f in
+                                                results[position]['outputs']]),
+                                           source=sources[source_id])
+        except Exception:
+            continue  # The error is reported when the task is run
+        if key in first_render:
+            waits[position] = first_render[key]
+        else:
+            first_render[key] = signals[position] = threading.Event()
+
+    lock = threading.Lock()
+
+    def run(slot):
+        ascii_phonons.set_worker_slot(slot)
+        while True:
+            try:
+                position = task_queue.get_nowait()
+            except queue.Empty:
+                return
+            options, result = tasks[position], results[position]
+            if position in waits:
+                waits[position].wait()
+
+            start = time.time()
+            while result['attempts'] <= retries:
+                result['attempts'] += 1
+                try:
+                    ascii_phonons.call_blender(**options)
+                except Exception as err:
+                    result['error'] = str(err)
+                else:
+                    result['error'] = None
+                    break
+            result['seconds'] = round(time.time() - start, 3)
+            result['status'] = 'failed' if result['error'] else 'done'
+
+            if position in signals:
+                signals[position].set()
+            with lock:
+                if verbose:
+                    print('{0}: {1} mode {2} ({3:.1f} s)'.format(
+                        result['status'], options['input_file'],
+                        options['mode_index'], result['seconds']))
+                if index_file is not None:
+                    write_index(results, index_file)
+
+    n_threads = max(1, min(jobs, task_queue.qsize()))
+    threads = [threading.Thread(target=run, args=(slot,))
+               for slot in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if index_file is not None:
+        write_index(results, index_file)
+    return results
+
+
+def write_index(results, index_file):
+    """Write task results as JSON, replacing the file atomically
+
+    :param results: Results from :func:`run_tasks`
+    :type results: list of dicts
+    :param index_file: Output path
+    :type index_file: str
+    """
+    directory = path.dirname(path.abspath(index_file))
+    handle, tmp_file = tempfile.mkstemp(dir=directory, suffix='.json')
+    with os.fdopen(handle, 'w') as f:
+        json.dump({'tasks': results}, f, indent=2)
+    os.replace(tmp_file, index_file)
+
+
+def run_manifest(manifest_file, jobs=1, retries=1, index_file=None,
+                 output_dir=None, defaults=None, verbose=True):
+    """Render all jobs in a manifest
+
+    :param manifest_file: Path to JSON or CSV manifest
+    :type manifest_file: str
+    :param jobs: Number of Blender workers
+    :type jobs: int
+    :param retries: Number of times to repeat a task which fails
+    :type retries: int
+    :param index_file: Path of results index. By default, the manifest
+        path with the extension replaced by '.results.json'.
+    :type index_file: str or None
+    :param output_dir: Directory for relative output paths; by default
+        the directory containing the manifest
+    :type output_dir: str or None
+    :param defaults: Options applied to all jobs, before the defaults in
+        the manifest
+    :type defaults: dict or None
+    :param verbose: Print a line as each task finishes
+    :type verbose: bool
+
+    :returns: Results as for :func:`run_tasks`
+    :rtype: list of dicts
+    """
+    base_dir = path.dirname(path.abspath(manifest_file))
+    if index_file is None:
+        index_file = path.splitext(manifest_file)[0] + '.results.json'
+    if output_dir is None:
+        output_dir = base_dir
+
+    manifest_defaults, manifest_jobs = read_manifest(manifest_file)
+    options = dict(defaults or {})
+    options.update(manifest_defaults)
+    tasks = expand_jobs(manifest_jobs, defaults=options, base_dir=base_dir,
+                        output_dir=output_dir)
+    return run_tasks(tasks, jobs=jobs, retries=retries,
+                     index_file=index_file, verbose=verbose)
@@ -0,0 +1,330 @@
+"""In-process image tiling and animation encoding
+
+Montages and animations are assembled with Pillow and NumPy rather than
+by launching ImageMagick for every frame. Pillow is optional: if it is
+not installed, :func:`available` returns False and callers fall back to
+ImageMagick. :class:`AnimationEncoder` can also stream frames to ffmpeg.
+"""
+
+from __future__ import division
+import io
+import math
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
+
+def available():
+    """Check whether Pillow could be imported"""
+    return Image is not None
+
+
+def load_font(size=18):
+    """Get a font for labels, similar to the ImageMagick montage default
+
+    :param size: Font size in points
+    :type size: int
+
+    :rtype: PIL.ImageFont.ImageFont
+    """
+    for name in ('Helvetica.ttf', 'Arial.ttf', 'DejaVuSans.ttf'):
+        try:
+            return ImageFont.truetype(name, size)
+        except IOError:
+            pass
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has a fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def open_image(filename):
+    """Read an image file fully into memory as RGB
+
+    :param filename: Path to image
+    :type filename: str
+
+    :rtype: PIL.Image.Image
+    """
+    with Image.open(filename) as image:
+        return image.convert('RGB')
+
+
+def tile_images(images, labels=None, columns=None, font=None,
+                background=(255, 255, 255), spacing=4):
+    """Arrange images in a grid, with a text label below each one
+
+    :param images: Images to tile, in row order. Arrays are taken to be
+        (height, width, 3 or 4) uint8 RGB(A) pixels.
+    :type images: list of PIL.Image.Image or arrays
+    :param labels: Label for each image. See
+        :func:`ascii_phonons._flabelformat`.
+    :type labels: list of str or None
+    :param columns: Number of columns. By default the grid is made as
+        close to square as possible.
+    :type columns: int or None
+    :param font: Label font; if None, :func:`load_font` is used
+    :type font: PIL.ImageFont.ImageFont or None
+    :param background: RGB colour of space between images
+    :type background: 3-tuple of ints
+    :param spacing: Gap around each image in pixels
+    :type spacing: int
+
+    :returns: Tiled image
+    :rtype: PIL.Image.Image
+    """
+    if columns is None:
+        columns = int(math.ceil(math.sqrt(len(images))))
+    rows = int(math.ceil(len(images) / columns))
+
+    if labels is not None and font is None:
+        font = load_font()
+    if labels is None:
+        label_height = 0
+    else:
+        label_height = font.getbbox('0.-9')[3] + spacing
+
+    arrays = [image[:, :, :3] if isinstance(image, np.ndarray)
+              else np.asarray(image.convert('RGB')) for image in images]
+    tile_height = max(array.shape[0] for array in arrays)
+    tile_width = max(array.shape[1] for array in arrays)
+    cell_height = tile_height + label_height + 2 * spacing
+    cell_width = tile_width + 2 * spacing
+
+    canvas = np.empty((rows * cell_height, columns * cell_width, 3),
+                      dtype=np.uint8)
+    canvas[:, :] = background
+    origins = []
+    for index, array in enumerate(arrays):
+        row, column = divmod(index, columns)
+        top = row * cell_height + spacing + (tile_height - array.shape[0]) // 2
+        left = (column * cell_width + spacing +
+                (tile_width - array.shape[1]) // 2)
+        canvas[top:top + array.shape[0], left:left + array.shape[1]] = array
+        origins.append((column * cell_width,
+                        row * cell_height + spacing + tile_height))
+
+    montage = Image.fromarray(canvas)
+    if labels is not None:
+        draw = ImageDraw.Draw(montage)
+        for (left, top), label in zip(origins, labels):
+            text_width = draw.textlength(label, font=font)
+            draw.text((left + (cell_width - text_width) / 2, top + spacing),
+                      label, fill=(0, 0, 0), font=font)
+    return montage
+
+
+def save_animation(frames, filename, delay=10, loop=0, apng=False):
+    """Encode a sequence of images as an animated GIF or PNG
+
+    GIF frames are consumed from the iterable as the file is written, so
+    they may be generated on demand. Pillow's APNG writer passes over the
+    frames twice, so these are collected in memory first.
+
+    :param frames: Animation frames
+    :type frames: iterable of PIL.Image.Image
+    :param filename: Output file
+    :type filename: str
+    :param delay: Time between frames in hundredths of a second, as for
+        ImageMagick ``convert -delay``
+    :type delay: int
+    :param loop: Number of times to play; 0 repeats forever
+    :type loop: int
+    :param apng: Write an animated PNG instead of a GIF
+    :type apng: bool
+    """
+    if apng:
+        frames = list(frames)
+        first, frames = frames[0], frames[1:]
+    else:
+        frames = iter(frames)
+        first = next(frames)
+    first.save(filename, format=('PNG' if apng else 'GIF'), save_all=True,
+               append_images=frames, duration=delay * 10, loop=loop)
+
+
+def ffmpeg_path():
+    """Location of ffmpeg executable, or None if it is not on the PATH"""
+    return which('ffmpeg')
+
+
+class AnimationEncoder(object):
+    def __init__(self, filename, delay=10, apng=False, ffmpeg=None):
+        """Encode an animation in a background thread as frames arrive
+
+        Frames may be added while they are still being rendered; each is
+        passed to the encoder straight away, so encoding overlaps with
+        rendering and frame files can be deleted as soon as they have
+        been read. GIFs are written with ffmpeg if it is available,
+        otherwise with Pillow.
+
+        :param filename: Output file
+        :type filename: str
+        :param delay: Time between frames in hundredths of a second
+        :type delay: int
+        :param apng: Write an animated PNG instead of a GIF (Pillow only)
+        :type apng: bool
+        :param ffmpeg: Use ffmpeg; if None, use it when available
+        :type ffmpeg: bool or None
+
+        """
+        if ffmpeg is None:
+            ffmpeg = not apng and ffmpeg_path() is not None
+        if not ffmpeg and not available():
+            raise Exception("Pillow or ffmpeg is needed to encode "
+                            "animations")
+
+        self.filename = filename
+        self.delay = delay
+        self.apng = apng
+        self.ffmpeg = ffmpeg
+        self.n_frames = 0
+
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add_frame(self, image):
+        """Append a frame
+
+        :param image: Frame image
+        :type image: PIL.Image.Image
+        """
+        self._queue.put((image, False))
+
+    def add_file(self, filename, remove_file=False):
+        """Append a frame from an image file
+
+        :param filename: Path to image
+        :type filename: str
+        :param remove_file: Delete the file once it has been read
+        :type remove_file: bool
+        """
+        self._queue.put((filename, remove_file))
+
+    def close(self):
+        """Finish writing the animation
+
+        Blocks until all frames are encoded. Errors from the encoding
+        thread are raised here.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def abort(self):
+        """Stop encoding and remove any partial output"""
+        self._error = self._error or Exception("Encoding aborted")
+        self._queue.put(None)
+        self._thread.join()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+    def _items(self):
+        """Yield (source, remove_file) pairs until closed"""
+        while True:
+            item = self._queue.get()
+            if item is None or self._error is not None:
+                return
+            self.n_frames += 1
+            yield item
+
+    def _images(self):
+        """Yield frames as images, removing files after reading"""
+        for source, remove_file in self._items():
+            if isinstance(source, Image.Image):
+                yield source
+            else:
+                image = open_image(source)
+                if remove_file:
+                    os.remove(source)
+                yield image
+
+    def _png_data(self):
+        """Yield frames as encoded PNG data, removing files after reading"""
+        for source, remove_file in self._items():
+            if Image is not None and isinstance(source, Image.Image):
+                data = io.BytesIO()
+                source.save(data, format='PNG')
+                yield data.getvalue()
+            else:
+                with open(source, 'rb') as f:
+                    data = f.read()
+                if remove_file:
+                    os.remove(source)
+                yield data
+
+    def _run(self):
+        try:
+            if self.ffmpeg:
+                self._run_ffmpeg()
+            else:
+                save_animation(self._images(), self.filename,
+                               delay=self.delay, apng=self.apng)
+        except Exception as err:
+            self._error = err
+
+    def _run_ffmpeg(self):
+        # A palette is generated for each frame on its own, so ffmpeg can
+        # write every frame as it arrives instead of buffering the whole
+        # animation to compute one global palette
+        process = None
+        broken_pipe = False
+        try:
+            for data in self._png_data():
+                if process is None:
+                    process = subprocess.Popen(
+                        [ffmpeg_path(), '-y', '-loglevel', 'error',
+                         '-f', 'image2pipe', '-framerate',
+                         '{0:g}'.format(100. / self.delay), '-c:v', 'png',
+                         '-i', '-', '-filter_complex',
+                         'split[a][b];[a]palettegen=stats_mode=single[p];'
+                         '[b][p]paletteuse=new=1',
+                         '-loop', '0', self.filename],
+                        stdin=subprocess.PIPE)
+                try:
+                    process.stdin.write(data)
+                except (IOError, OSError):
+                    # ffmpeg has exited; its status is reported below
+                    broken_pipe = True
+                    break
+        except Exception:
+            if process is not None:
+                process.kill()
+                process.wait()
+            raise
+        if process is None:
+            raise Exception("No frames to encode")
+
+        if self._error is not None:
+            # Aborted; the partial output is removed by abort()
+            process.kill()
+        try:
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+        returncode = process.wait()
+        if (returncode != 0 or broken_pipe) and self._error is None:
+            raise Exception("ffmpeg failed to encode {0} (exit status "
+                            "{1})".format(self.filename, returncode))
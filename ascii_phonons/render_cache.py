@@ -0,0 +1,164 @@
+"""Local cache of rendered frames and output files
+
+Entries are stored in a directory named by a content hash (see
+:func:`ascii_phonons.render_key`), so identical renders are only made
+once. When the cache grows beyond its size limit, the least recently used
+entries are removed by :meth:`RenderCache.evict`, which lists the whole
+cache and so is called once per job rather than after every entry.
+Only directories named by a key are treated as entries; anything else
+in the cache directory is left alone.
+"""
+
+import os
+from os import path
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+# Keys are SHA-256 hex digests
+_key_pattern = re.compile('^[0-9a-f]{64}$')
+
+
+def default_cache_dir():
+    """Per-user cache directory, following the XDG convention"""
+    return path.join(os.environ.get('XDG_CACHE_HOME',
+                                    path.join(path.expanduser('~'), '.cache')),
+                     'ascii-phonons')
+
+
+class RenderCache(object):
+    def __init__(self, directory=None, max_size=1024):
+        """Cache of render results, limited in total size
+
+        :param directory: Cache location; created if necessary. If None,
+            use :func:`default_cache_dir`.
+        :type directory: str or None
+        :param max_size: Maximum total size in MB
+        :type max_size: float
+
+        """
+        if directory is None:
+            directory = default_cache_dir()
+        self.directory = path.abspath(path.expanduser(directory))
+        self.max_size = max_size * 1024**2
+        if not path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _entry(self, key):
+        return path.join(self.directory, key)
+
+    def _entries(self):
+        """Directories of all entries in the cache"""
+        return [self._entry(name) for name in os.listdir(self.directory)
+                if _key_pattern.match(name) and path.isdir(self._entry(name))]
+
+    def _hit(self, key):
+        """Get entry directory and mark it as recently used, or None"""
+        entry = self._entry(key)
+        if not path.isdir(entry):
+            return None
+        try:
+            os.utime(entry, None)
+        except OSError:
+            return None
+        return entry
+
+    def _store(self, key, write):
+        """Create an entry atomically by calling write(tmp_directory)"""
+        tmp_entry = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            write(tmp_entry)
+            if path.isdir(self._entry(key)):
+                shutil.rmtree(self._entry(key), ignore_errors=True)
+            os.rename(tmp_entry, self._entry(key))
+        except OSError:
+            # Another process may have stored the same entry meanwhile
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    def get_frames(self, key):
+        """Get cached frames
+
+        :param key: Entry key
+        :type key: str
+
+        :returns: Frames, or None if not in the cache
+        :rtype: array or None
+        """
+        entry = self._hit(key)
+        if entry is None:
+            return None
+        try:
+            return np.load(path.join(entry, 'frames.npy'))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put_frames(self, key, frames):
+        """Store frames
+
+        :param key: Entry key
+        :type key: str
+        :param frames: Frames
+        :type frames: array
+        """
+        self._store(key, lambda entry: np.save(path.join(entry, 'frames.npy'),
+                                               frames))
+
+    def get_files(self, key, destinations):
+        """Copy cached files to their destinations
+
+        :param key: Entry key
+        :type key: str
+        :param destinations: Output paths, in the order the files were
+            stored
+        :type destinations: list of str
+
+        :returns: True if the files were found and copied
+        :rtype: bool
+        """
+        entry = self._hit(key)
+        if entry is None:
+            return False
+        sources = [path.join(entry, str(i)) for i in range(len(destinations))]
+        if not all(path.isfile(source) for source in sources):
+            return False
+        for source, destination in zip(sources, destinations):
+            shutil.copyfile(source, destination)
+        return True
+
+    def put_files(self, key, files):
+        """Store copies of files
+
+        :param key: Entry key
+        :type key: str
+        :param files: Paths of files to store, in order
+        :type files: list of str
+        """
+        def write(entry):
+            for i, filename in enumerate(files):
+                shutil.copyfile(filename, path.join(entry, str(i)))
+        self._store(key, write)
+
+    def evict(self):
+        """Remove least recently used entries until within size limit"""
+        entries = []
+        for entry in self._entries():
+            try:
+                size = sum(path.getsize(path.join(entry, f))
+                           for f in os.listdir(entry))
+                entries.append((path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+
+        total = sum(size for mtime, size, entry in entries)
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Remove all entries"""
+        for entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,341 @@
+"""NumPy software renderer for previews and thumbnails
+
+Ball-and-arrow images like those made by Blender are drawn directly with
+NumPy, without launching Blender: atoms are flat-coloured discs (as the
+Blender materials are shadeless) with outlines, the unit cell box is
+drawn as lines and eigenvectors as arrows. Objects are painted from back
+to front. The scene is described by :mod:`vsim2blender.scene_graph`, as
+for Blender, so the view, zoom and projection match the Blender render
+closely, although outlines are approximations of the Freestyle lines.
+
+Select this backend with the option ``backend='software'``. Pillow is
+needed to write image files.
+"""
+
+from __future__ import division
+import math
+
+import numpy as np
+
+import ascii_phonons
+ascii_phonons.use_addons()
+from vsim2blender import Opts as SceneOpts
+from vsim2blender.scene_graph import BOX_EDGES, build_graph, frame_range
+from ascii_phonons import compositor
+
+
+def srgb(colour):
+    """Apply the sRGB display transform to a linear RGB colour
+
+    Blender material colours are linear; rendered images are sRGB.
+
+    :param colour: Linear RGB values from 0 to 1
+    :type colour: 3-tuple of floats
+
+    :rtype: 3-array of floats from 0 to 1
+    """
+    colour = np.clip(np.asarray(colour, dtype=float), 0, 1)
+    return np.where(colour <= 0.0031308, 12.92 * colour,
+                    1.055 * colour**(1 / 2.4) - 0.055)
+
+
+class Camera(object):
+    def __init__(self, parameters, width, height):
+        """Pinhole or orthographic camera projecting onto an image
+
+        :param parameters: Camera of a scene graph, from
+            :func:`vsim2blender.scene_graph.camera_parameters`
+        :type parameters: dict
+        :param width: Image width in pixels
+        :type width: int
+        :param height: Image height in pixels
+        :type height: int
+
+        """
+        self.position = np.asarray(parameters['position'])
+        self.right = np.asarray(parameters['right'])
+        self.up = np.asarray(parameters['up'])
+        self.forward = np.asarray(parameters['forward'])
+        self.orthographic = parameters['orthographic']
+        self.width, self.height = width, height
+
+        # Blender fits the sensor to the larger image dimension
+        size = max(width, height)
+        if self.orthographic:
+            self.scale = size / parameters['ortho_scale']
+        else:
+            self.scale = parameters['lens'] / parameters['sensor_width'] * size
+
+    def project(self, points):
+        """Project points to pixel coordinates
+
+        :param points: Cartesian positions
+        :type points: (n, 3) array
+
+        :returns: x and y in pixels (from top left), depth from camera,
+            and pixels per unit length at each point
+        :rtype: 4-tuple of (n,) arrays
+        """
+        relative = np.asarray(points, dtype=float) - self.position
+        x = np.dot(relative, self.right)
+        y = np.dot(relative, self.up)
+        depth = np.dot(relative, self.forward)
+        if self.orthographic:
+            scale = np.full(depth.shape, self.scale)
+        else:
+            scale = self.scale / depth
+        return (self.width / 2 + x * scale, self.height / 2 - y * scale,
+                depth, scale)
+
+
+class Canvas(object):
+    def __init__(self, width, height, background):
+        """Anti-aliased RGB drawing surface
+
+        :param width: Width in pixels
+        :type width: int
+        :param height: Height in pixels
+        :type height: int
+        :param background: RGB colour from 0 to 1
+        :type background: 3-tuple of floats
+
+        """
+        self.width, self.height = width, height
+        self.pixels = np.empty((height, width, 3))
+        self.pixels[:, :] = background
+
+    def _window(self, x_min, x_max, y_min, y_max):
+        """Pixel centre coordinates of a bounding box, clipped to canvas"""
+        x0, y0 = max(int(math.floor(x_min)), 0), max(int(math.floor(y_min)),
+                                                     0)
+        x1 = min(int(math.ceil(x_max)) + 1, self.width)
+        y1 = min(int(math.ceil(y_max)) + 1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None, None, None
+        ys, xs = np.mgrid[y0:y1, x0:x1] + 0.5
+        return (slice(y0, y1), slice(x0, x1)), xs, ys
+
+    def _blend(self, window, coverage, colour):
+        region = self.pixels[window]
+        region += (np.clip(coverage, 0, 1)[:, :, np.newaxis] *
+                   (np.asarray(colour) - region))
+
+    def disc(self, x, y, radius, colour):
+        """Fill a circle"""
+        window, xs, ys = self._window(x - radius - 1, x + radius + 1,
+                                      y - radius - 1, y + radius + 1)
+        if window is not None:
+            self._blend(window, radius + 0.5 - np.hypot(xs - x, ys - y),
+                        colour)
+
+    def line(self, start, end, width, colour):
+        """Draw a line segment with round ends"""
+        (x0, y0), (x1, y1) = start, end
+        half_width = width / 2
+        window, xs, ys = self._window(
+            min(x0, x1) - half_width - 1, max(x0, x1) + half_width + 1,
+            min(y0, y1) - half_width - 1, max(y0, y1) + half_width + 1)
+        if window is None:
+            return
+        dx, dy = x1 - x0, y1 - y0
+        length_sq = dx * dx + dy * dy
+        if length_sq > 0:
+            t = np.clip(((xs - x0) * dx + (ys - y0) * dy) / length_sq, 0, 1)
+        else:
+            t = 0
+        distance = np.hypot(xs - x0 - t * dx, ys - y0 - t * dy)
+        self._blend(window, half_width + 0.5 - distance, colour)
+
+    def triangle(self, corners, colour):
+        """Fill a triangle"""
+        corners = np.asarray(corners, dtype=float)
+        window, xs, ys = self._window(corners[:, 0].min() - 1,
+                                      corners[:, 0].max() + 1,
+                                      corners[:, 1].min() - 1,
+                                      corners[:, 1].max() + 1)
+        if window is None:
+            return
+        (x0, y0), (x1, y1), (x2, y2) = corners
+        if (x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0) < 0:
+            corners = corners[::-1]
+
+        # Signed distance inside each edge
+        inside = None
+        for (xa, ya), (xb, yb) in zip(corners, np.roll(corners, -1, axis=0)):
+            length = math.hypot(xb - xa, yb - ya)
+            if length == 0:
+                return
+            distance = ((xb - xa) * (ys - ya) - (yb - ya) * (xs - xa)) / length
+            inside = distance if inside is None else np.minimum(inside,
+                                                                distance)
+        self._blend(window, inside + 0.5, colour)
+
+    def rgba(self):
+        """Pixels as a (height, width, 4) uint8 array"""
+        image = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        image[:, :, :3] = self.pixels * 255 + 0.5
+        image[:, :, 3] = 255
+        return image
+
+
+def render_frames(**options):
+    """Draw all frames of a mode
+
+    Options are as for :func:`ascii_phonons.call_blender`.
+
+    :returns: RGBA frames, top row first
+    :rtype: (n_frames, height, width, 4) uint8 array
+    """
+    graph = build_graph(**options)
+    graph.set_mode(SceneOpts(options).get('mode_index', 0))
+    return draw_graph(graph)
+
+
+def draw_graph(graph):
+    """Draw the frames of a scene graph
+
+    :param graph: Scene graph with a mode set
+    :type graph: vsim2blender.scene_graph.SceneGraph
+
+    :returns: RGBA frames, top row first
+    :rtype: (n_frames, height, width, 4) uint8 array
+    """
+    resolution = graph.resolution
+    percentage = resolution['percentage']
+    camera = Camera(graph.camera,
+                    resolution['x_pixels'] * percentage // 100,
+                    resolution['y_pixels'] * percentage // 100)
+
+    box_edges = None
+    corners = graph.box_corners
+    if corners is not None:
+        box_edges = [(corners[i], corners[j]) for i, j in BOX_EDGES]
+
+    style = dict((key, srgb(graph.style[key]))
+                 for key in ('background', 'outline', 'box', 'arrow'))
+    style['outline_width'] = (graph.style['outline_thickness'] *
+                              percentage / 100)
+    style['box_width'] = graph.style['box_thickness'] * percentage / 100
+
+    radii = graph.atom_radii
+    colours = [srgb(colour) for colour in graph.atom_colours]
+    arrows = graph.arrows()
+
+    # Frames a whole period apart are identical, so each phase is drawn
+    # once and repeated
+    phases, order = np.unique(np.mod(graph.frames, graph.period),
+                              return_inverse=True)
+    images = np.array([_draw(camera, locations, radii, colours, arrows,
+                             box_edges, style)
+                       for locations in graph.trajectory(list(phases))])
+    return images[order.ravel()]
+
+
+def _draw(camera, locations, radii, colours, arrows, box_edges, style):
+    """Paint one frame from back to front"""
+    canvas = Canvas(camera.width, camera.height, style['background'])
+    items = []
+
+    x, y, depth, scale = camera.project(locations)
+    for i in range(len(locations)):
+        items.append((depth[i], 'atom', (x[i], y[i], radii[i] * scale[i],
+                                         colours[i])))
+
+    if arrows is not None:
+        starts, vectors = arrows
+        for start, vector in zip(starts, vectors):
+            ends = camera.project([start, start + vector,
+                                   start + 0.5 * vector])
+            if ends[2][2] > 0:
+                items.append((ends[2][2], 'arrow',
+                              ((ends[0][0], ends[1][0]),
+                               (ends[0][1], ends[1][1]),
+                               np.linalg.norm(vector) * ends[3][2])))
+
+    if box_edges is not None:
+        # Edges are split so that atoms hide only the parts behind them
+        for start, end in box_edges:
+            points = start + np.linspace(0, 1, 9)[:, np.newaxis] * (end - start)
+            px, py, pdepth, _ = camera.project(points)
+            for k in range(8):
+                items.append(((pdepth[k] + pdepth[k + 1]) / 2, 'box',
+                              ((px[k], py[k]), (px[k + 1], py[k + 1]))))
+
+    outline = style['outline_width']
+    for item_depth, kind, data in sorted(items, key=lambda item: -item[0]):
+        if item_depth <= 0:
+            continue
+        if kind == 'atom':
+            x, y, radius, colour = data
+            canvas.disc(x, y, radius + outline / 2, style['outline'])
+            canvas.disc(x, y, radius - outline / 2, colour)
+        elif kind == 'box':
+            canvas.line(data[0], data[1], style['box_width'], style['box'])
+        else:
+            start, end, length = data
+            _draw_arrow(canvas, np.array(start), np.array(end), length,
+                        style)
+    return canvas.rgba()
+
+
+def _draw_arrow(canvas, start, end, length, style):
+    """Draw an arrow from its projected ends and on-screen model length"""
+    vector = end - start
+    screen_length = np.linalg.norm(vector)
+    if screen_length < 1:
+        return
+    direction = vector / screen_length
+    normal = np.array([-direction[1], direction[0]])
+    head_length = min(0.3 * length, screen_length)
+    head_width = 0.12 * length
+    neck = end - direction * head_length
+    head = [end, neck + normal * head_width, neck - normal * head_width]
+
+    outline = style['outline_width']
+    shaft_width = max(0.08 * length, 1.)
+    canvas.line(start, neck, shaft_width + outline, style['outline'])
+    canvas.triangle(head, style['outline'])
+    for corner, next_corner in zip(head, head[1:] + head[:1]):
+        canvas.line(corner, next_corner, outline, style['outline'])
+    canvas.line(start, neck, shaft_width, style['arrow'])
+    canvas.triangle(head, style['arrow'])
+
+
+def render(**options):
+    """Render a mode to image files, as :func:`ascii_phonons.call_blender`
+
+    Frames are written as .png files named like Blender output, or with
+    the 'gif' option as an animation.
+
+    :returns: Paths of files written
+    :rtype: list of str
+    """
+    if not compositor.available():
+        raise Exception("The software renderer requires Pillow")
+
+    opts = SceneOpts(options)
+    output_file = opts.get('preview', '') or opts.get('output_file', False)
+    if not output_file:
+        return []
+
+    images = render_frames(**options)
+    frames = frame_range(opts)[0]
+
+    if opts.get('gif', False) and not opts.get('preview', ''):
+        if opts.get('static', False):
+            return []
+        apng = opts.get('apng', False)
+        filename = output_file + ('.png' if apng else '.gif')
+        compositor.save_animation(
+            (compositor.Image.fromarray(image[:, :, :3]) for image in images),
+            filename, apng=apng)
+        return [filename]
+
+    if len(frames) == 1:
+        filenames = [output_file + '.png']
+    else:
+        filenames = ['{0}{1:04d}.png'.format(output_file, frame)
+                     for frame in frames]
+    for image, filename in zip(images, filenames):
+        compositor.Image.fromarray(image).save(filename)
+    return filenames
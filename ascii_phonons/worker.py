@@ -0,0 +1,153 @@
+"""Persistent Blender process which renders a sequence of jobs
+
+Starting Blender is often slower than rendering a small image, so
+rather than launching a new process for every mode in a montage, a
+:class:`BlenderWorker` keeps one background Blender session alive and
+sends it jobs as JSON lines. The Blender side of the protocol is
+implemented in :mod:`vsim2blender.worker`.
+"""
+
+from __future__ import print_function
+import itertools
+import json
+from os import close, path, remove
+import subprocess
+import sys
+import tempfile
+
+# Must match vsim2blender.worker.MESSAGE_PREFIX
+MESSAGE_PREFIX = '@ascii-phonons-worker '
+
+
+class BlenderWorkerError(Exception):
+    """Raised when a job fails or the worker process stops unexpectedly"""
+    pass
+
+
+class BlenderWorker(object):
+    def __init__(self, blender_bin, addons_path):
+        """Launch Blender in background mode and wait until it is ready
+
+        :param blender_bin: Path to Blender binary
+        :type blender_bin: str
+        :param addons_path: Directory containing vsim2blender package
+        :type addons_path: str
+
+        """
+        handle, bootstrap_file = tempfile.mkstemp(suffix='.py')
+        close(handle)
+        with open(bootstrap_file, 'w') as f:
+            f.write("""
+import sys
+sys.path = [{add_path!r}] + sys.path
+
+import vsim2blender.worker
+vsim2blender.worker.main()
+""".format(add_path=path.abspath(addons_path)))
+
+        self._job_ids = itertools.count()
+        self.monitor = None
+        self.busy = False
+        try:
+            self.process = subprocess.Popen(
+                [blender_bin, '--background', '-P', bootstrap_file],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                universal_newlines=True, bufsize=1)
+            self._wait_for('ready')
+        finally:
+            remove(bootstrap_file)
+
+    def is_alive(self):
+        """Check whether the Blender process is still running"""
+        return self.process.poll() is None
+
+    def _read_event(self):
+        """Get the next status message, echoing other Blender output"""
+        for line in iter(self.process.stdout.readline, ''):
+            if line.startswith(MESSAGE_PREFIX):
+                return json.loads(line[len(MESSAGE_PREFIX):])
+            else:
+                sys.stdout.write(line)
+        raise BlenderWorkerError("Blender worker exited unexpectedly "
+                                 "(return code {0})".format(
+                                     self.process.wait()))
+
+    def _wait_for(self, event_type, callback=None):
+        """Read status messages until an event of the given type
+
+        Errors are raised as BlenderWorkerError; any other events are
+        passed to the callback function. Every event is also passed to
+        the ``monitor`` attribute, if set, e.g. to report progress.
+        """
+        while True:
+            event = self._read_event()
+            if self.monitor is not None:
+                self.monitor(event)
+            if event['event'] == event_type:
+                return event
+            elif event['event'] == 'error':
+                raise BlenderWorkerError("Blender job failed:\n" +
+                                         event.get('message', ''))
+            elif callback is not None:
+                callback(event)
+
+    def render(self, options, output_file=False, preview='', callback=None,
+               renders=None):
+        """Build and render a scene, blocking until it is complete
+
+        :param options: Options for vsim2blender.plotter.open_mode and
+            setup_render_freestyle. These must be JSON-serialisable.
+        :type options: dict
+        :param output_file: Blender-formatted output path
+        :type output_file: str or False
+        :param preview: Preview output path, or empty string
+        :type preview: str
+        :param callback: Function called with any intermediate status
+            messages (dicts) reported by the worker
+        :type callback: function or None
+        :param renders: Render several modes from one scene. Each dict
+            has 'mode_index', 'output_file' and 'preview' keys, which
+            replace the arguments above.
+        :type renders: list of dicts or None
+
+        :returns: Completion report
+        :rtype: dict
+
+        """
+        job = {'id': next(self._job_ids),
+               'options': options,
+               'output_file': output_file,
+               'preview': preview}
+        if renders is not None:
+            job['renders'] = renders
+        self.busy = True
+        try:
+            try:
+                self.process.stdin.write(json.dumps(job) + '\n')
+                self.process.stdin.flush()
+            except (IOError, OSError) as err:
+                raise BlenderWorkerError("Could not send job to Blender "
+                                         "worker: {0}".format(err))
+            return self._wait_for('done', callback=callback)
+        finally:
+            self.busy = False
+
+    def close(self):
+        """Ask the worker to quit and wait for the process to end"""
+        if self.is_alive():
+            try:
+                self.process.stdin.write(json.dumps({'command': 'quit'}) +
+                                         '\n')
+                self.process.stdin.close()
+            except (IOError, OSError):
+                pass
+            # Drain remaining output so Blender does not block on exit
+            for line in iter(self.process.stdout.readline, ''):
+                sys.stdout.write(line)
+            self.process.wait()
+
+    def kill(self):
+        """Stop the worker immediately, abandoning any running job"""
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
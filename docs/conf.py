@@ -302,5 +302,5 @@ class Mock(MagicMock):
     def __getattr__(cls, name):
             return Mock()
 
-MOCK_MODULES = ['bpy', 'mathutils', 'yaml']
+MOCK_MODULES = ['bmesh', 'bpy', 'mathutils', 'numpy', 'yaml']
 sys.modules.update((mod_name, Mock()) for mod_name in MOCK_MODULES)
@@ -0,0 +1,25 @@
+"""Shared fixtures for tests run outside Blender
+
+The vsim2blender add-on is imported directly for its bpy-free modules.
+"""
+
+import os
+import sys
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in (os.path.join(root, 'addons'), root):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+examples = os.path.join(root, 'examples')
+kesterite = os.path.join(examples, 'kesterite.ascii')
+angles = os.path.join(examples, 'angles.ascii')
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """Keep sidecars and renders out of the user's cache directory"""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
@@ -0,0 +1,69 @@
+import re
+
+import numpy as np
+import pytest
+
+from conftest import angles, kesterite
+from vsim2blender import ascii_reader
+
+
+def reference_parse(filename):
+    """Line-by-line parser of the original ascii_importer.import_vsim"""
+    with open(filename) as f:
+        f.readline()
+        cell_vsim = [[float(x) for x in f.readline().split()],
+                     [float(x) for x in f.readline().split()]]
+        positions, symbols, commentlines = [], [], []
+        for line in f:
+            if line[0] not in '#!':
+                if line.strip():
+                    line = line.split()
+                    positions.append([float(x) for x in line[0:3]])
+                    symbols.append(line[3])
+            else:
+                commentlines.append(line.strip())
+
+    for index, line in enumerate(commentlines):
+        while line[-1] == '\\':
+            line = line[:-1] + commentlines.pop(index + 1)[1:]
+        commentlines[index] = line[1:]
+
+    modes = []
+    for line in commentlines:
+        vector_txt = re.search(r'qpt=\[(.+)\]', line)
+        if vector_txt:
+            mode_data = vector_txt.group(1).split(';')
+            values = [float(x) for x in mode_data[4:]]
+            vectors = [[complex(v[0], v[3]), complex(v[1], v[4]),
+                        complex(v[2], v[5])]
+                       for v in (values[6 * i:6 * i + 6]
+                                 for i in range(len(positions)))]
+            modes.append((float(mode_data[3]),
+                          [float(x) for x in mode_data[0:3]], vectors))
+    return cell_vsim, positions, symbols, modes
+
+
+@pytest.mark.parametrize('filename', [kesterite, angles])
+def test_read_vsim_matches_reference(filename):
+    cell_vsim, positions, symbols, modes = reference_parse(filename)
+    data = ascii_reader.read_vsim(filename)
+
+    assert np.allclose(data.cell_vsim, cell_vsim)
+    assert np.allclose(data.positions, positions)
+    assert data.symbols == symbols
+    assert np.allclose(data.frequencies, [mode[0] for mode in modes])
+    assert np.allclose(data.qpts, [mode[1] for mode in modes])
+    assert np.allclose(data.eigenvectors, [mode[2] for mode in modes])
+
+
+def test_wrong_number_of_values(tmp_path):
+    filename = tmp_path / 'short.ascii'
+    filename.write_text(u'header\n1 0 1\n0 0 1\n0 0 0 H\n'
+                        u'#metaData: qpt=[0;0;0;1;1;0;0;0;0]\n')
+    with pytest.raises(ValueError):
+        ascii_reader.read_vsim(str(filename))
+
+
+def test_cell_vsim_to_array():
+    lattice = ascii_reader.cell_vsim_to_array([[1., 2., 3.], [4., 5., 6.]])
+    assert np.allclose(lattice, [[1, 0, 0], [2, 3, 0], [4, 5, 6]])
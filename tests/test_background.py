@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+import ascii_phonons
+from ascii_phonons.background import BackgroundJob
+
+
+class FakeWorker(object):
+    def __init__(self, busy):
+        self.busy = busy
+        self.killed = False
+
+    def is_alive(self):
+        return not self.killed
+
+    def kill(self):
+        self.killed = True
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    workers = {}
+    monkeypatch.setattr(ascii_phonons, '_workers', workers)
+    return workers
+
+
+def test_result_and_progress():
+    def render(**options):
+        ascii_phonons._report_progress({'event': 'frame', 'frame': 1})
+        return options['value']
+
+    job = BackgroundJob(render, value=42).start()
+    assert job.wait(5) == 42
+    assert job.events() == [{'event': 'frame', 'frame': 1}]
+    assert not job.running()
+
+
+def test_error_is_raised_by_wait():
+    def render():
+        raise ValueError('bad input')
+
+    job = BackgroundJob(render).start()
+    with pytest.raises(ValueError):
+        job.wait(5)
+    assert not job.cancelled
+
+
+def test_cancel_kills_busy_worker(workers):
+    workers['busy'] = FakeWorker(busy=True)
+    workers['idle'] = FakeWorker(busy=False)
+    release = threading.Event()
+
+    job = BackgroundJob(release.wait, 5).start()
+    assert job.cancel()
+    assert job.cancelled
+    assert workers['busy'].killed and not workers['idle'].killed
+    release.set()
+    job.wait(5)
+
+
+def test_cancel_without_worker_lets_job_finish(workers):
+    workers['idle'] = FakeWorker(busy=False)
+    release = threading.Event()
+
+    job = BackgroundJob(lambda: release.wait(5) and 'done').start()
+    assert not job.cancel()
+    release.set()
+    assert job.wait(5) == 'done'
+    assert not job.cancelled
+    assert not workers['idle'].killed
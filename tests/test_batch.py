@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import ascii_phonons
+from ascii_phonons import batch
+from conftest import kesterite
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    directory = tmp_path / 'inputs'
+    directory.mkdir()
+    shutil.copyfile(kesterite, str(directory / 'kesterite.ascii'))
+    return directory
+
+
+def test_read_csv_manifest(tmp_path):
+    manifest = tmp_path / 'jobs.csv'
+    manifest.write_text(u'input_file,mode_index,supercell,vectors\n'
+                        u'a.ascii,1 2,"[1, 1, 1]",true\n'
+                        u'b.ascii,all,,\n')
+    defaults, jobs = batch.read_manifest(str(manifest))
+    assert defaults == {}
+    assert jobs == [{'input_file': 'a.ascii', 'mode_index': '1 2',
+                     'supercell': [1, 1, 1], 'vectors': True},
+                    {'input_file': 'b.ascii', 'mode_index': 'all'}]
+
+
+def test_expand_jobs(input_dir, tmp_path):
+    tasks = batch.expand_jobs(
+        [{'input_file': 'kesterite.ascii', 'mode_index': [0, 3]},
+         {'input_file': 'kesterite.ascii', 'mode_index': 'all',
+          'output_file': 'all/{stem}-{mode_index}', 'zoom': 2.}],
+        defaults={'zoom': 1., 'static': True}, base_dir=str(input_dir),
+        output_dir=str(tmp_path / 'out'))
+
+    assert len(tasks) == 2 + 24
+    assert tasks[0]['input_file'] == str(input_dir / 'kesterite.ascii')
+    assert tasks[1]['output_file'] == str(tmp_path / 'out' / 'kesterite_3')
+    assert tasks[1]['zoom'] == 1. and tasks[1]['static']
+    assert tasks[-1]['output_file'] == str(tmp_path / 'out' / 'all' /
+                                           'kesterite-23')
+    assert tasks[-1]['zoom'] == 2.
+
+
+def test_job_without_input_file():
+    with pytest.raises(Exception, match='input_file'):
+        batch.expand_jobs([{'mode_index': 1}])
+
+
+def test_duplicates_and_retries(input_dir, tmp_path, monkeypatch):
+    calls = []
+
+    def call_blender(**options):
+        calls.append(options['mode_index'])
+        if options['mode_index'] == 2 and calls.count(2) == 1:
+            raise Exception('worker crashed')
+        if options['mode_index'] == 3:
+            raise Exception('bad mode')
+
+    monkeypatch.setattr(ascii_phonons, 'call_blender', call_blender)
+    tasks = batch.expand_jobs(
+        [{'input_file': 'kesterite.ascii', 'mode_index': [1, 2, 3, 1]}],
+        defaults={'static': True}, base_dir=str(input_dir),
+        output_dir=str(tmp_path))
+    index_file = str(tmp_path / 'index.json')
+    results = batch.run_tasks(tasks, jobs=2, retries=1,
+                              index_file=index_file, verbose=False)
+
+    assert [r['status'] for r in results] == ['done', 'done', 'failed',
+                                              'duplicate']
+    assert results[3]['duplicate_of'] == 0
+    assert results[1]['attempts'] == 2 and results[1]['error'] is None
+    assert results[2]['attempts'] == 2 and results[2]['error'] == 'bad mode'
+    assert sorted(calls) == [1, 2, 2, 3, 3]
+
+    with open(index_file) as f:
+        assert json.load(f) == {'tasks': results}
+
+
+def test_run_manifest_software(input_dir, tmp_path):
+    manifest = input_dir / 'jobs.json'
+    manifest.write_text(json.dumps({
+        'defaults': {'backend': 'software', 'static': True,
+                     'x_pixels': 40, 'y_pixels': 40},
+        'jobs': [{'input_file': 'kesterite.ascii', 'mode_index': [0, 5]}]}))
+
+    for run in range(2):
+        # The second run replaces the existing index
+        results = batch.run_manifest(str(manifest), jobs=2, verbose=False)
+        assert [r['status'] for r in results] == ['done', 'done']
+    for result in results:
+        assert all(os.path.isfile(f) for f in result['outputs'])
+    assert os.path.isfile(str(input_dir / 'jobs.results.json'))
+    assert not [f for f in os.listdir(str(input_dir))
+                if f.endswith('.json') and f.startswith('tmp')]
+
+
+def test_worker_slots(monkeypatch):
+    class Worker(object):
+        def __init__(self, blender_bin, addons_path):
+            self.monitor = None
+
+        def is_alive(self):
+            return True
+
+    monkeypatch.setattr(ascii_phonons, 'BlenderWorker', Worker)
+    monkeypatch.setattr(ascii_phonons, '_workers', {})
+    try:
+        first = ascii_phonons.get_worker('blender')
+        ascii_phonons.set_worker_slot(1)
+        second = ascii_phonons.get_worker('blender')
+        assert second is not first
+        assert ascii_phonons.get_worker('blender') is second
+    finally:
+        ascii_phonons.set_worker_slot(0)
+    assert ascii_phonons.get_worker('blender') is first
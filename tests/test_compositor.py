@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import ascii_phonons
+from ascii_phonons import compositor
+from conftest import kesterite
+
+needs_pillow = pytest.mark.skipif(not compositor.available(),
+                                  reason="Pillow is not installed")
+
+
+def solid(colour, size=(20, 30)):
+    image = np.empty(size + (3,), dtype=np.uint8)
+    image[:, :] = colour
+    return image
+
+
+@needs_pillow
+def test_tile_images_grid():
+    images = [solid((255, 0, 0)), solid((0, 255, 0)), solid((0, 0, 255))]
+    montage = np.asarray(compositor.tile_images(images, spacing=2))
+
+    # Three tiles make a 2x2 grid
+    assert montage.shape == (2 * (20 + 4), 2 * (30 + 4), 3)
+    assert tuple(montage[2, 2]) == (255, 0, 0)
+    assert tuple(montage[2, 36]) == (0, 255, 0)
+    assert tuple(montage[26, 2]) == (0, 0, 255)
+    assert tuple(montage[26, 36]) == (255, 255, 255)
+
+
+@needs_pillow
+def test_tile_images_labels():
+    images = [solid((255, 0, 0), size=(10, 10))] * 2
+    plain = compositor.tile_images(images, columns=2)
+    labelled = compositor.tile_images(images, labels=['1.00', '2.00'],
+                                      columns=2)
+    assert labelled.size[0] == plain.size[0]
+    assert labelled.size[1] > plain.size[1]
+
+
+@needs_pillow
+@pytest.mark.parametrize('apng', [False, True])
+def test_save_animation(tmp_path, apng):
+    from PIL import Image
+    filename = str(tmp_path / ('anim.png' if apng else 'anim.gif'))
+    frames = (Image.fromarray(solid((i * 50, 0, 0))) for i in range(4))
+    compositor.save_animation(frames, filename, apng=apng)
+    with Image.open(filename) as image:
+        assert image.format == ('PNG' if apng else 'GIF')
+        assert image.n_frames == 4
+
+
+def test_apng_montage_needs_pillow(monkeypatch, tmp_path):
+    monkeypatch.setattr(compositor, 'available', lambda: False)
+    with pytest.raises(Exception, match='Pillow'):
+        ascii_phonons.montage_anim(input_file=kesterite, apng=True,
+                                   output_file=str(tmp_path / 'montage'))
+    assert not list(tmp_path.iterdir())
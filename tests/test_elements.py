@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import vsim2blender
+from vsim2blender import elements
+
+
+def test_compile_table(tmp_path):
+    user_config = tmp_path / 'user.conf'
+    user_config.write_text(u'[colours]\nzn = 0.1 0.2 0.3\n')
+    config = vsim2blender.read_config(user_config=str(user_config))
+    table = elements.compile_table(config, ['Cu', 'Zn', 'Xx'])
+
+    assert len(table) == 3 and 'Cu' in table and 'S' not in table
+    assert table.colour('Cu') == (0.8, 0.3, 0.1)
+    assert table.colour('Zn') == (0.1, 0.2, 0.3)
+    assert table.radius('Cu') == 1.32 and table.radius('Xx') == 1.
+    assert table.masses[0] == 63.546 and np.isnan(table.masses[2])
+
+
+def test_random_colour():
+    config = vsim2blender.read_config()
+    colour = elements.element_colour(config, 'Xx')
+    assert colour == elements.element_colour(config, 'Xx')
+    assert colour != elements.element_colour(config, 'Yy')
+    assert all(0 <= x <= 1 for x in colour)
+    table = elements.compile_table(config, ['Cu'])
+    assert table.colour('Xx') == tuple(colour)
+
+
+def test_mass_factors():
+    config = vsim2blender.read_config()
+    table = elements.compile_table(config, ['Cu', 'Xx'])
+    assert (table.mass_factors() == 1).all()
+    with pytest.raises(Exception, match='No mass configured for Xx'):
+        table.mass_factors(0.5)
+    table = elements.compile_table(config, ['Cu'])
+    assert np.allclose(table.mass_factors(-0.5), 63.546**-0.5)
+
+
+def test_default_table():
+    table = elements.default_table()
+    assert elements.default_table() is table
+    assert 'Cu' in table and table.radius('Cu') == 1.32
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from ascii_phonons import compositor
+
+needs_pillow = pytest.mark.skipif(not compositor.available(),
+                                  reason="Pillow is not installed")
+needs_posix = pytest.mark.skipif(sys.platform == 'win32',
+                                 reason="stub ffmpeg is a shell script")
+
+# Stub ffmpeg: count PNG frames on stdin and write them to the output
+COUNT_FRAMES = """#!{python}
+import sys
+data = sys.stdin.buffer.read()
+with open(sys.argv[-1], 'w') as f:
+    f.write(str(data.count(b'IEND')))
+"""
+
+FAIL = """#!/bin/sh
+exit 3
+"""
+
+
+def frame(value):
+    from PIL import Image
+    return Image.fromarray(np.full((16, 16, 3), value, dtype=np.uint8))
+
+
+def stub_ffmpeg(tmp_path, monkeypatch, script):
+    filename = tmp_path / 'ffmpeg'
+    filename.write_text(script.format(python=sys.executable))
+    filename.chmod(0o755)
+    monkeypatch.setattr(compositor, 'ffmpeg_path', lambda: str(filename))
+
+
+@needs_pillow
+def test_pillow_encoder_files(tmp_path):
+    from PIL import Image
+    frame_files = []
+    for i in range(3):
+        frame_files.append(str(tmp_path / '{0}.png'.format(i)))
+        frame(i * 80).save(frame_files[-1])
+
+    output = str(tmp_path / 'anim.gif')
+    encoder = compositor.AnimationEncoder(output, ffmpeg=False)
+    for filename in frame_files:
+        encoder.add_file(filename, remove_file=True)
+    encoder.close()
+
+    assert encoder.n_frames == 3
+    assert not any(os.path.exists(f) for f in frame_files)
+    with Image.open(output) as image:
+        assert image.n_frames == 3
+
+
+@needs_pillow
+def test_abort_removes_output(tmp_path):
+    output = str(tmp_path / 'anim.gif')
+    encoder = compositor.AnimationEncoder(output, ffmpeg=False)
+    encoder.add_frame(frame(0))
+    encoder.abort()
+    assert not os.path.exists(output)
+
+
+@needs_pillow
+@needs_posix
+def test_ffmpeg_receives_every_frame(tmp_path, monkeypatch):
+    stub_ffmpeg(tmp_path, monkeypatch, COUNT_FRAMES)
+    output = str(tmp_path / 'anim.gif')
+    encoder = compositor.AnimationEncoder(output, ffmpeg=True)
+    for i in range(5):
+        encoder.add_frame(frame(i * 50))
+    encoder.close()
+    with open(output) as f:
+        assert f.read() == '5'
+
+
+@needs_pillow
+@needs_posix
+def test_ffmpeg_failure_is_reported(tmp_path, monkeypatch):
+    stub_ffmpeg(tmp_path, monkeypatch, FAIL)
+    encoder = compositor.AnimationEncoder(str(tmp_path / 'anim.gif'),
+                                          ffmpeg=True)
+    for i in range(50):
+        encoder.add_frame(frame(i))
+    with pytest.raises(Exception, match='exit status 3'):
+        encoder.close()
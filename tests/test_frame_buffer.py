@@ -0,0 +1,29 @@
+import numpy as np
+
+import ascii_phonons
+from conftest import kesterite
+
+
+def test_read_frame_buffer(tmp_path):
+    shape = (3, 4, 5, 4)
+    frames = np.arange(np.prod(shape), dtype=np.uint64).astype(np.uint8)
+    buffer_file = str(tmp_path / 'frames.raw')
+    buffer = np.memmap(buffer_file, dtype=np.uint8, mode='w+', shape=shape)
+    buffer[:] = frames.reshape(shape)
+    buffer.flush()
+    del buffer
+
+    read = ascii_phonons.read_frame_buffer(buffer_file, list(shape))
+    assert not isinstance(read, np.memmap)
+    assert np.array_equal(read, frames.reshape(shape))
+
+
+def test_in_memory_modes_software():
+    frames = ascii_phonons.render_modes(
+        {'input_file': kesterite, 'backend': 'software', 'x_pixels': 40,
+         'y_pixels': 30, 'static': True, 'render_cache': False},
+        [0, 3], in_memory=True)
+    assert len(frames) == 2
+    for mode_frames in frames:
+        assert mode_frames.dtype == np.uint8
+        assert mode_frames.shape[0] == 1 and mode_frames.shape[-1] == 4
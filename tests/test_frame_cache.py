@@ -0,0 +1,67 @@
+from fractions import Fraction
+import hashlib
+
+import numpy as np
+
+import ascii_phonons
+from ascii_phonons.render_cache import RenderCache
+from conftest import kesterite
+
+
+def key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def options(**extra):
+    return dict({'input_file': kesterite}, **extra)
+
+
+def test_frame_phases():
+    frames, phases = ascii_phonons.frame_phases(
+        options(n_frames=4, start_frame=2, end_frame=7))
+    assert frames == [2, 3, 4, 5, 6, 7]
+    assert phases == [Fraction(1, 2), Fraction(3, 4), 0, Fraction(1, 4),
+                      Fraction(1, 2), Fraction(3, 4)]
+
+
+def test_static_frames_have_one_phase():
+    frames, phases = ascii_phonons.frame_phases(options(static=True,
+                                                        start_frame=3))
+    assert frames == [3] and phases == [0]
+    frames, phases = ascii_phonons.frame_phases(
+        options(preview='x', n_frames=4))
+    assert set(phases) == {0}
+
+
+def test_equal_phases_share_frames(tmp_path):
+    cache = RenderCache(str(tmp_path / 'renders'))
+    first = ascii_phonons._CachedFrames(cache, options(n_frames=4), 0)
+    assert first.missing == [0, 1, 2, 3]
+    for frame in first.missing:
+        first.add(frame, np.full((2, 2, 4), frame, dtype=np.uint8))
+
+    # Frames 4-9 have the phases of frames 0-3
+    later = ascii_phonons._CachedFrames(
+        cache, options(n_frames=4, start_frame=4, end_frame=9), 0)
+    assert later.missing == []
+    assert [int(image[0, 0, 0]) for image in later.array()] == \
+        [0, 1, 2, 3, 0, 1]
+
+    # Halving the frame rate keeps the even phases
+    slower = ascii_phonons._CachedFrames(cache, options(n_frames=8), 0)
+    assert slower.missing == [1, 3, 5, 7]
+
+
+def test_frames_are_per_mode(tmp_path):
+    cache = RenderCache(str(tmp_path / 'renders'))
+    cached = ascii_phonons._CachedFrames(cache, options(static=True), 0)
+    cached.add(0, np.zeros((2, 2, 4), dtype=np.uint8))
+    assert ascii_phonons._CachedFrames(cache, options(static=True),
+                                       1).missing == [0]
+
+
+def test_store_does_not_evict(tmp_path):
+    cache = RenderCache(str(tmp_path / 'renders'), max_size=0)
+    for name in 'abc':
+        cache.put_frames(key(name), np.zeros(10, dtype=np.uint8))
+    assert all(cache.get_frames(key(name)) is not None for name in 'abc')
@@ -0,0 +1,51 @@
+import subprocess
+import sys
+
+import numpy as np
+
+from conftest import root
+from vsim2blender import ascii_reader
+
+MODE = u'#metaData: qpt=[0;0;0;1.5;1;0;0;0;0;0]\n'
+
+
+def write_ascii(tmp_path, cell, keywords, position):
+    filename = tmp_path / 'keywords.ascii'
+    filename.write_text(u'header\n{0}\n{1}\n#keyword: {2}\n{3} Na\n{4}'.format(
+        cell[0], cell[1], keywords, position, MODE))
+    return str(filename)
+
+
+def test_reduced_positions(tmp_path):
+    filename = write_ascii(tmp_path, ('4 0 4', '0 0 4'), 'reduced',
+                           '0.5 0.25 0.5')
+    for data in (ascii_reader.read_vsim(filename),
+                 ascii_reader.VsimFile(filename)):
+        assert 'reduced' in data.keywords
+        assert np.allclose(data.positions, [[2., 1., 2.]])
+
+
+def test_angdeg_cell(tmp_path):
+    filename = write_ascii(tmp_path, ('3 4 5', '90 90 90'),
+                           'angdeg, reduced', '1 1 1')
+    data = ascii_reader.read_vsim(filename)
+    assert data.keywords == ['angdeg', 'reduced']
+    assert np.allclose(data.cell_vsim, [[3, 0, 4], [0, 0, 5]])
+    assert np.allclose(data.positions, [[3, 4, 5]])
+    assert np.allclose(data.frequencies, [1.5])
+
+
+def test_word_reduced_in_comment_is_not_a_keyword(tmp_path):
+    filename = tmp_path / 'comment.ascii'
+    filename.write_text(u'header\n4 0 4\n0 0 4\n# reduced mass units\n'
+                        u'1 1 1 Na\n' + MODE)
+    data = ascii_reader.read_vsim(str(filename))
+    assert data.keywords == []
+    assert np.allclose(data.positions, [[1, 1, 1]])
+
+
+def test_import_has_no_path_side_effects():
+    script = ('import sys; before = list(sys.path); import ascii_phonons; '
+              'assert sys.path == before; '
+              'assert "vsim2blender" not in sys.modules')
+    subprocess.check_call([sys.executable, '-c', script], cwd=root)
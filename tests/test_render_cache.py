@@ -0,0 +1,102 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+import pytest
+
+import ascii_phonons
+from ascii_phonons.render_cache import RenderCache
+from conftest import kesterite
+
+
+def key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def options(**extra):
+    return dict({'input_file': kesterite, 'mode_index': 2}, **extra)
+
+
+def test_key_depends_on_pixels_not_bookkeeping():
+    base = ascii_phonons.render_key(options())
+    assert ascii_phonons.render_key(options()) == base
+    assert ascii_phonons.render_key(options(jobs=4, verbose=True)) == base
+    assert ascii_phonons.render_key(options(zoom=2.)) != base
+    assert ascii_phonons.render_key(options(), mode_index=3) != base
+    assert ascii_phonons.render_key(options(), output='gif') != base
+
+
+def test_key_depends_on_frames():
+    keys = set(ascii_phonons.render_key(options(**frames)) for frames in
+               ({'n_frames': 10}, {'n_frames': 20},
+                {'n_frames': 10, 'start_frame': 5},
+                {'n_frames': 10, 'end_frame': 4}))
+    assert len(keys) == 4
+
+
+def test_key_depends_on_config(tmp_path):
+    config = tmp_path / 'user.conf'
+    config.write_text(u'[colours]\nCu = 1 0 0\n')
+    assert (ascii_phonons.render_key(options(config=str(config))) !=
+            ascii_phonons.render_key(options()))
+
+
+def test_shared_source_gives_same_key():
+    source = ascii_phonons.render_source(options())
+    assert (ascii_phonons.render_key(options(), source=source) ==
+            ascii_phonons.render_key(options()))
+
+
+def test_put_and_get(tmp_path):
+    cache = RenderCache(str(tmp_path / 'renders'))
+    frames = np.arange(24, dtype=np.uint8).reshape(2, 3, 4)
+    assert cache.get_frames(key('a')) is None
+    cache.put_frames(key('a'), frames)
+    assert np.array_equal(cache.get_frames(key('a')), frames)
+
+    source = tmp_path / 'image.png'
+    source.write_bytes(b'png data')
+    cache.put_files(key('b'), [str(source)])
+    destination = str(tmp_path / 'copy.png')
+    assert not cache.get_files(key('b'), [destination, destination])
+    assert cache.get_files(key('b'), [destination])
+    with open(destination, 'rb') as f:
+        assert f.read() == b'png data'
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / 'renders'))
+    image = np.zeros(400, dtype=np.uint8)
+    for i, name in enumerate('abc'):
+        cache.put_frames(key(name), image)
+        entry = os.path.join(cache.directory, key(name))
+        os.utime(entry, (time.time() - 100 + i, time.time() - 100 + i))
+
+    # Room for two entries; reading an entry makes it the most recently
+    # used
+    entry_size = os.path.getsize(os.path.join(cache.directory, key('a'),
+                                              'frames.npy'))
+    cache.max_size = 2.5 * entry_size
+    cache.get_frames(key('a'))
+    cache.evict()
+    assert cache.get_frames(key('a')) is not None
+    assert cache.get_frames(key('b')) is None
+    assert cache.get_frames(key('c')) is not None
+
+
+def test_evict_and_clear_keep_other_files(tmp_path):
+    directory = tmp_path / 'renders'
+    cache = RenderCache(str(directory), max_size=0)
+    (directory / 'ascii').mkdir()
+    (directory / 'ascii' / 'sidecar.npz').write_bytes(b'x' * 1000)
+    (directory / 'notes.txt').write_text(u'keep')
+
+    cache.put_frames(key('a'), np.zeros(10, dtype=np.uint8))
+    cache.evict()
+    assert cache.get_frames(key('a')) is None
+    cache.put_frames(key('b'), np.zeros(10, dtype=np.uint8))
+    cache.clear()
+    assert cache.get_frames(key('b')) is None
+    assert sorted(os.listdir(str(directory))) == ['ascii', 'notes.txt']
+
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import ascii_phonons
+from ascii_phonons import software
+from conftest import kesterite
+from vsim2blender import scene_graph
+
+
+def graph(mode_index=3, **options):
+    opts = {'input_file': kesterite, 'x_pixels': 32, 'y_pixels': 32,
+            'n_frames': 6, 'vectors': True}
+    opts.update(options)
+    result = scene_graph.build_graph(**opts)
+    result.set_mode(mode_index)
+    return result
+
+
+def test_supercell_atoms():
+    default = graph()
+    small = graph(supercell=(1, 1, 2))
+    assert len(default) == 8 * len(default.symbols)
+    assert len(small) == 2 * len(small.symbols)
+    assert small.atom_names[0].startswith('0_')
+    assert small.atom_names[-1].endswith('_001')
+
+
+def test_period():
+    assert graph().period == 6
+    assert graph(static=True).period == 1
+    assert graph(scale_vib=0).period == 1
+    still = graph(static=True)
+    assert still.trajectory().shape == (1, 8 * len(still.symbols), 3)
+
+
+def test_save_and_load(tmp_path):
+    original = graph()
+    filename = str(tmp_path / 'graph.npz')
+    original.save(filename)
+    loaded = scene_graph.load(filename)
+
+    assert loaded.mode_index == 3 and loaded.period == original.period
+    assert loaded.atom_symbols == original.atom_symbols
+    assert np.allclose(loaded.trajectory(), original.trajectory())
+    assert np.allclose(loaded.arrows()[1], original.arrows()[1])
+    assert (software.draw_graph(loaded) ==
+            software.draw_graph(original)).all()
+
+    loaded.set_mode(3)
+    with pytest.raises(Exception, match='mode 4 is not available'):
+        loaded.set_mode(4)
+
+
+def test_each_phase_drawn_once(monkeypatch):
+    drawn = []
+    draw = software._draw
+
+    def counting_draw(camera, locations, *args):
+        drawn.append(locations)
+        return draw(camera, locations, *args)
+
+    monkeypatch.setattr(software, '_draw', counting_draw)
+    result = graph(end_frame=13)
+    frames = software.draw_graph(result)
+    assert len(frames) == 14 and len(drawn) == 6
+    assert (frames[0] == frames[6]).all() and (frames[1] == frames[13]).all()
+
+
+def test_render_key_covers_scene_graph(tmp_path):
+    filenames = [str(tmp_path / 'mode{0}.npz'.format(mode_index))
+                 for mode_index in (2, 3)]
+    for mode_index, filename in zip((2, 3), filenames):
+        graph(mode_index).save(filename)
+    keys = [ascii_phonons.render_key({'input_file': kesterite,
+                                      'scene_graph': filename})
+            for filename in filenames]
+    assert keys[0] != keys[1]
+    assert keys[0] != ascii_phonons.render_key({'input_file': kesterite})
@@ -0,0 +1,61 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from conftest import kesterite
+from vsim2blender import ascii_reader
+
+
+@pytest.fixture
+def ascii_file(tmp_path):
+    (tmp_path / 'input').mkdir()
+    filename = str(tmp_path / 'input' / 'kesterite.ascii')
+    shutil.copyfile(kesterite, filename)
+    return filename
+
+
+def test_round_trip(ascii_file, cache_home):
+    parsed = ascii_reader.load_vsim(ascii_file, cache=True)
+    meta_path, eigenvector_path = ascii_reader.cache_paths(ascii_file)
+    assert os.path.isfile(meta_path) and os.path.isfile(eigenvector_path)
+    assert ascii_reader.cache_dir().startswith(str(cache_home))
+    assert os.listdir(os.path.dirname(ascii_file)) == ['kesterite.ascii']
+
+    cached = ascii_reader.read_cache(ascii_file)
+    assert isinstance(cached.eigenvectors, np.memmap)
+    assert np.allclose(cached.eigenvectors, parsed.eigenvectors)
+    assert np.allclose(cached.positions, parsed.positions)
+    assert cached.symbols == parsed.symbols
+    assert cached.keywords == parsed.keywords
+
+
+def test_changed_file_invalidates_sidecar(ascii_file):
+    ascii_reader.load_vsim(ascii_file, cache=True)
+    with open(ascii_file, 'a') as f:
+        f.write('\n')
+    assert ascii_reader.read_cache(ascii_file) is None
+
+    ascii_reader.load_vsim(ascii_file, cache=True)
+    assert ascii_reader.read_cache(ascii_file) is not None
+
+    stat = os.stat(ascii_file)
+    os.utime(ascii_file, (stat.st_atime, stat.st_mtime + 10))
+    assert ascii_reader.read_cache(ascii_file) is None
+
+
+def test_sidecar_is_per_path(ascii_file, tmp_path):
+    other = str(tmp_path / 'other.ascii')
+    shutil.copyfile(ascii_file, other)
+    assert ascii_reader.cache_paths(other) != \
+        ascii_reader.cache_paths(ascii_file)
+    ascii_reader.load_vsim(ascii_file, cache=True)
+    assert ascii_reader.read_cache(other) is None
+
+
+def test_unwritable_cache_dir(ascii_file, cache_home):
+    cache_home.parent.mkdir(exist_ok=True)
+    cache_home.write_text(u'not a directory')
+    data = ascii_reader.load_vsim(ascii_file, cache=True)
+    assert len(data.frequencies) == 24
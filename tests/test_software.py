@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from ascii_phonons import compositor, software
+from conftest import kesterite
+
+
+def options(**extra):
+    opts = {'input_file': kesterite, 'mode_index': 3, 'x_pixels': 48,
+            'y_pixels': 32, 'n_frames': 4}
+    opts.update(extra)
+    return opts
+
+
+def test_srgb():
+    assert np.allclose(software.srgb((0., 1., 0.5)), (0., 1., 0.7354),
+                       atol=1e-4)
+    assert np.allclose(software.srgb((-1., 2., 0.001)), (0., 1., 0.01292))
+
+
+def test_frame_shape():
+    frames = software.render_frames(**options())
+    assert frames.shape == (4, 32, 48, 4)
+    assert frames.dtype == np.uint8
+    assert (frames[:, :, :, 3] == 255).all()
+
+    preview = software.render_frames(**options(preview='preview'))
+    # Previews are drawn at 40% and atoms are still
+    assert preview.shape[1:] == (32 * 40 // 100, 48 * 40 // 100, 4)
+    assert (preview == preview[0]).all()
+
+
+def test_atoms_are_drawn():
+    frames = software.render_frames(**options(static=True, show_box=False))
+    background = np.round(software.srgb((0.5, 0.5, 0.5)) * 255)
+    assert (frames[0, 0, 0, :3] == background).all()
+    assert (frames[0, :, :, :3] != background).any(axis=-1).sum() > 100
+
+
+def test_atoms_move():
+    frames = software.render_frames(**options())
+    assert (frames[0] != frames[1]).any()
+    still = software.render_frames(**options(static=True))
+    assert len(still) == 1
+
+
+@pytest.mark.skipif(not compositor.available(), reason='Pillow is needed')
+def test_render_files(tmp_path):
+    output = str(tmp_path / 'mode')
+    filenames = software.render(**options(output_file=output))
+    assert filenames == [output + '{0:04d}.png'.format(frame)
+                         for frame in range(4)]
+    assert compositor.Image.open(filenames[0]).size == (48, 32)
+
+    filenames = software.render(**options(output_file=output, gif=True))
+    assert filenames == [output + '.gif']
+    assert compositor.Image.open(filenames[0]).n_frames == 4
@@ -0,0 +1,57 @@
+import itertools
+
+import numpy as np
+
+from vsim2blender.structure import Structure, cell_ids
+
+
+lattice_vectors = [[3., 0., 0.], [1., 4., 0.], [0., 0.5, 5.]]
+frac_positions = [[0., 0., 0.], [0.5, 0.25, 0.5], [0.1, 0.9, 0.3]]
+symbols = ['Zn', 'S', 'Zn']
+
+
+def test_cell_ids():
+    assert (cell_ids((2, 3, 1)) ==
+            list(itertools.product(range(2), range(3), range(1)))).all()
+
+
+def test_species():
+    structure = Structure(lattice_vectors, frac_positions, symbols,
+                          reduced=True)
+    assert structure.species == ['Zn', 'S']
+    assert list(structure.species_indices) == [0, 1, 0]
+    assert structure.symbols == symbols
+    assert len(structure) == 3
+
+
+def test_coordinates():
+    reduced = Structure(lattice_vectors, frac_positions, symbols,
+                        reduced=True)
+    cartesian = Structure(lattice_vectors, reduced.cart_positions, symbols)
+    assert np.allclose(reduced.cart_positions,
+                       np.dot(frac_positions, lattice_vectors))
+    assert np.allclose(cartesian.frac_positions, frac_positions)
+
+
+def test_supercell_order():
+    structure = Structure(lattice_vectors, frac_positions, symbols,
+                          reduced=True)
+    supercell = structure.supercell((2, 3, 2))
+    assert len(supercell) == 2 * 3 * 2 * 3
+
+    # Reference: loop over cells, then atoms
+    rows = [(atom, cell)
+            for cell in itertools.product(range(2), range(3), range(2))
+            for atom in range(3)]
+    for row, (atom, cell) in enumerate(rows):
+        assert supercell.row(atom, cell) == row
+        assert supercell.atom_indices[row] == atom
+        assert tuple(supercell.row_cell_ids[row]) == cell
+        assert np.allclose(supercell.frac_positions[row],
+                           np.add(frac_positions[atom], cell))
+        assert np.allclose(supercell.positions[row],
+                           np.dot(np.add(frac_positions[atom], cell),
+                                  lattice_vectors))
+    atoms, cells = zip(*rows)
+    assert list(supercell.rows(atoms, cells)) == list(range(len(rows)))
+    assert supercell.species_indices.tolist() == [0, 1, 0] * 12
@@ -0,0 +1,79 @@
+import cmath
+import itertools
+import math
+
+import numpy as np
+
+from conftest import kesterite
+from vsim2blender import ascii_reader, vibrations
+
+N_FRAMES = 8
+
+
+def reference_location(r, qpt, d_vector, frame, magnitude, mass):
+    """Per-atom, per-frame loop of the original animate_atom_vibs"""
+    exponent = cmath.exp(1j * (np.dot(r, qpt) -
+                               2 * math.pi * frame / N_FRAMES))
+    return r + mass**-.5 * magnitude * np.array(
+        [(x * exponent).real for x in d_vector])
+
+
+def mode_data():
+    data = ascii_reader.read_vsim(kesterite)
+    lattice_vectors = ascii_reader.cell_vsim_to_array(data.cell_vsim)
+    mode_index = 7
+    qpt = vibrations.qpt_to_cartesian([0.5, 0.25, 0.], lattice_vectors)
+    masses = np.linspace(1., 4., len(data.symbols))
+    return (data.positions, lattice_vectors, qpt,
+            data.get_eigenvectors(mode_index), masses)
+
+
+def test_supercell_order():
+    positions, lattice_vectors = np.random.rand(2, 3), np.diag([1., 2., 3.])
+    expected = [positions[atom] + np.dot(cell, lattice_vectors)
+                for cell in itertools.product(range(2), range(1), range(3))
+                for atom in range(2)]
+    assert np.allclose(vibrations.supercell_positions(
+        positions, lattice_vectors, (2, 1, 3)), expected)
+
+
+def test_trajectory_matches_per_atom_loop():
+    positions, lattice_vectors, qpt, eigenvectors, masses = mode_data()
+    supercell = (2, 1, 2)
+    trajectory = vibrations.trajectory(
+        positions, lattice_vectors, supercell, qpt, eigenvectors,
+        masses=masses, n_frames=N_FRAMES, start_frame=2, end_frame=9,
+        magnitude=1.5)
+
+    rest = vibrations.supercell_positions(positions, lattice_vectors,
+                                          supercell)
+    n_atoms = len(positions)
+    for i, frame in enumerate(range(2, 10)):
+        expected = [reference_location(r, qpt, eigenvectors[row % n_atoms],
+                                       frame, 1.5, masses[row % n_atoms])
+                    for row, r in enumerate(rest)]
+        assert np.allclose(trajectory[i], expected, atol=1e-5)
+
+
+def test_oscillation_parameters_match_positions():
+    positions, lattice_vectors, qpt, eigenvectors, masses = mode_data()
+    displacements = vibrations.displacements(
+        positions, lattice_vectors, (1, 1, 1), qpt, eigenvectors,
+        masses=masses)
+    amplitude, phase = vibrations.oscillation_parameters(displacements)
+
+    frames = np.arange(N_FRAMES)
+    expected = vibrations.positions_at(positions, displacements, frames,
+                                       N_FRAMES)
+    theta = 2 * np.pi * frames[:, np.newaxis, np.newaxis] / N_FRAMES
+    assert np.allclose(positions + amplitude * np.cos(theta - phase),
+                       expected, atol=1e-5)
+
+
+def test_positions_repeat_each_period():
+    positions, lattice_vectors, qpt, eigenvectors, masses = mode_data()
+    displacements = vibrations.displacements(
+        positions, lattice_vectors, (1, 1, 1), qpt, eigenvectors)
+    frames = vibrations.positions_at(positions, displacements,
+                                     [1, 1 + N_FRAMES], N_FRAMES)
+    assert np.allclose(frames[0], frames[1], atol=1e-5)
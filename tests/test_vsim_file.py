@@ -0,0 +1,28 @@
+import numpy as np
+
+from conftest import angles, kesterite
+from vsim2blender import ascii_reader
+
+
+def test_lazy_modes_match_full_parse():
+    data = ascii_reader.read_vsim(kesterite)
+    vsim_file = ascii_reader.VsimFile(kesterite)
+
+    assert len(vsim_file) == len(data.frequencies)
+    assert np.allclose(vsim_file.frequencies, data.frequencies)
+    assert np.allclose(vsim_file.qpts, data.qpts)
+    assert vsim_file.symbols == data.symbols
+    for mode_index in (0, len(vsim_file) // 2, len(vsim_file) - 1):
+        assert np.allclose(vsim_file.get_eigenvectors(mode_index),
+                           data.get_eigenvectors(mode_index))
+
+
+def test_continued_lines():
+    data = ascii_reader.read_vsim(angles)
+    vsim_file = ascii_reader.VsimFile(angles)
+    assert np.allclose(vsim_file.get_eigenvectors(0), data.eigenvectors[0])
+
+
+def test_load_vsim_is_lazy_without_cache():
+    assert isinstance(ascii_reader.load_vsim(kesterite),
+                      ascii_reader.VsimFile)